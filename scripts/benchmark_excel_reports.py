@@ -0,0 +1,105 @@
+"""
+Compare the time and memory of writing the area and service charge Excel reports.
+
+The previous approach writes the DataFrame with pandas, then loads the workbook back with
+openpyxl to style it and saves it again; the single-pass writers stream styled rows once.
+
+Usage:
+    python scripts/benchmark_excel_reports.py --rows 5000
+    python scripts/benchmark_excel_reports.py --area "Business Bay"
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pandas as pd
+
+from real_estate_telegram_bot.core import excel
+
+
+def synthetic_buildings(rows: int) -> pd.DataFrame:
+    random.seed(0)
+    return pd.DataFrame({
+        "Building name": [f"Tower {i} Residences" for i in range(rows)],
+        "Construction end date": [
+            (date(2000, 1, 1) + timedelta(days=random.randrange(11000))).strftime("%d-%m-%Y") for _ in range(rows)
+        ],
+        "Completion %": [random.choice([100, 100, 100, 35, 60, 80]) for _ in range(rows)],
+        "How old is the building (years)": [random.randrange(30) for _ in range(rows)],
+    })
+
+
+def synthetic_service_charges(rows: int) -> pd.DataFrame:
+    random.seed(0)
+    years = list(range(2019, 2025))
+    data = {
+        "project_name": [f"Tower {i // 3} Residences" for i in range(rows)],
+        "property_group_name_en": [("Residential", "Office", "Retail")[i % 3] for i in range(rows)],
+    }
+    for year in years:
+        data[year] = [round(random.uniform(5, 40), 2) if random.random() > 0.2 else "" for _ in range(rows)]
+    return pd.DataFrame(data)
+
+
+def database_reports(area: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    from real_estate_telegram_bot.core.service_charges import get_area_service_charge_by_year
+    from real_estate_telegram_bot.db import crud
+
+    buildings = pd.DataFrame(crud.get_buildings_by_area(area))
+    return buildings, get_area_service_charge_by_year(area)
+
+
+def measure(name: str, write) -> None:
+    """Time a write, then repeat it to measure its peak memory, as tracing slows allocations down."""
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "report.xlsx")
+        start_time = time.perf_counter()
+        write(filepath)
+        elapsed = time.perf_counter() - start_time
+        size = os.path.getsize(filepath)
+
+        tracemalloc.start()
+        write(filepath)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{name:<40} {elapsed * 1000:>9.1f} ms {peak / 2**20:>9.1f} MiB peak {size / 1024:>9.1f} KiB file")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="Number of rows of the synthetic reports")
+    parser.add_argument("--area", help="Read the reports of this area from the database instead")
+    args = parser.parse_args()
+
+    if args.area:
+        buildings, service_charges = database_reports(args.area)
+    else:
+        buildings, service_charges = synthetic_buildings(args.rows), synthetic_service_charges(args.rows)
+    area = args.area or "Business Bay"
+    print(f"{len(buildings)} buildings, {len(service_charges)} service charge rows")
+
+    def areas_previous(filepath):
+        buildings.to_excel(filepath, index=False)
+        excel.format_areas(filepath)
+
+    def service_charge_previous(filepath):
+        service_charges.to_excel(filepath, index=False)
+        excel.format_service_charge(filepath, master_project_en=area, header_color="ed7d31")
+
+    if not buildings.empty:
+        measure("areas: to_excel + format_areas", areas_previous)
+        measure("areas: write_areas", lambda filepath: excel.write_areas(buildings, filepath))
+    if not service_charges.empty:
+        measure("service charge: to_excel + format", service_charge_previous)
+        measure(
+            "service charge: write_service_charge",
+            lambda filepath: excel.write_service_charge(service_charges, filepath, area, header_color="ed7d31"),
+        )
+
+
+if __name__ == "__main__":
+    main()
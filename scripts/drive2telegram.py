@@ -1,15 +1,15 @@
 import logging
 import logging.config
 import os
-import re
-from time import sleep
 
 import telebot
 from dotenv import find_dotenv, load_dotenv
 from omegaconf import OmegaConf
 
-from real_estate_telegram_bot.db import crud
-from real_estate_telegram_bot.core.google import GoogleDriveAPI
+from real_estate_telegram_bot.core.drive_index import get_drive_index
+from real_estate_telegram_bot.core.google import GoogleDriveService
+from real_estate_telegram_bot.core.search import project_index
+from real_estate_telegram_bot.core.warmer import DriveCacheWarmer
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -26,80 +26,25 @@ if BOT_TOKEN is None:
 
 config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
 
-bot = telebot.TeleBot(BOT_TOKEN, parse_mode=None)
-
-google_drive_api = GoogleDriveAPI()
-google_drive_api.load_index()
-
-def send_files(items: list[dict], project_id: int, user_id, bot) -> None:
-    for item in items:
-        file_name = item['file_name']
-        file_id = item['id']
-
-        # Check that file_name has a file extension
-        if not re.search(r"\.\w+$", file_name):
-            file_name += ".pdf"
-
-        # Check if the file is already in the database
-        project_file = crud.get_project_file_by_name(item["file_name"])
-        if not project_file:
-            logger.info(f"Downloading file {file_name} from Google Drive")
-
-            # Download the file from Google Drive
-            google_drive_api.download_file(file_id, file_name)
-
-            # Send the downloaded file to the user
-            with open(file_name, 'rb') as file:
-                sent_message = bot.send_document(user_id, file)
-                # Add the file to the database
-                crud.add_project_file(
-                    project_id=project_id,
-                    file_name=file_name,
-                    file_type="pdf",
-                    file_telegram_id=sent_message.document.file_id
-                )
-
-            # Remove file
-            os.remove(file_name)
-        else:
-            logger.info(f"File {file_name} already exists in the database")
-            try:
-                bot.send_document(user_id, project_file.file_telegram_id)
-            except Exception as e:
-                logger.error(f"An error occurred: {e}")
-                # download file from google drive
-                google_drive_api.download_file(file_id, file_name)
-
-                # Send the downloaded file to the user
-                with open(file_name, 'rb') as file:
-                    sent_message = bot.send_document(user_id, file)
-                    # Add the file to the database
-                    crud.update_project_file(
-                        project_id=project_id,
-                        file_name=file_name,
-                        file_type="pdf",
-                        file_telegram_id=sent_message.document.file_id
-                    )
-                    logger.info(f"File {file_name} updated in the database")
-                # Remove file
-                os.remove(file_name)
-
-
-@bot.message_handler(commands=["drive2telegram"])
-def drive2telegram(message):
-    offset = message.text.split(" ")[1]
-    for file_id, _ in google_drive_api.dir_index.items()[:offset]:
-        try:
-            project = crud.query_projects_by_name(file_id)[0]
-            print(f"File ID: {file_id}, Project ID: {project.project_id}")
-            items = google_drive_api.search(file_id)
-            send_files(
-                items, user_id=message.from_user.id, bot=bot,
-                project_id=project.project_id
-            )
-            sleep(1)
-        except:
-            logger.error(f"Error processing file {file_id}")
-            pass
-
-bot.polling(timeout=723, non_stop=True)
+if __name__ == '__main__':
+    # Upload every missing or changed Drive document to the storage chat in one go.
+    # The bot runs the same warmer periodically; both share the checkpoint.
+    if config.delivery.storage_chat_id is None:
+        logger.error(msg="delivery.storage_chat_id is not set in the configuration.")
+        exit(1)
+
+    bot = telebot.TeleBot(BOT_TOKEN, parse_mode=None)
+    drive_index = get_drive_index(GoogleDriveService())
+    drive_index.refresh()
+
+    warmer = DriveCacheWarmer(
+        bot,
+        drive_index,
+        project_index,
+        storage_chat_id=config.delivery.storage_chat_id,
+        checkpoint_path=config.warmer.checkpoint_path,
+        upload_interval_seconds=config.warmer.upload_interval_seconds,
+        max_retries=config.delivery.max_retries,
+    )
+    stats = warmer.run()
+    print(f"Visited {stats['projects']} projects: {stats['uploaded']} files uploaded, {stats['failed']} failed")
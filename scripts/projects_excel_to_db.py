@@ -1,6 +1,6 @@
 import numpy as np
 import pandas as pd
-from real_estate_telegram_bot.db.crud import upsert_project
+from real_estate_telegram_bot.db.crud import upsert_projects
 from real_estate_telegram_bot.db.database import create_tables
 from real_estate_telegram_bot.db.models import Project
 
@@ -14,6 +14,7 @@ if __name__ == '__main__':
     create_tables()
 
     # Step 2: Iterate over DataFrame rows and create Project objects
+    projects = []
     for index, row in df.iterrows():
         project = Project(
             project_id=row['project_id'],
@@ -53,9 +54,8 @@ if __name__ == '__main__':
             floors=row['floors']
         )
 
-        # Step 3: Upsert the project into the database
-        try:
-            upsert_project(project)
-        except:
-            print(f"Error upserting project: {project.project_id}")
-            continue
\ No newline at end of file
+        projects.append(project.as_dict())
+
+    # Step 3: Upsert all projects into the database in one batch
+    upsert_projects(projects)
+    print(f"Upserted {len(projects)} projects")
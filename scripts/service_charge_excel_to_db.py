@@ -1,6 +1,6 @@
 import numpy as np
 import pandas as pd
-from real_estate_telegram_bot.db.crud import upsert_project
+from real_estate_telegram_bot.db.crud import import_service_charges
 from real_estate_telegram_bot.db.database import create_tables
 from real_estate_telegram_bot.db.models import ProjectServiceCharge
 
@@ -14,7 +14,8 @@ if __name__ == '__main__':
     N = df.shape[0]
     create_tables()
 
-    # Step 2: Iterate over DataFrame rows and create Project objects
+    # Step 2: Iterate over DataFrame rows and create ProjectServiceCharge objects
+    service_charges = []
     for index, row in df.iterrows():
         if index % 25 == 0:
             print(f"{index}/{N}")
@@ -31,9 +32,11 @@ if __name__ == '__main__':
             meter_installation = row["Meter installation"]
         )
 
-        # Step 3: Upsert the project into the database
-        try:
-            upsert_project(project)
-        except:
-            print(f"Error upserting project: {project.project_id}")
-            continue
\ No newline at end of file
+        service_charge = project.as_dict()
+        del service_charge["id"]
+        service_charges.append(service_charge)
+
+    # Step 3: Upsert all service charges by natural key, the last row winning for repeated keys
+    statuses = import_service_charges(service_charges)
+    created = sum(status == "created" for status in statuses.values())
+    print(f"Imported {len(service_charges)} service charges: {created} created, {len(statuses) - created} updated")
@@ -1,20 +1,35 @@
 import logging
 import logging.config
 import os
+import signal
 import threading
+from datetime import datetime
 
 import telebot
 import uvicorn
+from apscheduler.schedulers.background import BackgroundScheduler
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from omegaconf import OmegaConf
 from telebot.states.sync.middleware import StateMiddleware
 
+from real_estate_telegram_bot.api.dispatcher import UpdateDispatcher
 from real_estate_telegram_bot.api.handlers import admin, apps
 from real_estate_telegram_bot.api.middlewares.antiflood import AntifloodMiddleware
 from real_estate_telegram_bot.api.middlewares.user import UserCallbackMiddleware, UserMessageMiddleware
 from real_estate_telegram_bot.api.routes import calculator as calculator_routes
 from real_estate_telegram_bot.api.routes import health as health_routes
+from real_estate_telegram_bot.api.routes import webhook as webhook_routes
+from real_estate_telegram_bot.api.runtime import run_polling
+from real_estate_telegram_bot.core.broadcast import create_broadcast_worker
+from real_estate_telegram_bot.core.delivery import shutdown_delivery_pipelines
+from real_estate_telegram_bot.core.drive_index import get_drive_index
+from real_estate_telegram_bot.core.event_logger import EventLogger
+from real_estate_telegram_bot.core.ratelimit import create_rate_limiter
+from real_estate_telegram_bot.core.search import project_index
+from real_estate_telegram_bot.core.service_charges import service_charge_pivot
+from real_estate_telegram_bot.core.warmer import run_cache_warmer
+from real_estate_telegram_bot.db import crud
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -28,14 +43,33 @@ if BOT_TOKEN is None:
     logger.error(msg="BOT_TOKEN is not set in the environment variables.")
     exit(1)
 
+# Authenticates the updates Telegram posts in webhook mode, the same on every replica
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
 config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
 
 bot = telebot.TeleBot(BOT_TOKEN, parse_mode=None)
 
+def shutdown(steps: list) -> None:
+    """ Run the shutdown steps in order, each one even if a previous one failed """
+    for step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.error(f"Error during shutdown in {step}: {e}")
+    logger.info("Bot stopped")
+
 def start_bot():
     logger.info(f"{config.name} v{config.version}")
 
-    bot = telebot.TeleBot(BOT_TOKEN, use_class_middlewares=True)
+    # Updates are processed by the dispatcher worker pool, in order within each chat
+    bot = telebot.TeleBot(BOT_TOKEN, use_class_middlewares=True, threaded=False)
+    dispatcher = UpdateDispatcher(
+        bot,
+        workers=config.dispatcher.workers,
+        max_queue_size=config.dispatcher.max_queue_size,
+        max_chat_queue_size=config.dispatcher.max_chat_queue_size,
+    )
 
     # Handlers
     apps.register_handlers(bot)
@@ -54,19 +88,144 @@ def start_bot():
     )
 
     app.include_router(calculator_routes.create_router(bot))
-    app.include_router(health_routes.create_router(bot))
+    app.include_router(health_routes.create_router(bot, dispatcher))
 
-    # Run app in parallel
-    threading.Thread(target=uvicorn.run, kwargs={"app": app, "host": config.host, "port": config.port}).start()
+    if config.ingestion.mode == "webhook":
+        if not config.ingestion.webhook_url:
+            logger.error(msg="ingestion.webhook_url must be set in webhook mode.")
+            exit(1)
+        if not WEBHOOK_SECRET:
+            logger.error(msg="WEBHOOK_SECRET is not set in the environment variables, it is required in webhook mode.")
+            exit(1)
+        app.include_router(webhook_routes.create_router(dispatcher, config.ingestion.webhook_path, WEBHOOK_SECRET))
 
     # Middlewares
     if config.antiflood.enabled:
         logger.info(f"Antiflood middleware enabled with time window: {config.antiflood.time_window_seconds} seconds")
-        bot.setup_middleware(AntifloodMiddleware(bot, config.antiflood.time_window_seconds))
-    bot.setup_middleware(UserMessageMiddleware())
-    bot.setup_middleware(UserCallbackMiddleware())
+        limiter = create_rate_limiter(
+            rate=1 / config.antiflood.time_window_seconds,
+            capacity=config.antiflood.burst,
+            max_keys=config.antiflood.max_users,
+            redis_url=config.antiflood.redis_url,
+            prefix="antiflood",
+        )
+        bot.setup_middleware(AntifloodMiddleware(bot, limiter))
+    event_logger = None
+    if config.event_logger.enabled:
+        event_logger = EventLogger(
+            batch_size=config.event_logger.batch_size,
+            flush_interval_ms=config.event_logger.flush_interval_ms,
+            max_queue_size=config.event_logger.max_queue_size,
+            overflow_policy=config.event_logger.overflow_policy,
+            block_timeout_ms=config.event_logger.block_timeout_ms,
+        )
+        event_logger.start()
+    bot.setup_middleware(UserMessageMiddleware(event_logger))
+    bot.setup_middleware(UserCallbackMiddleware(event_logger))
     bot.setup_middleware(StateMiddleware(bot))
 
+    # Load the project catalogue for name lookups
+    if config.project_search.in_memory:
+        project_index.rebuild()
+    if config.service_charges.in_memory:
+        service_charge_pivot.rebuild()
+
+    # Keep the Drive index in sync with the changes feed, loading it in the background first
+    scheduler = BackgroundScheduler()
+    if config.drive_index.enabled:
+        scheduler.add_job(
+            lambda: get_drive_index().refresh(),
+            "interval",
+            minutes=config.drive_index.refresh_interval_minutes,
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True,
+        )
+
+        # Upload Drive documents to Telegram before users ask for them
+        if config.warmer.enabled:
+            scheduler.add_job(
+                run_cache_warmer,
+                "interval",
+                args=[bot],
+                minutes=config.warmer.interval_minutes,
+                max_instances=1,
+                coalesce=True,
+            )
+
+    # Write the user activity coalesced by the user cache
+    scheduler.add_job(
+        crud.flush_user_activity,
+        "interval",
+        seconds=config.user_cache.flush_interval_seconds,
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.start()
+
+    # Send the public messages scheduled by admins, resuming any interrupted one
+    broadcast_worker = None
+    if config.broadcasts.worker_enabled:
+        broadcast_worker = create_broadcast_worker(bot)
+        broadcast_worker.start()
+
+    # Stop gracefully on SIGTERM too, as sent by `docker stop`, which would otherwise kill
+    # the process without flushing anything
+    stop_requested = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, stopping the bot")
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    # Finish the updates being processed before flushing what they produced
+    shutdown_steps = [dispatcher.stop]
+    # Finish the file deliveries started by those updates, releasing their downloads
+    shutdown_steps.append(shutdown_delivery_pipelines)
+    if broadcast_worker is not None:
+        shutdown_steps.append(broadcast_worker.stop)
+    shutdown_steps.append(lambda: scheduler.shutdown(wait=False))
+    if event_logger is not None:
+        shutdown_steps.append(event_logger.stop)
+    shutdown_steps.append(crud.flush_user_activity)
+
     logger.info(msg=f"Bot `{str(bot.get_me().username)}` has started")
-    bot.infinity_polling(timeout=290)
-    #bot.polling()
+    if config.ingestion.mode == "webhook":
+        bot.set_webhook(
+            url=config.ingestion.webhook_url.rstrip("/") + config.ingestion.webhook_path,
+            secret_token=WEBHOOK_SECRET,
+        )
+    else:
+        # Telegram refuses getUpdates while a webhook is set
+        bot.remove_webhook()
+
+    dispatcher.start()
+    try:
+        if config.ingestion.mode == "webhook":
+            uvicorn.run(app, host=config.host, port=config.port)
+        else:
+            # Run app in parallel
+            threading.Thread(
+                target=uvicorn.run, kwargs={"app": app, "host": config.host, "port": config.port}, daemon=True
+            ).start()
+
+            # Poll in the background so that a signal stops the bot without waiting for
+            # the long polling request to return
+            def poll():
+                try:
+                    run_polling(
+                        bot,
+                        dispatcher,
+                        polling_timeout=config.runtime.polling_timeout,
+                        long_polling_timeout=config.runtime.long_polling_timeout,
+                        stop=stop_requested,
+                    )
+                finally:
+                    stop_requested.set()
+
+            threading.Thread(target=poll, name="polling", daemon=True).start()
+            stop_requested.wait()
+    finally:
+        shutdown(shutdown_steps)
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from telebot import TeleBot, types
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Number of recent queue wait times the statistics are computed from
+WAIT_SAMPLES = 1000
+
+
+def chat_key(update: types.Update) -> object:
+    """Return the chat an update belongs to, or its update id when it belongs to none."""
+    for message in (update.message, update.edited_message, update.channel_post, update.edited_channel_post):
+        if message is not None:
+            return message.chat.id
+    if update.callback_query is not None:
+        message = update.callback_query.message
+        return message.chat.id if message is not None else update.callback_query.from_user.id
+    for event in (update.my_chat_member, update.chat_member, update.chat_join_request):
+        if event is not None:
+            return event.chat.id
+    for query in (update.inline_query, update.chosen_inline_result, update.shipping_query, update.pre_checkout_query):
+        if query is not None:
+            return query.from_user.id
+    return ("update", update.update_id)
+
+
+class UpdateDispatcher:
+    """Process updates in a pool of worker threads, in order within each chat.
+
+    Every chat has its own queue, and a chat is handed to at most one worker at a time, so
+    that the updates of a chat are processed one after the other, as next step handlers and
+    states expect, while different chats are processed in parallel. Chats with pending
+    updates are served in turn, so that a busy chat cannot starve the others.
+    """
+
+    def __init__(
+        self,
+        bot: TeleBot,
+        workers: int = 16,
+        max_queue_size: int = 1000,
+        max_chat_queue_size: int = 20,
+    ) -> None:
+        """
+        Args:
+            bot: The bot whose handlers process the updates, created with `threaded=False`.
+            workers: Number of updates processed at the same time.
+            max_queue_size: Maximum number of updates waiting to be processed.
+            max_chat_queue_size: Maximum number of updates waiting in one chat, the next ones are dropped.
+        """
+        self.bot = bot
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.max_chat_queue_size = max_chat_queue_size
+        # Pending (update, time queued) by chat, and chats with pending updates no worker is on
+        self._chats: dict[object, deque[tuple[types.Update, float]]] = {}
+        self._ready: deque[object] = deque()
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._threads: list[threading.Thread] = []
+        self._waits: deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.processed = 0
+        self.dropped = 0
+        self.max_wait = 0.0
+
+    def start(self) -> None:
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"dispatcher-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Process the queued updates and stop the workers."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        logger.info(f"Update dispatcher stopped: {self.stats()}")
+
+    def put(self, update: types.Update) -> bool:
+        """
+        Queue an update without blocking.
+
+        Returns:
+            False when the queue is full, the update should then be offered again later.
+        """
+        key = chat_key(update)
+        with self._condition:
+            if self._pending >= self.max_queue_size:
+                return False
+            queue = self._chats.get(key)
+            if queue is None:
+                queue = self._chats[key] = deque()
+                self._ready.append(key)
+            elif len(queue) >= self.max_chat_queue_size:
+                # The chat is flooding the bot, its updates would be refused by antiflood anyway
+                self.dropped += 1
+                logger.warning(f"Too many pending updates in chat {key}, update {update.update_id} dropped")
+                return True
+            queue.append((update, time.monotonic()))
+            self._pending += 1
+            self._condition.notify()
+        return True
+
+    def stats(self) -> dict:
+        """Return the queue size and the recent queue wait times, in milliseconds."""
+        with self._condition:
+            waits = sorted(self._waits)
+            stats = {
+                "pending": self._pending,
+                "chats": len(self._chats),
+                "processed": self.processed,
+                "dropped": self.dropped,
+            }
+        return {
+            **stats,
+            "wait_ms_avg": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+            "wait_ms_p95": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+            "wait_ms_max": round(1000 * self.max_wait, 1),
+        }
+
+    def _next(self) -> Optional[tuple[object, types.Update]]:
+        with self._condition:
+            while not self._ready:
+                if self._stopping:
+                    return None
+                self._condition.wait()
+            key = self._ready.popleft()
+            update, queued_at = self._chats[key].popleft()
+            self._pending -= 1
+            wait = time.monotonic() - queued_at
+            self._waits.append(wait)
+            self.max_wait = max(self.max_wait, wait)
+            return key, update
+
+    def _done(self, key: object) -> None:
+        with self._condition:
+            self.processed += 1
+            if self._chats[key]:
+                self._ready.append(key)
+                self._condition.notify()
+            else:
+                del self._chats[key]
+
+    def _work(self) -> None:
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            key, update = task
+            try:
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f"Error processing update {update.update_id}: {e}")
+            finally:
+                self._done(key)
@@ -9,6 +9,7 @@ from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 from omegaconf import OmegaConf
 from real_estate_telegram_bot.db import crud
 from real_estate_telegram_bot.core.db import import_projects_from_excel, import_service_charges_from_excel
+from real_estate_telegram_bot.core.excel import read_excel_header
 from real_estate_telegram_bot.db.models import Project, ProjectServiceCharge
 import pandas as pd
 
@@ -102,9 +103,10 @@ def register_handlers(bot):
                 model = ProjectServiceCharge
 
             expected_columns = [c.name for c in model.__table__.columns]
-            df = pd.read_excel(temp_file)
-            file_columns = list(df.columns)
-            missing = [col for col in expected_columns if col not in file_columns]
+            # Service charges are matched by their natural key, so the id column is optional
+            required_columns = [col for col in expected_columns if model is Project or col != "id"]
+            file_columns = read_excel_header(temp_file)
+            missing = [col for col in required_columns if col not in file_columns]
             extra = [col for col in file_columns if col not in expected_columns]
             if missing or extra:
                 msg = strings[user.lang].column_mismatch.format(
@@ -131,7 +133,11 @@ def register_handlers(bot):
             
             # Save results_df as excel file
             results_file = f'./data/results_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-            results_df.to_excel(results_file, index=False)
+            with pd.ExcelWriter(results_file) as writer:
+                results_df.to_excel(writer, sheet_name="results", index=False)
+                if "summary" in results_df.attrs:
+                    summary = pd.DataFrame(list(results_df.attrs["summary"].items()), columns=["metric", "value"])
+                    summary.to_excel(writer, sheet_name="summary", index=False)
             
             bot.send_message(message.chat.id, success_msg)
             # send a document
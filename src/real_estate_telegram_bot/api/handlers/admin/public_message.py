@@ -1,10 +1,8 @@
 import logging
-import random
-from datetime import datetime, timedelta
-from typing import Any, Optional
+from datetime import datetime
+from typing import Any
 
 import pytz  # type: ignore
-from apscheduler.schedulers.background import BackgroundScheduler
 from omegaconf import OmegaConf
 from telebot import TeleBot
 from telebot.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
@@ -19,15 +17,9 @@ strings = OmegaConf.load("./src/real_estate_telegram_bot/conf/admin/public_messa
 # Define timezone
 timezone = pytz.timezone(config.timezone)
 
-# Initialize scheduler
-scheduler = BackgroundScheduler()
-
 # Dictionary to store user data during message scheduling
 user_data: dict[str, Any] = {}
 
-# Data structure to store scheduled messages
-scheduled_messages: dict[str, dict] = {}
-
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -43,53 +35,53 @@ def create_keyboard_markup(lang: str) -> InlineKeyboardMarkup:
     return keyboard_markup
 
 
-def send_scheduled_message(
-    bot: TeleBot,
-    user_id: int,
-    media_type: str,
-    message_id: str,
-    message_text: Optional[str] = None,
-    message_photo: Optional[str] = None,
-):
-    """Send a scheduled message to a user"""
-    try:
-        if media_type == "text":
-            bot.send_message(chat_id=user_id, text=message_text)
-        elif media_type == "photo":
-            bot.send_photo(chat_id=user_id, caption=message_text or "", photo=message_photo, disable_notification=False)
+def create_audience_markup(lang: str) -> InlineKeyboardMarkup:
+    """Create an InlineKeyboardMarkup object to choose who receives a public message"""
+    keyboard_markup = InlineKeyboardMarkup()
+    for option in strings[lang].audience_options:
+        keyboard_markup.add(InlineKeyboardButton(option.label, callback_data=f"audience_{option.value}"))
+    return keyboard_markup
 
-        # Remove message from scheduled_messages
-        if message_id in scheduled_messages:
-            del scheduled_messages[message_id]
 
-    except Exception as e:
-        logger.error(f"Error sending scheduled message to {user_id}: {e}")
+def parse_audience(value: str) -> dict:
+    """Parse an audience option, e.g. `lang:en`, into the filters of `crud.iter_recipients`"""
+    if value == "all":
+        return {}
+    name, _, argument = value.partition(":")
+    if name == "active":
+        return {"active_days": int(argument)}
+    return {name: argument}
 
 
 def list_scheduled_messages(bot: TeleBot, user: User):
     """List all scheduled messages"""
-    if not scheduled_messages:
+    broadcasts = crud.read_pending_broadcasts()
+    if not broadcasts:
         bot.send_message(user.id, strings[user.lang].no_scheduled_messages)
         return
 
     response = strings[user.lang].list_public_messages + "\n"
-    for message_id, message_data in scheduled_messages.items():
-        scheduled_time = message_data["datetime"].strftime("%Y-%m-%d %H:%M")
-        response += f"- {message_id}: {scheduled_time} ({config.timezone})\n"
+    for broadcast in broadcasts:
+        scheduled_time = broadcast.scheduled_at.astimezone(timezone).strftime("%Y-%m-%d %H:%M")
+        response += f"- {broadcast.id}: {scheduled_time} ({config.timezone})"
+        if broadcast.status == "sending":
+            response += f", {broadcast.sent + broadcast.failed} sent"
+        response += "\n"
     bot.send_message(user.id, response)
 
 
 def cancel_scheduled_message(bot: TeleBot, user: User):
     """Cancel a scheduled message"""
-    if not scheduled_messages:
+    broadcasts = crud.read_pending_broadcasts()
+    if not broadcasts:
         bot.send_message(user.id, strings[user.lang].no_scheduled_messages)
         return
 
     # Create keyboard for cancel options
     keyboard = InlineKeyboardMarkup()
-    for message_id, message in scheduled_messages.items():
-        job_label = f"{message_id}: {message['datetime'].strftime('%Y-%m-%d %H:%M')}"
-        keyboard.add(InlineKeyboardButton(job_label, callback_data=f"cancel_{message_id}"))
+    for broadcast in broadcasts:
+        job_label = f"{broadcast.id}: {broadcast.scheduled_at.astimezone(timezone).strftime('%Y-%m-%d %H:%M')}"
+        keyboard.add(InlineKeyboardButton(job_label, callback_data=f"cancel_{broadcast.id}"))
 
     bot.send_message(user.id, strings[user.lang].cancel_message_prompt, reply_markup=keyboard)
 
@@ -102,35 +94,23 @@ def get_message_content(message, bot: TeleBot, user: User):
         photo = message.photo[-1].file_id if message.photo else None
 
         scheduled_datetime = user_data[user.id]["datetime"]
-
-        message_id = str(random.randint(100, 999))
-        scheduled_messages[message_id] = {
-            "id": message_id,
-            "datetime": scheduled_datetime,
-            "content": content,
-            "media_type": media_type,
-            "photo": photo,
-            "jobs": [],
-        }
-        target_users = crud.read_users()
-        for target_user in target_users:
-
-            # add random delay to avoid spamming
-            scheduled_datetime += timedelta(seconds=random.randint(10, 60))
-            
-            job = scheduler.add_job(
-                send_scheduled_message,
-                "date",
-                run_date=scheduled_datetime,
-                args=[bot, target_user.id, media_type, message_id, content, photo],
-            )
-            scheduled_messages[message_id]["jobs"].append(job.id)
+        audience = user_data[user.id].get("audience", {})
+
+        # The broadcast worker sends it to the audience once its time has come
+        broadcast = crud.create_broadcast(
+            created_by=user.id,
+            scheduled_at=scheduled_datetime,
+            media_type=media_type,
+            content=content,
+            photo=photo,
+            **audience,
+        )
 
         bot.send_message(
             user.id,
             strings[user.lang].message_scheduled_confirmation.format(
-                message_id=message_id,
-                n_users=len(target_users),
+                message_id=broadcast.id,
+                n_users=crud.count_recipients(**audience),
                 send_datetime=scheduled_datetime.strftime("%Y-%m-%d %H:%M"),
                 timezone=config.timezone,
             ),
@@ -195,8 +175,9 @@ def register_handlers(bot: TeleBot):
                 return
 
             user_data[user.id] = {"datetime": user_datetime_localized}
-            sent_message = bot.send_message(user.id, strings[user.lang].record_message_prompt)
-            bot.register_next_step_handler(sent_message, get_message_content, bot, user)
+            bot.send_message(
+                user.id, strings[user.lang].audience_prompt, reply_markup=create_audience_markup(user.lang)
+            )
 
         except ValueError:
             sent_message = bot.send_message(user.id, strings[user.lang].invalid_datetime_format)
@@ -207,6 +188,18 @@ def register_handlers(bot: TeleBot):
             )
             bot.register_next_step_handler(sent_message, get_datetime_input, bot, user)
 
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("audience_"))
+    def audience_handler(call: CallbackQuery, data: dict):
+        user = data["user"]
+        if user.id not in user_data:
+            return
+
+        user_data[user.id]["audience"] = parse_audience(call.data.replace("audience_", "", 1))
+        sent_message = bot.edit_message_text(
+            strings[user.lang].record_message_prompt, call.message.chat.id, call.message.message_id
+        )
+        bot.register_next_step_handler(sent_message, get_message_content, bot, user)
+
     @bot.callback_query_handler(func=lambda call: call.data.startswith("cancel_"))
     def handle_cancel_callback(call: CallbackQuery, data: dict):
         """Handle cancel callback"""
@@ -214,19 +207,9 @@ def register_handlers(bot: TeleBot):
         callback_data = call.data
 
         message_id = callback_data.replace("cancel_", "")
-        if message_id in scheduled_messages:
-            message_data = scheduled_messages[message_id]
-            for job_id in message_data["jobs"]:
-                try:
-                    scheduler.remove_job(job_id)
-                except Exception as e:
-                    logger.error(f"Error removing job {job_id}: {e}")
-            del scheduled_messages[message_id]
+        if message_id.isdigit() and crud.cancel_broadcast(int(message_id)):
             bot.send_message(
                 call.message.chat.id, strings[user.lang].cancel_message_confirmation.format(message_id=message_id)
             )
         else:
             bot.send_message(call.message.chat.id, strings[user.lang].message_not_found)
-
-
-scheduler.start()
@@ -1,5 +1,7 @@
+import functools
 import logging.config
 import os
+from typing import Optional
 
 import pandas as pd
 from omegaconf import OmegaConf
@@ -7,6 +9,7 @@ from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardBu
 
 from real_estate_telegram_bot.db import crud
 from real_estate_telegram_bot.core import excel
+from real_estate_telegram_bot.core.reports import report_cache
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -69,6 +72,32 @@ def create_areas_names_menu_markup(lang):
     )
     return areas_menu_markup
 
+def load_area_buildings(area_name: str) -> pd.DataFrame:
+    """ Read the buildings of an area, newest first """
+    building_data = crud.get_buildings_by_area(area_name)
+    if not building_data:
+        return pd.DataFrame()
+    df = pd.DataFrame(building_data)
+    df = df.sort_values(by='Construction end date', ascending=False)
+    df['Construction end date'] = df['Construction end date'].dt.strftime('%d-%m-%Y')
+    return df
+
+def build_area_report(df: pd.DataFrame, area: str, name: str) -> Optional[str]:
+    """ Write the `ready` or `off_plan` buildings of a normalized area to a formatted Excel file, or return None when there are none """
+    if df.empty:
+        return None
+    masks = {
+        'ready': df['Completion %'] == 100,
+        'off_plan': df['Completion %'] != 100
+    }
+    if df[masks[name]].empty:
+        return None
+
+    filename = f"{area.title()}_buildings_{name}.xlsx"
+    filepath = os.path.join("./tmp", filename)
+
+    return excel.write_areas(df[masks[name]], filepath)
+
 def register_handlers(bot):
     """ Register handlers for areas menu """
     logger.info("Registering `areas` handlers")
@@ -141,33 +170,19 @@ def register_handlers(bot):
 
     def send_area_buildings(bot, user_id, area_name, lang, user_entered=False):
         logger.info(f"User {user_id} requested buildings in {area_name}")
-        building_data = crud.get_buildings_by_area(area_name)
-        if building_data:
-            df = pd.DataFrame(building_data)
-            df = df.sort_values(by='Construction end date', ascending=False)
-            df['Construction end date'] = df['Construction end date'].dt.strftime('%d-%m-%Y')
-
-            masks = {
-                'ready': df['Completion %'] == 100,
-                'off_plan': df['Completion %'] != 100
-            }
-
-            for name, mask in masks.items():
-                if df[mask].empty:
-                    continue
-
-                filename = f"{area_name}_buildings_{name}.xlsx"
-                filepath = os.path.join("./tmp", filename)
-
-                df[mask].to_excel(filepath, index=False)
-                excel.format_areas(filepath)
-
-                with open(filepath, 'rb') as file:
-                    reply_markup = create_query_menu(lang) if name == 'off_plan' else None
-                    bot.send_document(user_id, file, reply_markup=reply_markup)
+        # The buildings are only read when a report is not cached for the current catalogue
+        load = functools.cache(load_area_buildings)
+
+        sent = False
+        for name in ('ready', 'off_plan'):
+            reply_markup = create_query_menu(lang) if name == 'off_plan' else None
+            sent |= report_cache.send(
+                bot, user_id, f"area_buildings_{name}", area_name, "projects",
+                lambda area, name=name: build_area_report(load(area), area, name),
+                reply_markup=reply_markup,
+            )
 
-                os.remove(filepath)
-        else:
+        if not sent:
             bot.send_message(
                 user_id,
                 strings[lang].area_query.result_negative,
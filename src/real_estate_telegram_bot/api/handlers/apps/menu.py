@@ -56,17 +56,24 @@ def create_create_query_menu(lang: str) -> InlineKeyboardMarkup:
     query_menu.add(InlineKeyboardButton(strings[lang].main_menu, callback_data="_main_menu"))
     return query_menu
 
+def check_channel_access(bot, chat_id: int, user_id: int, username: str) -> bool:
+    """ Check that the user joined the channel, telling them otherwise. Failed checks deny access. """
+    is_member = check_user_in_channel_sync(config.channel_name, username, user_id)
+    if is_member:
+        return True
+    if is_member is None:
+        bot.send_message(chat_id, "Could not check that you joined the channel, please try again in a moment.")
+    else:
+        bot.send_message(chat_id, f"You need to join the channel @{config.channel_name} to use the bot.")
+    return False
+
 def register_handlers(bot):
     @bot.message_handler(commands=["start", "menu"])
     def menu_menu_command(message, data: dict):
         user = data["user"]
         # Check if user is in the channel
         if config.restrict_access:
-            if check_user_in_channel_sync(config.channel_name, user.username) is False:
-                bot.send_message(
-                    message.chat.id,
-                    f"You need to join the channel @{config.channel_name} to use the bot."
-                )
+            if not check_channel_access(bot, message.chat.id, user.id, user.username):
                 return
 
         lang = user.lang
@@ -84,11 +91,7 @@ def register_handlers(bot):
         user = data["user"]
         # Check if user is in the channel
         if config.restrict_access:
-            if check_user_in_channel_sync(config.channel_name, user.username) is False:
-                bot.send_message(
-                    message.chat.id,
-                    f"You need to join the channel @{config.channel_name} to use the bot."
-                )
+            if not check_channel_access(bot, message.chat.id, user.id, user.username):
                 return
 
         lang = user.lang
@@ -106,11 +109,7 @@ def register_handlers(bot):
 
         # Check if user is in the channel
         if config.restrict_access:
-            if check_user_in_channel_sync(config.channel_name, user.username) is False:
-                bot.send_message(
-                    call.message.chat.id,
-                    f"You need to join the channel @{config.channel_name} to use the bot."
-                )
+            if not check_channel_access(bot, call.message.chat.id, user.id, user.username):
                 return
         bot.send_message(
             call.message.chat.id, strings[lang].start,
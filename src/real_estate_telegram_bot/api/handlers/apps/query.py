@@ -8,8 +8,10 @@ from pydrive2.drive import GoogleDriveFile
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 from dotenv import find_dotenv, load_dotenv
 
-from real_estate_telegram_bot.api.handlers.apps.menu import create_main_menu_button
-from real_estate_telegram_bot.api.users import check_user_in_channel_sync
+from real_estate_telegram_bot.api.handlers.apps.menu import check_channel_access, create_main_menu_button
+from real_estate_telegram_bot.core.search import project_index, query_projects_by_name
+from real_estate_telegram_bot.core import drive_index
+from real_estate_telegram_bot.core.delivery import get_delivery_pipeline
 from real_estate_telegram_bot.core.google import GoogleDriveService
 from real_estate_telegram_bot.db import crud
 
@@ -115,64 +117,12 @@ def query_files_from_folder(folder_name: str) -> list[GoogleDriveFile]:
     Returns:
         A list of files in the folder.
     """
-    folder_id = google_drive_service.get_folder_id(folder_name.strip())
-    drive_files = google_drive_service.list_files_in_folder(folder_id)
-    return drive_files
+    return drive_index.query_files_from_folder(folder_name, google_drive_service)
 
 
 def send_files(items: list[GoogleDriveFile], project_id: int, user_id, bot) -> None:
-    for item in items:
-        file_name = item['title']
-
-        # Check that file_name has a file extension
-        if not re.search(r"\.\w+$", file_name):
-            file_name += ".pdf"
-
-        # Check if the file is already in the database
-        project_file = crud.get_project_file_by_name(file_name)
-        if not project_file:
-            logger.info(f"Downloading file {file_name} from Google Drive")
-
-            # Download the file from Google Drive
-            google_drive_service.download_files(item, "./tmp")
-
-            # Send the downloaded file to the user
-            with open(f"./tmp/{file_name}", 'rb') as file:
-                sent_message = bot.send_document(user_id, file)
-                # Add the file to the database
-                crud.add_project_file(
-                    project_id=project_id,
-                    file_name=file_name,
-                    file_type="pdf",
-                    file_telegram_id=sent_message.document.file_id
-                )
-
-            # Remove file
-            os.remove(f"./tmp/{file_name}")
-        else:
-            logger.info(f"File {file_name} already exists in the database")
-            try:
-                bot.send_document(user_id, project_file.file_telegram_id)
-            except Exception as e:
-                logger.error(f"An error occurred: {e}")
-
-                # Download the file from Google Drive
-                google_drive_service.download_files(item, "./tmp")
-
-                # Send the downloaded file to the user
-                with open(f"./tmp/{file_name}", 'rb') as file:
-                    sent_message = bot.send_document(user_id, file)
-                    # Add the file to the database
-                    crud.update_project_file(
-                        project_id=project_id,
-                        file_name=file_name,
-                        file_type="pdf",
-                        file_telegram_id=sent_message.document.file_id
-                    )
-                    logger.info(f"File {file_name} updated in the database")
-
-                # Remove file
-                os.remove(f"./tmp/{file_name}")
+    """ Send project files to the user in the background, in the order they are listed. """
+    get_delivery_pipeline(bot, google_drive_service).submit(items, project_id=project_id, user_id=user_id)
 
 def is_query(message):
     is_command = message.text[0] == '/'
@@ -199,11 +149,7 @@ def register_handlers(bot):
 
         # Check if user is in the channel
         if config_common.restrict_access:
-            if check_user_in_channel_sync(config_common.channel_name, username) is False:
-                bot.send_message(
-                    message.chat.id,
-                    f"You need to join the channel @{config_common.channel_name} to use the bot."
-                )
+            if not check_channel_access(bot, message.chat.id, user_id, username):
                 return
 
         user = crud.read_user(user_id)
@@ -212,7 +158,7 @@ def register_handlers(bot):
 
         logger.info(msg="User event", extra={"user_id": user_id, "user_message": message.text})
         try:
-            projects = crud.query_projects_by_name(project_name, mode="ilike")
+            projects = query_projects_by_name(project_name, mode="ilike")
 
             if projects:
                 if len(projects) == 1:
@@ -243,10 +189,14 @@ def register_handlers(bot):
                     #bot.register_next_step_handler(message, show_selected_project)
             else:
 
-                projects = crud.query_projects_by_name(project_name, mode="cosine", similarity_threshold=config.similarity_threshold)
+                projects = query_projects_by_name(
+                    project_name, mode="cosine",
+                    similarity_threshold=config.similarity_threshold,
+                    top_k=config.top_k
+                )
                 if projects:
                     projects_buttons = create_query_results_buttons(
-                        [project.project_name_id_buildings for project in projects][:config.top_k]
+                        [project.project_name_id_buildings for project in projects]
                     )
                     bot.reply_to(message, strings[lang].result_positive_suggestions, reply_markup=projects_buttons)
                 else:
@@ -269,8 +219,7 @@ def register_handlers(bot):
         user = crud.read_user(user_id)
         lang = user.lang
 
-        projects = crud.query_projects_by_name(project_name)
-        project = [project for project in projects if project.project_name_id_buildings == project_name][0]
+        project = project_index.get_by_name(project_name)[0]
         bot.send_message(
             user_id, prepare_response(project).replace('_', " "),
             reply_markup=create_service_charge_button(lang, project.master_project_en),
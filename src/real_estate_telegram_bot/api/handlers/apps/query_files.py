@@ -1,15 +1,16 @@
 import logging
-import os
-import re
 
 from omegaconf import OmegaConf
 from pydrive2.drive import GoogleDriveFile
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from real_estate_telegram_bot.api.handlers.apps.menu import create_main_menu_button
+from real_estate_telegram_bot.core.search import project_index, query_projects_by_name
+from real_estate_telegram_bot.core import drive_index
+from real_estate_telegram_bot.core.delivery import get_delivery_pipeline
+from real_estate_telegram_bot.core.downloads import drive_downloader
 from real_estate_telegram_bot.core.google import GoogleDriveService
 from real_estate_telegram_bot.db import crud
-from real_estate_telegram_bot.db.models import ProjectFile
 
 config = OmegaConf.load("./src/real_estate_telegram_bot/conf/apps/query_files.yaml")
 strings = config.strings
@@ -43,121 +44,11 @@ def query_files_from_folder(folder_name: str) -> list[GoogleDriveFile]:
     Returns:
         A list of files in the folder.
     """
-    folder_id = google_drive_service.get_folder_id(folder_name.strip())
-    drive_files = google_drive_service.list_files_in_folder(folder_id)
-    return drive_files
+    return drive_index.query_files_from_folder(folder_name, google_drive_service)
 
-def send_files(items: list[ProjectFile], user_id, bot) -> None:
-    for item in items:
-
-        file_name = item.file_name
-        project_id = item.project_id
-
-        # Check that file_name has a file extension
-        if not re.search(r"\.\w+$", file_name):
-            file_name += ".pdf"
-
-        # Check if the file is already in the database
-        project_file = crud.get_project_file_by_name(item.file_name)
-        if not project_file:
-            logger.info(f"Downloading file {file_name} from Google Drive")
-
-            # Download the file from Google Drive
-            google_drive_service.download_files(item, "./tmp")
-
-            # Send the downloaded file to the user
-            with open(f"./tmp/{file_name}", 'rb') as file:
-                sent_message = bot.send_document(user_id, file)
-                # Add the file to the database
-                crud.add_project_file(
-                    project_id=project_id,
-                    file_name=file_name,
-                    file_type="pdf",
-                    file_telegram_id=sent_message.document.file_id
-                )
-
-            # Remove file
-            os.remove(f"./tmp/{file_name}")
-        else:
-            logger.info(f"File {file_name} already exists in the database")
-            try:
-                bot.send_document(user_id, project_file.file_telegram_id)
-            except Exception as e:
-                logger.error(f"An error occurred: {e}")
-
-                # Download the file from Google Drive
-                google_drive_service.download_files(item, "./tmp")
-
-                # Send the downloaded file to the user
-                with open(f"./tmp/{file_name}", 'rb') as file:
-                    sent_message = bot.send_document(user_id, file)
-                    # Add the file to the database
-                    crud.update_project_file(
-                        project_id=project_id,
-                        file_name=file_name,
-                        file_type="pdf",
-                        file_telegram_id=sent_message.document.file_id
-                    )
-                    logger.info(f"File {file_name} updated in the database")
-
-                # Remove file
-                os.remove(f"./tmp/{file_name}")
-
-
-def send_project_files(items: list[dict], project_id: int, user_id, bot) -> None:
-    for item in items:
-        file_name = item['title']
-
-        # Check that file_name has a file extension
-        if not re.search(r"\.\w+$", file_name):
-            file_name += ".pdf"
-
-        # Check if the file is already in the database
-        project_file = crud.get_project_file_by_name(file_name)
-
-        if not project_file:
-            logger.info(f"Downloading file {file_name} from Google Drive")
-
-            # Download the file from Google Drive
-            google_drive_service.download_files(item, "./tmp")
-
-            # Send the downloaded file to the user
-            with open(f"./tmp/{file_name}", 'rb') as file:
-                sent_message = bot.send_document(user_id, file)
-                # Add the file to the database
-                crud.add_project_file(
-                    project_id=project_id,
-                    file_name=file_name,
-                    file_type="pdf",
-                    file_telegram_id=sent_message.document.file_id
-                )
-
-            # Remove file
-            os.remove(f"./tmp/{file_name}")
-        else:
-            logger.info(f"File {file_name} already exists in the database")
-            try:
-                bot.send_document(user_id, project_file.file_telegram_id)
-            except Exception as e:
-                logger.error(f"An error occurred: {e}")
-
-                # Download the file from Google Drive
-                google_drive_service.download_files(item, "./tmp")
-
-                # Send the downloaded file to the user
-                with open(f"./tmp/{file_name}", 'rb') as file:
-                    sent_message = bot.send_document(user_id, file)
-                    # Add the file to the database
-                    crud.update_project_file(
-                        project_id=project_id,
-                        file_name=file_name,
-                        file_type="pdf",
-                        file_telegram_id=sent_message.document.file_id
-                    )
-                    logger.info(f"File {file_name} updated in the database")
-
-                # Remove file
-                os.remove(f"./tmp/{file_name}")
+def send_project_files(items: list[GoogleDriveFile], project_id: int, user_id, bot) -> None:
+    """ Send project files to the user in the background, in the order they are listed. """
+    get_delivery_pipeline(bot, google_drive_service).submit(items, project_id=project_id, user_id=user_id)
 
 
 def register_handlers(bot):
@@ -175,7 +66,7 @@ def register_handlers(bot):
         project_name = message.text
 
         try:
-            projects = crud.query_projects_by_name(project_name, mode="ilike")
+            projects = query_projects_by_name(project_name, mode="ilike")
 
             if projects:
                 if len(projects) == 1:
@@ -205,13 +96,14 @@ def register_handlers(bot):
                         reply_markup=projects_buttons
                     )
             else:
-                projects = crud.query_projects_by_name(
+                projects = query_projects_by_name(
                     project_name, mode="cosine",
-                    similarity_threshold=config.app.similarity_threshold
+                    similarity_threshold=config.app.similarity_threshold,
+                    top_k=config.app.top_k
                 )
                 if projects:
                     projects_buttons = create_query_results_buttons(
-                        [project.project_name_id_buildings for project in projects][:config.app.top_k],
+                        [project.project_name_id_buildings for project in projects],
                         lang=user.lang
                     )
                     bot.reply_to(message, strings[user.lang].result_positive_suggestions, reply_markup=projects_buttons)
@@ -227,8 +119,7 @@ def register_handlers(bot):
     def show_selected_project(call, data):
         user = data["user"]
         project_name = call.data.replace("_files_", "")
-        projects = crud.query_projects_by_name(project_name)
-        project = [project for project in projects if project.project_name_id_buildings == project_name][0]
+        project = project_index.get_by_name(project_name)[0]
         items = query_files_from_folder(project_name)
         if items:
             bot.send_message(user.id, config.strings[user.lang].files_found.format(n=len(items)))
@@ -266,22 +157,23 @@ def register_handlers(bot):
                         logger.info(f"File {project_file.file_name.split('.')[0]} not found in Google Drive")
                         continue
 
-                # Download the file from Google Drive
-                google_drive_service.download_files(google_file, "./tmp")
+                # Stream the file from Google Drive to the user
+                content = drive_downloader.acquire(google_file)
+                try:
+                    with content.open() as stream:
+                        sent_message = bot.send_document(user_id, stream, visible_file_name=google_file['title'])
+                finally:
+                    drive_downloader.release(content)
 
-                # Send the downloaded file to the user
-                with open(f"./tmp/{google_file['title']}", 'rb') as file:
-                    sent_message = bot.send_document(user_id, file)
-                    # Add the file to the database
-                    crud.add_project_file(
-                        project_id=project_file.project_id,
-                        file_name=project_file.file_name,
-                        file_type="pdf",
-                        file_telegram_id=sent_message.document.file_id
-                    )
-
-                # Remove file
-                os.remove(f"./tmp/{google_file['title']}")
+                # Add the file to the database
+                crud.upsert_project_file(
+                    project_id=project_file.project_id,
+                    file_name=project_file.file_name,
+                    file_type="pdf",
+                    file_telegram_id=sent_message.document.file_id,
+                    drive_file_id=google_file.get("id"),
+                    md5_checksum=google_file.get("md5Checksum")
+                )
 
         else:
             bot.reply_to(
@@ -1,11 +1,13 @@
 import logging
 import os
+from typing import Optional
 
 from omegaconf import OmegaConf
 from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
 
-from real_estate_telegram_bot.db import crud
 from real_estate_telegram_bot.core import excel
+from real_estate_telegram_bot.core.reports import report_cache
+from real_estate_telegram_bot.core.service_charges import get_area_service_charge_by_year
 
 config = OmegaConf.load("./src/real_estate_telegram_bot/conf/apps/service_charge.yaml")
 strings = config.strings
@@ -50,6 +52,17 @@ def create_main_menu_button(lang: str):
     main_menu_button.add(KeyboardButton(strings[lang].main_menu))
     return main_menu_button
 
+def build_service_charge_report(area: str) -> Optional[str]:
+    """ Write the service charges of a normalized area to a formatted Excel file, or return None when there are none """
+    df = get_area_service_charge_by_year(area)
+    if len(df) == 0:
+        return None
+
+    # Write the formatted Excel file to a temporary directory
+    area_name = area.title()
+    filepath = os.path.join("./tmp", f"{area_name}_service_charge.xlsx")
+    return excel.write_service_charge(df, filepath, master_project_en=area_name, header_color="ed7d31")
+
 def register_handlers(bot):
     """ Register the service charge handlers """
     logger.info("Registering service charge handlers")
@@ -72,16 +85,11 @@ def register_handlers(bot):
 
     def get_service_charge(message, user):
         area_name = message.text
-        df = crud.get_area_service_charge_by_year(area_name)
-        if len(df) != 0:
-            filename = f"{area_name}_service_charge.xlsx"
-            filepath = os.path.join("./tmp", filename)
-            df.to_excel(filepath, index=False)
-            excel.format_service_charge(filepath, master_project_en=area_name, header_color="ed7d31")
-            with open(filepath, 'rb') as file:
-                bot.send_document(user.id, file, caption=strings[user.lang].result_positive)
-            os.remove(filepath)
-        else:
+        sent = report_cache.send(
+            bot, user.id, "service_charge", area_name, "service_charges", build_service_charge_report,
+            caption=strings[user.lang].result_positive,
+        )
+        if not sent:
             bot.send_message(user.id, strings[user.lang].result_negative)
 
     @bot.callback_query_handler(func=lambda call: "_service_charge_" in call.data)
@@ -91,30 +99,14 @@ def register_handlers(bot):
         user = data["user"]
         lang = user.lang
 
-        df = crud.get_project_service_charge_by_year(master_project_en)
-
-        if len(df) != 0:
-
-            # Define the filename for the Excel file
-            filename = f"{master_project_en}_service_charge.xlsx"
-            filepath = os.path.join("./tmp", filename)  # Save it to a temporary directory
-
-            # Save the DataFrame to a local Excel file
-            df.to_excel(filepath, index=False)
-
-            # Format the Excel file
-            excel.format_service_charge(filepath, master_project_en=master_project_en, header_color="ed7d31")
-
-            # Send the formatted Excel file to the user
-            with open(filepath, 'rb') as file:
-                bot.send_document(
-                    user.id, file, caption=strings[lang].result_positive,
-                    reply_markup=create_main_menu_button(lang)
-                )
+        # Send the formatted Excel file to the user, generated once per import
+        sent = report_cache.send(
+            bot, user.id, "service_charge", master_project_en, "service_charges", build_service_charge_report,
+            caption=strings[lang].result_positive,
+            reply_markup=create_main_menu_button(lang),
+        )
 
-            # Delete the Excel file after sending it
-            os.remove(filepath)
-        else:
+        if not sent:
             bot.send_message(user.id, strings[lang].result_negative)
             bot.send_message(user.id, strings[lang].enter_own_area)
             bot.register_next_step_handler_by_chat_id(user.id, get_service_charge, user)
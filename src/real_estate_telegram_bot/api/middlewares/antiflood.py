@@ -1,30 +1,31 @@
 from telebot import TeleBot
 from telebot.handler_backends import BaseMiddleware, CancelUpdate
+from telebot.types import CallbackQuery, Message
+
+from real_estate_telegram_bot.core.ratelimit import TokenBucketLimiter
 
 
 class AntifloodMiddleware(BaseMiddleware):
-    def __init__(self, bot: TeleBot, limit: int) -> None:
+    def __init__(self, bot: TeleBot, limiter: TokenBucketLimiter) -> None:
         """Middleware to prevent flooding
         Args:
             bot (TeleBot): TeleBot instance
-            limit (int): Limit in seconds
+            limiter (TokenBucketLimiter): Rate limiter keyed by user id, in memory or shared
         """
         self.bot = bot
-        self.last_time: dict[str, str] = {}
-        self.limit = limit
-        self.update_types = ["message"]
+        self.limiter = limiter
+        self.update_types = ["message", "callback_query"]
         # Always specify update types, otherwise middlewares won't work
 
-    def pre_process(self, message, data):
-        if message.from_user.id not in self.last_time:
-            # User is not in a dict, so lets add and cancel this function
-            self.last_time[message.from_user.id] = message.date
+    def pre_process(self, update, data):
+        if self.limiter.allow(update.from_user.id):
             return
-        if message.date - self.last_time[message.from_user.id] < self.limit:
-            # User is flooding
-            self.bot.send_message(message.chat.id, "You are making request too often")
-            return CancelUpdate()
-        self.last_time[message.from_user.id] = message.date
+        # User is flooding
+        if isinstance(update, CallbackQuery):
+            self.bot.answer_callback_query(update.id, "You are making request too often")
+        elif isinstance(update, Message):
+            self.bot.send_message(update.chat.id, "You are making request too often")
+        return CancelUpdate()
 
-    def post_process(self, message, data, exception):
+    def post_process(self, update, data, exception):
         pass
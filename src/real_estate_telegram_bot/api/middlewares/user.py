@@ -1,26 +1,39 @@
 import logging
+from typing import Optional
 
 from telebot.handler_backends import BaseMiddleware
 from telebot.types import CallbackQuery, Message
 
+from real_estate_telegram_bot.core.event_logger import EventLogger
 from real_estate_telegram_bot.db import crud
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+def log_event(event_logger: Optional[EventLogger], user_id: int, content: str, type: str) -> None:
+    """Queue the event on the write-behind logger, or write it directly if there is none."""
+    if event_logger is not None:
+        event = event_logger.log(user_id=user_id, content=content, type=type)
+        event = {**event, "timestamp": event["timestamp"].strftime("%Y-%m-%d %H:%M:%S")}
+    else:
+        event = crud.create_event(user_id=user_id, content=content, type=type).dict()
+
+    # Log event to the console
+    logger.info(event)
+
+
 class UserMessageMiddleware(BaseMiddleware):
-    def __init__(self) -> None:
+    def __init__(self, event_logger: Optional[EventLogger] = None) -> None:
         self.update_types = ["message"]
+        self.event_logger = event_logger
 
     def pre_process(self, message: Message, data: dict):
-        user = crud.upsert_user(
+        user = crud.touch_user(
             id=message.from_user.id,
             username=message.from_user.username
         )
-        event = crud.create_event(user_id=user.id, content=message.text, type="message")
-        # Log event to the console
-        logger.info(event.dict())
+        log_event(self.event_logger, user_id=user.id, content=message.text, type="message")
 
         # Set the user data to the data dictionary
         data["user"] = user
@@ -30,18 +43,16 @@ class UserMessageMiddleware(BaseMiddleware):
 
 
 class UserCallbackMiddleware(BaseMiddleware):
-    def __init__(self) -> None:
+    def __init__(self, event_logger: Optional[EventLogger] = None) -> None:
         self.update_types = ["callback_query"]
+        self.event_logger = event_logger
 
     def pre_process(self, callback_query: CallbackQuery, data: dict):
-        user = crud.upsert_user(
+        user = crud.touch_user(
             id=callback_query.from_user.id,
             username=callback_query.from_user.username
         )
-        event = crud.create_event(user_id=user.id, content=callback_query.data, type="callback")
-
-        # Log event to the console
-        logger.info(event.dict())
+        log_event(self.event_logger, user_id=user.id, content=callback_query.data, type="callback")
 
         # Set the user data to the data dictionary
         data["user"] = user
@@ -1,15 +1,20 @@
 import logging
 
+from typing import Optional
+
 from fastapi import APIRouter
 from telebot import TeleBot
 
+from real_estate_telegram_bot.api.dispatcher import UpdateDispatcher
+from real_estate_telegram_bot.db.database import get_pool_status
+
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
-def create_router(bot: TeleBot) -> APIRouter:
+def create_router(bot: TeleBot, dispatcher: Optional[UpdateDispatcher] = None) -> APIRouter:
     """ Create the health check router """
     router = APIRouter()
 
@@ -18,4 +23,12 @@ def create_router(bot: TeleBot) -> APIRouter:
     def health_check() -> bool:
         return True
 
+    @router.get("/health/db")
+    def db_pool_status() -> dict:
+        return get_pool_status()
+
+    @router.get("/health/dispatcher")
+    def dispatcher_status() -> dict:
+        return dispatcher.stats() if dispatcher is not None else {}
+
     return router
@@ -0,0 +1,36 @@
+import hmac
+import logging
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from telebot import types
+
+from real_estate_telegram_bot.api.dispatcher import UpdateDispatcher
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+def create_router(dispatcher: UpdateDispatcher, path: str, secret_token: str) -> APIRouter:
+    """ Create the router Telegram posts updates to in webhook mode """
+    router = APIRouter()
+
+    logger.info(f"Creating the webhook router on {path}")
+
+    @router.post(path)
+    async def receive_update(
+        request: Request,
+        x_telegram_bot_api_secret_token: str = Header(default=""),
+    ) -> dict:
+        if not hmac.compare_digest(x_telegram_bot_api_secret_token.encode(), secret_token.encode()):
+            raise HTTPException(status_code=403)
+        update = types.Update.de_json(await request.json())
+        # Telegram sends the update again later when it is not acknowledged
+        if not dispatcher.put(update):
+            logger.warning(f"Update queue is full, update {update.update_id} refused")
+            raise HTTPException(status_code=503)
+        return {"ok": True}
+
+    return router
@@ -0,0 +1,38 @@
+import logging
+import threading
+from typing import Optional
+
+from telebot import TeleBot
+
+from real_estate_telegram_bot.api.dispatcher import UpdateDispatcher
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+def run_polling(
+    bot: TeleBot,
+    dispatcher: UpdateDispatcher,
+    polling_timeout: int = 290,
+    long_polling_timeout: int = 20,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """Fetch updates with long polling and queue them in `dispatcher`, until `stop` is set."""
+    stop = stop or threading.Event()
+    offset = None
+    while not stop.is_set():
+        try:
+            updates = bot.get_updates(offset=offset, timeout=polling_timeout, long_polling_timeout=long_polling_timeout)
+        except Exception as e:
+            logger.error(f"Error getting updates: {e}")
+            stop.wait(3)
+            continue
+        for update in updates:
+            # Wait for room in the queue rather than dropping updates
+            while not dispatcher.put(update):
+                if stop.wait(0.1):
+                    return
+            offset = update.update_id + 1
@@ -1,10 +1,17 @@
 import asyncio
+import concurrent.futures
 import logging.config
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
 
 from dotenv import find_dotenv, load_dotenv
 from omegaconf import OmegaConf
 from telethon import TelegramClient
+from telethon.errors import UserNotParticipantError
+from telethon.tl.functions.channels import GetParticipantRequest
 
 
 # Set up logging
@@ -26,32 +33,231 @@ if API_HASH is None:
     logger.error("Variable API_HASH is not set")
 
 
-async def check_user_in_channel(channel_name: str, username: str):
-    
-    #PHONE = os.getenv("PHONE")
+class ChannelMembershipService:
+    """Answer whether a user is a member of a channel without blocking on Telegram.
 
+    A single Telethon client stays connected on a background event loop and periodically
+    downloads the channel participants into sets of ids and usernames, so that most checks
+    are set lookups. Users missing from the last snapshot, e.g. who joined since, are checked
+    with one `GetParticipantRequest`, and every answer is cached for a while. Failed checks
+    are not cached, and the cache keeps at most `max_cache_size` users. When the client
+    fails to connect, the next check or refresh connects again, waiting longer after each
+    consecutive failure.
+    """
 
-    # if PHONE is None:
-    #     logger.error("Variable PHONE is not set")
+    def __init__(
+        self,
+        channel_name: str,
+        refresh_interval_seconds: float = 600,
+        positive_ttl_seconds: float = 3600,
+        negative_ttl_seconds: float = 60,
+        timeout_seconds: float = 5,
+        max_cache_size: int = 100_000,
+        reconnect_backoff_seconds: float = 5,
+        max_reconnect_backoff_seconds: float = 300,
+        session: str = "user",
+    ) -> None:
+        """
+        Args:
+            channel_name: Username of the channel, without `@`.
+            refresh_interval_seconds: Time between two downloads of the participant list.
+            positive_ttl_seconds: Time a user found in the channel is not checked again.
+            negative_ttl_seconds: Time a user not found in the channel is not checked again.
+            timeout_seconds: Maximum time a check waits for Telegram.
+            max_cache_size: Maximum number of cached answers.
+            reconnect_backoff_seconds: Time before connecting again after a first failure,
+                doubled after each consecutive failure.
+            max_reconnect_backoff_seconds: Maximum time between two connection attempts.
+            session: Name of the Telethon session file.
+        """
+        self.channel_name = channel_name
+        self.refresh_interval = refresh_interval_seconds
+        self.positive_ttl = positive_ttl_seconds
+        self.negative_ttl = negative_ttl_seconds
+        self.timeout = timeout_seconds
+        self.max_cache_size = max_cache_size
+        self.reconnect_backoff = reconnect_backoff_seconds
+        self.max_reconnect_backoff = max_reconnect_backoff_seconds
+        self.session = session
+        self.member_ids: frozenset[int] = frozenset()
+        self.member_usernames: frozenset[str] = frozenset()
+        self.refreshed_at: Optional[float] = None
+        # (user id or lowercased username) -> (is member, expiry time), least recently stored first
+        self._cache: OrderedDict[object, tuple[bool, float]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[TelegramClient] = None
+        self._channel = None
+        # Connection of the client, replaced by a new attempt once it failed and the backoff is over
+        self._ready: Optional[concurrent.futures.Future] = None
+        self._connect_failures = 0
+        self._next_connect_at = 0.0
+        self._start_lock = threading.Lock()
 
-    client = TelegramClient("user", API_ID, API_HASH)
-    await client.start()
-    logger.info(f"Checking users in channel {channel_name}")
-    # get all the channels that I can access
-    channels = {d.entity.username: d.entity
-                for d in await client.get_dialogs()
-                if d.is_channel}
-    # choose the one that I want list users from
-    channel = channels[channel_name]
-    participants = await client.get_participants(channel)
-    logger.info(f"Members of channel: {len(participants)}")
-    client.disconnect()
-    return username in [member.username for member in participants]
+    def start(self) -> None:
+        """Start the event loop thread, log the client in and schedule participant refreshes."""
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="channel-membership", daemon=True).start()
+            self._ready = asyncio.run_coroutine_threadsafe(self._connect(), self._loop)
+            asyncio.run_coroutine_threadsafe(self._refresh_periodically(), self._loop)
 
-def check_user_in_channel_sync(channel_name: str, username: str):
-    return asyncio.run(check_user_in_channel(channel_name, username))
+    def _ensure_ready(self) -> concurrent.futures.Future:
+        """Return the connection of the client, connecting again if it failed and the backoff is over."""
+        with self._start_lock:
+            ready = self._ready
+            if ready.done() and ready.exception() is not None:
+                now = time.monotonic()
+                if now >= self._next_connect_at:
+                    self._connect_failures += 1
+                    backoff = min(
+                        self.max_reconnect_backoff, self.reconnect_backoff * 2 ** (self._connect_failures - 1)
+                    )
+                    self._next_connect_at = now + backoff
+                    logger.info(f"Connecting again to Telegram to check members of {self.channel_name}")
+                    self._ready = asyncio.run_coroutine_threadsafe(self._connect(), self._loop)
+            return self._ready
+
+    def is_member(self, user_id: Optional[int] = None, username: Optional[str] = None) -> Optional[bool]:
+        """
+        Check whether a user is a member of the channel.
+
+        Args:
+            user_id: Telegram id of the user, preferred over the username when given.
+            username: Telegram username of the user.
+
+        Returns:
+            Whether the user is a member, or None when it could not be determined in time.
+            Callers must deny access on None.
+        """
+        username = username.lower().lstrip("@") if username else None
+        keys = [key for key in (user_id, username) if key is not None]
+        if not keys:
+            return False
+
+        now = time.monotonic()
+        with self._cache_lock:
+            for key in keys:
+                cached = self._cache.get(key)
+                if cached is not None and cached[1] > now:
+                    return cached[0]
+        if (user_id is not None and user_id in self.member_ids) or (username in self.member_usernames):
+            self._remember(keys, True)
+            return True
+
+        self.start()
+        try:
+            is_member = asyncio.run_coroutine_threadsafe(
+                self._check_participant(user_id, username), self._loop
+            ).result(timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"Error checking membership of user {user_id or username} in {self.channel_name}: {e}")
+            return None
+        self._remember(keys, is_member)
+        return is_member
+
+    def _remember(self, keys: list, is_member: bool) -> None:
+        now = time.monotonic()
+        expires_at = now + (self.positive_ttl if is_member else self.negative_ttl)
+        with self._cache_lock:
+            for key in keys:
+                self._cache.pop(key, None)
+                self._cache[key] = (is_member, expires_at)
+            if len(self._cache) > self.max_cache_size:
+                # Drop the expired answers first, then the oldest ones
+                for key in [key for key, (_, expiry) in self._cache.items() if expiry <= now]:
+                    del self._cache[key]
+                while len(self._cache) > self.max_cache_size:
+                    self._cache.popitem(last=False)
+
+    async def _connect(self) -> None:
+        if self._client is not None:
+            # Drop the client of the failed attempt
+            try:
+                await self._client.disconnect()
+            except Exception as e:
+                logger.warning(f"Error disconnecting the previous Telegram client: {e}")
+        self._client = TelegramClient(self.session, API_ID, API_HASH)
+        await self._client.start()
+        self._channel = await self._client.get_input_entity(self.channel_name)
+        with self._start_lock:
+            self._connect_failures = 0
+            self._next_connect_at = 0.0
+
+    async def _check_participant(self, user_id: Optional[int], username: Optional[str]) -> bool:
+        await asyncio.wrap_future(self._ensure_ready())
+        try:
+            # Ids can only be resolved for users the client has seen, usernames always can
+            user = await self._client.get_input_entity(user_id if user_id is not None else username)
+        except ValueError:
+            if username is None:
+                return False
+            user = await self._client.get_input_entity(username)
+        try:
+            await self._client(GetParticipantRequest(self._channel, user))
+        except UserNotParticipantError:
+            return False
+        return True
+
+    async def _refresh(self) -> None:
+        await asyncio.wrap_future(self._ensure_ready())
+        start_time = time.perf_counter()
+        member_ids = set()
+        member_usernames = set()
+        async for member in self._client.iter_participants(self._channel):
+            member_ids.add(member.id)
+            if member.username:
+                member_usernames.add(member.username.lower())
+        self.member_ids = frozenset(member_ids)
+        self.member_usernames = frozenset(member_usernames)
+        self.refreshed_at = time.monotonic()
+        logger.info(
+            f"Loaded {len(member_ids)} members of channel {self.channel_name} "
+            f"in {time.perf_counter() - start_time:.1f}s"
+        )
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            try:
+                await self._refresh()
+                delay = self.refresh_interval
+            except Exception as e:
+                logger.error(f"Error loading members of channel {self.channel_name}: {e}")
+                # Try again once the client may connect again rather than a full interval later
+                delay = min(self.refresh_interval, max(self._next_connect_at - time.monotonic(), self.reconnect_backoff))
+            await asyncio.sleep(delay)
+
+
+_services: dict[str, ChannelMembershipService] = {}
+_services_lock = threading.Lock()
+
+
+def get_membership_service(channel_name: str) -> ChannelMembershipService:
+    """Return the membership service of a channel, creating it from the configuration on first use."""
+    with _services_lock:
+        service = _services.get(channel_name)
+        if service is None:
+            service = ChannelMembershipService(
+                channel_name,
+                refresh_interval_seconds=config.channel_membership.refresh_interval_seconds,
+                positive_ttl_seconds=config.channel_membership.positive_ttl_seconds,
+                negative_ttl_seconds=config.channel_membership.negative_ttl_seconds,
+                timeout_seconds=config.channel_membership.timeout_seconds,
+                max_cache_size=config.channel_membership.max_cache_size,
+                reconnect_backoff_seconds=config.channel_membership.reconnect_backoff_seconds,
+                max_reconnect_backoff_seconds=config.channel_membership.max_reconnect_backoff_seconds,
+            )
+            service.start()
+            _services[channel_name] = service
+        return service
+
+
+def check_user_in_channel_sync(channel_name: str, username: Optional[str], user_id: Optional[int] = None):
+    """Check whether a user is a member of a channel, see `ChannelMembershipService.is_member`."""
+    return get_membership_service(channel_name).is_member(user_id=user_id, username=username)
 
-# To call the function from another file, you need to run it within an event loop
 if __name__ == "__main__":
     channel_name = "happy_carrot_test"
     username = "konverner"
@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from datetime import timedelta
+from typing import Optional
+
+from omegaconf import OmegaConf
+
+from real_estate_telegram_bot.core.sender import SendQueue, get_send_queue
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.models import Broadcast
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+strings = OmegaConf.load("./src/real_estate_telegram_bot/conf/admin/public_message.yaml")
+
+
+class BroadcastWorker:
+    """Send the public messages scheduled by admins, resuming them after a restart.
+
+    Broadcasts are stored in Postgres with a cursor, the id of the last user they were sent
+    to. A single thread picks the due broadcasts in order and queues them for the users of
+    their audience in id order, one batch at a time, in the send queue that enforces the Telegram rate limits.
+    The outcome for each user is recorded and the cursor advanced after each batch. After a
+    restart, sending continues from the cursor and the users of the interrupted batch who
+    already got the message are skipped. The admin who scheduled the message is kept
+    informed of the progress.
+    """
+
+    def __init__(
+        self,
+        bot,
+        send_queue: SendQueue,
+        poll_interval_seconds: float = 10,
+        batch_size: int = 100,
+        progress_interval_seconds: float = 30,
+    ) -> None:
+        """
+        Args:
+            bot: The Telegram bot instance.
+            send_queue: The queue the messages are sent through.
+            poll_interval_seconds: Time between two checks for due broadcasts.
+            batch_size: Number of recipients queued at once.
+            progress_interval_seconds: Minimum time between two progress reports to the admin.
+        """
+        self.bot = bot
+        self.send_queue = send_queue
+        self.poll_interval = poll_interval_seconds
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="broadcasts", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop after the batch being sent, the broadcast resumes on the next start."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_pending(self) -> None:
+        """Send every due broadcast."""
+        while not self._stop.is_set():
+            broadcast = crud.read_due_broadcast()
+            if broadcast is None:
+                return
+            self.send(broadcast)
+
+    def send(self, broadcast: Broadcast) -> None:
+        """Send a broadcast to the users it was not sent to yet."""
+        if broadcast.status == "scheduled":
+            crud.set_broadcast_status(broadcast.id, "sending")
+            logger.info(f"Sending broadcast {broadcast.id}")
+        else:
+            logger.info(f"Resuming broadcast {broadcast.id} after user {broadcast.cursor}")
+
+        audience = crud.broadcast_audience(broadcast)
+        progress = _Progress(self.bot, broadcast, crud.count_recipients(after_id=broadcast.cursor, **audience))
+        for recipients in crud.iter_recipients(after_id=broadcast.cursor, batch_size=self.batch_size, **audience):
+            if self._stop.is_set():
+                return
+            # Admins may cancel the broadcast while it is being sent
+            if crud.read_broadcast(broadcast.id).status == "cancelled":
+                logger.info(f"Broadcast {broadcast.id} cancelled")
+                return
+
+            user_ids = [recipient.id for recipient in recipients]
+            delivered = crud.read_delivered_user_ids(broadcast.id, user_ids)
+            sends = {
+                user_id: self._submit(broadcast, user_id) for user_id in user_ids if user_id not in delivered
+            }
+            for user_id, future in sends.items():
+                try:
+                    future.result()
+                    crud.record_broadcast_delivery(broadcast.id, user_id, "sent")
+                    progress.sent += 1
+                except CancelledError:
+                    # The send queue was stopped, the message is sent after the restart
+                    return
+                except Exception as e:
+                    logger.error(f"Error sending broadcast {broadcast.id} to {user_id}: {e}")
+                    crud.record_broadcast_delivery(broadcast.id, user_id, "failed", error=str(e)[:1000])
+                    progress.failed += 1
+            crud.advance_broadcast_cursor(broadcast.id, user_ids[-1])
+            if time.monotonic() - progress.reported_at >= self.progress_interval:
+                progress.report()
+
+        if self._stop.is_set():
+            return
+        crud.set_broadcast_status(broadcast.id, "completed")
+        broadcast = crud.read_broadcast(broadcast.id)
+        logger.info(f"Broadcast {broadcast.id} completed: {broadcast.sent} sent, {broadcast.failed} failed")
+        progress.completed(broadcast)
+
+    def _submit(self, broadcast: Broadcast, user_id: int) -> Future:
+        if broadcast.media_type == "photo":
+            return self.send_queue.submit(user_id, self.bot.send_photo, broadcast.photo, caption=broadcast.content or "")
+        return self.send_queue.submit(user_id, self.bot.send_message, broadcast.content)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Error sending broadcasts: {e}")
+            if self._stop.wait(self.poll_interval):
+                return
+
+
+class _Progress:
+    """Progress of a broadcast, reported to the admin who scheduled it in a single message."""
+
+    def __init__(self, bot, broadcast: Broadcast, remaining: int) -> None:
+        self.bot = bot
+        self.broadcast_id = broadcast.id
+        self.admin_id = broadcast.created_by
+        self.total = broadcast.sent + broadcast.failed + remaining
+        self.done_before = broadcast.sent + broadcast.failed
+        self.sent = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+        self.reported_at = self.started_at
+        self.message = None
+        user = crud.read_user(self.admin_id) if self.admin_id is not None else None
+        self.lang = user.lang if user is not None and user.lang in strings else "en"
+
+    def report(self) -> None:
+        done = self.sent + self.failed
+        elapsed = time.monotonic() - self.started_at
+        rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.done_before - done)
+        eta = timedelta(seconds=int(remaining / rate)) if rate > 0 else "?"
+        self._notify(strings[self.lang].broadcast_progress.format(
+            message_id=self.broadcast_id,
+            done=self.done_before + done,
+            total=self.total,
+            failed=self.failed,
+            rate=rate,
+            eta=eta,
+        ))
+        self.reported_at = time.monotonic()
+
+    def completed(self, broadcast: Broadcast) -> None:
+        self._notify(strings[self.lang].broadcast_completed.format(
+            message_id=broadcast.id,
+            sent=broadcast.sent,
+            failed=broadcast.failed,
+            duration=timedelta(seconds=int(time.monotonic() - self.started_at)),
+        ))
+
+    def _notify(self, text: str) -> None:
+        if self.admin_id is None:
+            return
+        try:
+            if self.message is None:
+                self.message = self.bot.send_message(self.admin_id, text)
+            else:
+                self.bot.edit_message_text(text, self.admin_id, self.message.message_id)
+        except Exception as e:
+            logger.error(f"Error reporting the progress of broadcast {self.broadcast_id}: {e}")
+
+
+def create_broadcast_worker(bot) -> BroadcastWorker:
+    """Create the broadcast worker of a bot from the configuration."""
+    return BroadcastWorker(
+        bot,
+        get_send_queue(),
+        poll_interval_seconds=config.broadcasts.poll_interval_seconds,
+        batch_size=config.broadcasts.batch_size,
+        progress_interval_seconds=config.broadcasts.progress_interval_seconds,
+    )
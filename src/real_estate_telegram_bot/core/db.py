@@ -1,204 +1,223 @@
 import logging
+import math
+import time
+
+import openpyxl
 import pandas as pd
 import numpy as np
-
-from real_estate_telegram_bot.db.crud import upsert_project_service_charge, read_service_charge
-from real_estate_telegram_bot.db.crud import upsert_project, read_project
-from real_estate_telegram_bot.db.models import ProjectServiceCharge, Project
+from sqlalchemy import DateTime, Integer
+
+from real_estate_telegram_bot.db.crud import (
+    bump_data_version,
+    import_projects,
+    import_service_charges,
+    read_project_ids,
+    service_charge_key,
+)
+from real_estate_telegram_bot.core.search import project_index
+from real_estate_telegram_bot.core.service_charges import service_charge_pivot
+from real_estate_telegram_bot.db.models import SERVICE_CHARGE_KEY_COLUMNS, Project, ProjectServiceCharge
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def compare_service_charges(charge1: ProjectServiceCharge, charge2: ProjectServiceCharge):
-    """
-    Compare two ServiceCharge objects and return a dictionary of differences.
-    """
-    differences = {}
-    for key in charge1.__dict__:
-        if key.startswith("_"):
-            continue
-        if str(charge1.__dict__[key]) != str(charge2.__dict__[key]):
-            differences[key] = (charge1.__dict__[key], charge2.__dict__[key])
-    return differences
+# Range of PostgreSQL integer columns
+INTEGER_MIN = -2**31
+INTEGER_MAX = 2**31 - 1
 
-def compare_projects(project1: Project, project2: Project):
+def import_service_charges_from_excel(excel_file_path: str, batch_size: int = 1000):
     """
-    Compare two Project objects and return a dictionary of differences.
-    """
-    differences = {}
-    for key in project1.__dict__:
-        if key.startswith("_"):
-            continue
-        if str(project1.__dict__[key]) != str(project2.__dict__[key]):
-            differences[key] = (project1.__dict__[key], project2.__dict__[key])
-    return differences
-
-def import_service_charges_from_excel(excel_file_path: str):
-    
-    # Initialize results tracking
-    results = []
+    Import service charges from an Excel file, streaming rows instead of loading the sheet.
 
-    # Step 1: Read the Excel file
-    df = pd.read_excel(excel_file_path, na_values=['#N/A','NA', 'N/A', 'nan', 'NaN', '', 'NaT'], keep_default_na=False)
-    df = df.where(pd.notnull(df), None)
-    df = df.replace({np.nan: None})
-
-    # Step 2: Iterate over DataFrame rows and create ServiceCharge objects
-    for index, row in df.iterrows():
-        try:
-            if index % 100 == 0:
-                print(f"{index/len(df)*100:.2f}% done")
-            service_charge = ProjectServiceCharge(
-                charge_id=row['charge_id'],
-                project_id=row['project_id'],
-                charge_amount=row['charge_amount'],
-                charge_date=row['charge_date'],
-                charge_description=row['charge_description']
-            )
-
-            # Check if service charge exists
-            existing = read_service_charge(service_charge.charge_id)
-
-            if existing:
-                diffs = compare_service_charges(service_charge, existing)
-                if not diffs:
-                    status = "unchanged"
-                    message = " "
-                else:
-                    # show what columns have changed
-                    status = "updated"
-                    message = diffs
-                    upsert_project_service_charge(service_charge)
-
-            else:
-                upsert_project_service_charge(service_charge)
-                status = "created"
-                message = " "
+    Rows are validated against the `ProjectServiceCharge` columns, deduplicated by their
+    natural key (project, property group, usage, budget year) and written in batches
+    within a single transaction.
+    """
+    start_time = time.perf_counter()
+    columns = {column.name: column for column in ProjectServiceCharge.__table__.columns if column.name != "id"}
+
+    # Step 1: Open the sheet in read-only mode and map the header
+    workbook = openpyxl.load_workbook(excel_file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+        missing = [name for name in columns if name not in header]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        positions = {name: header.index(name) for name in columns}
+        project_ids = read_project_ids()
+
+        # Initialize results tracking
+        results = []
+        row_by_key: dict[tuple, int] = {}
+
+        # Step 2: Validate rows lazily while they are written in batches
+        def valid_rows():
+            for row_number, row in enumerate(rows, start=2):
+                if all(cell is None for cell in row):
+                    continue
+                try:
+                    service_charge = {}
+                    for name, column in columns.items():
+                        value = row[positions[name]] if positions[name] < len(row) else None
+                        if isinstance(value, str) and not value.strip():
+                            value = None
+                        service_charge[name] = coerce_value(value, column.type)
+                    if service_charge["budget_year"] is None:
+                        raise ValueError("budget_year is missing")
+                    if service_charge["project_id"] not in project_ids:
+                        raise ValueError(f"Unknown project_id {service_charge['project_id']}")
+                except Exception as e:
+                    results.append({"row": row_number, "status": "error", "message": str(e)})
+                    continue
+
+                key = service_charge_key(service_charge)
+                if key in row_by_key:
+                    previous = results[row_by_key[key]]
+                    previous["status"] = "skipped"
+                    previous["message"] = f"Superseded by row {row_number}"
+                row_by_key[key] = len(results)
+                results.append({"row": row_number, **dict(zip(SERVICE_CHARGE_KEY_COLUMNS, key)), "status": None, "message": " "})
+                yield service_charge
+
+        statuses = import_service_charges(valid_rows(), batch_size=batch_size)
+    finally:
+        workbook.close()
+
+    for key, index in row_by_key.items():
+        results[index]["status"] = statuses.get(key, "unchanged")
 
-            results.append({
-                "charge_id": service_charge.charge_id,
-                "status": status,
-                "message": message
-            })
-            
-        except Exception as e:
-            results.append({
-                "charge_id": row.get('charge_id', 'unknown'),
-                "status": "error", 
-                "message": str(e)
-            })
-    
     # Create results DataFrame
-    results_df = pd.DataFrame(results)
-    
+    results_df = pd.DataFrame(
+        results, columns=["row", *SERVICE_CHARGE_KEY_COLUMNS, "status", "message"]
+    )
+
+    # Log summary and report throughput alongside the results
+    elapsed = time.perf_counter() - start_time
+    counts = results_df["status"].value_counts()
+    results_df.attrs["summary"] = {
+        "rows": len(results_df),
+        "created": int(counts.get("created", 0)),
+        "updated": int(counts.get("updated", 0)),
+        "unchanged": int(counts.get("unchanged", 0)),
+        "skipped": int(counts.get("skipped", 0)),
+        "errors": int(counts.get("error", 0)),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(len(results_df) / elapsed, 1) if elapsed else None,
+    }
+    logger.info(f"Service charges import: {results_df.attrs['summary']}")
+
+    # Serve lookups and reports from the new service charges, other processes rebuild
+    # their pivot once they notice the new version
+    bump_data_version("service_charges")
+    service_charge_pivot.rebuild()
+
     return results_df
 
-def compare_projects(project1: Project, project2: Project):
+def coerce_value(value, column_type):
     """
-    Compare two Project objects and return a dictionary of differences.
+    Convert a cell value read from Excel to the Python type of a model column.
+
+    Values that the database would reject are refused here, so that an invalid cell is
+    reported for its row rather than failing the whole import.
+
+    Raises:
+        ValueError: If the value cannot be converted.
     """
-    differences = {}
-    for key in project1.__dict__:
-        if key.startswith("_"):
-            continue
-        if str(project1.__dict__[key]) != str(project2.__dict__[key]):
-            differences[key] = (project1.__dict__[key], project2.__dict__[key])
-    return differences
+    if value is None:
+        return None
+    if isinstance(column_type, Integer):
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                return None
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(f"{value!r} is not a number")
+        # Round half away from zero, like PostgreSQL does when storing into an integer column
+        integer = int(math.copysign(math.floor(abs(number) + 0.5), number))
+        if not INTEGER_MIN <= integer <= INTEGER_MAX:
+            raise ValueError(f"{value!r} is out of the integer range")
+        return integer
+    if isinstance(column_type, DateTime):
+        timestamp = pd.to_datetime(value)
+        return None if pd.isna(timestamp) else timestamp.to_pydatetime()
+    text = str(value)
+    # PostgreSQL text cannot contain NUL characters
+    if "\x00" in text:
+        raise ValueError(f"{text!r} contains a NUL character")
+    return text
+
 
 def import_projects_from_excel(excel_file_path: str):
-    
+
     # Initialize results tracking
     results = []
+    start_time = time.perf_counter()
 
     # Step 1: Read the Excel file
     df = pd.read_excel(excel_file_path, na_values=['#N/A','NA', 'N/A', 'nan', 'NaN', '', 'NaT'], keep_default_na=False)
     df = df.where(pd.notnull(df), None)
     df = df.replace({np.nan: None})
 
-    # Step 2: Iterate over DataFrame rows and create Project objects
-    for index, row in df.iterrows():
+    # Step 2: Validate rows and convert them to column values
+    columns = Project.__table__.columns
+    projects = []
+    for index, row in enumerate(df.to_dict("records")):
         try:
-            if index % 100 == 0:
-                print(f"{index/len(df)*100:.2f}% done")
-            project = Project(
-                project_id=row['project_id'],
-                project_name=row['project_name'],
-                project_name_id_buildings=row['project_name_id_buildings'],
-                developer_id=row['developer_id'],
-                developer_name=row['developer_name'],
-                developer_name_en=row['developer_name_en'],
-                registration_date=row['registration_date'],
-                license_source_en=row['license_source_en'],
-                license_number=row['license_number'],
-                license_issue_date=row['license_issue_date'],
-                license_expiry_date=row['license_expiry_date'],
-                chamber_of_commerce_no=row['chamber_of_commerce_no'],
-                webpage=row['webpage'],
-                master_developer_name=row['master_developer_name'],
-                master_developer_name_en=row['master_developer_name_en'],
-                project_start_date=row['project_start_date'],
-                project_end_date=row['project_end_date'],
-                project_status=row['project_status'],
-                percent_completed=row['percent_completed'],
-                completion_date=row['completion_date'],
-                cancellation_date=row['cancellation_date'],
-                project_description_en=row['project_description_en'],
-                area_name_en=row['area_name_en'],
-                master_project_en=row['master_project_en'],
-                zoning_authority_en=row['zoning_authority_en'],
-                no_of_buildings=row['no_of_buildings'],
-                no_of_villas=row['no_of_villas'],
-                no_of_units=row['no_of_units'],
-                is_free_hold=row['is_free_hold'],
-                is_lease_hold=row['is_lease_hold'],
-                is_registered=row['is_registered'],
-                property_type_en=row['property_type_en'],
-                property_sub_type_en=row['property_sub_type_en'],
-                land_type_en=row['land_type_en'],
-                floors=row['floors']
-            )
-
-            # Check if project exists
-            existing = read_project(project.project_id)
-            
-            if existing:
-                diffs = compare_projects(project, existing)
-                if not diffs:
-                    status = "unchanged"
-                    message = " "
-                else:
-                    # show what columns have changed
-                    status = "updated"
-                    message = diffs
-                    upsert_project(project)
-                    
-                    
-            else:
-                upsert_project(project)
-                status = "created"
-                message = " "
-                
-            results.append({
-                "project_id": project.project_id,
-                "status": status,
-                "message": message
-            })
-            
+            project = {column.name: coerce_value(row.get(column.name), column.type) for column in columns}
+            if project["project_id"] is None:
+                raise ValueError("project_id is missing")
+            projects.append(project)
+            results.append(None)
         except Exception as e:
             results.append({
                 "project_id": row.get('project_id', 'unknown'),
-                "status": "error", 
+                "status": "error",
                 "message": str(e)
             })
-    
+
+    # Step 3: Stage, diff and apply all valid rows in one transaction
+    imported = iter(import_projects(projects))
+    for index, result in enumerate(results):
+        if result is not None:
+            continue
+        project_result = next(imported)
+        if project_result["status"] == "updated":
+            # show what columns have changed
+            message = project_result["changes"]
+        elif project_result["status"] == "skipped":
+            message = "Superseded by a later row with the same project_id"
+        else:
+            message = " "
+        results[index] = {
+            "project_id": project_result["project_id"],
+            "status": project_result["status"],
+            "message": message
+        }
+
     # Create results DataFrame
-    results_df = pd.DataFrame(results)
-    
+    results_df = pd.DataFrame(results, columns=["project_id", "status", "message"])
+
     # Log summary
     total = len(results_df)
     created = len(results_df[results_df['status'] == 'created'])
     updated = len(results_df[results_df['status'] == 'updated'])
     errors = len(results_df[results_df['status'] == 'error'])
-    logger.info(f"Processed {total} records: {created} created {updated} updated, {errors} errors")
-    
-    return results_df
\ No newline at end of file
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Processed {total} records in {elapsed:.2f}s: {created} created {updated} updated, {errors} errors")
+    results_df.attrs["summary"] = {
+        "rows": total,
+        "created": created,
+        "updated": updated,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed, 1) if elapsed else None,
+    }
+
+    # Serve lookups and reports from the new catalogue, other processes rebuild their index
+    # once they notice the new version
+    bump_data_version("projects")
+    project_index.rebuild()
+
+    return results_df
@@ -0,0 +1,321 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from omegaconf import OmegaConf
+from pydrive2.drive import GoogleDriveFile
+from telebot.apihelper import ApiTelegramException
+from telebot.types import InputMediaDocument
+
+from real_estate_telegram_bot.core.downloads import DriveContent, drive_downloader
+from real_estate_telegram_bot.core.google import GoogleDriveService
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.models import ProjectFile
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+
+def normalize_file_name(title: str) -> str:
+    """Return the file name a Drive file is stored under, adding `.pdf` when it has no extension."""
+    return title if re.search(r"\.\w+$", title) else title + ".pdf"
+
+
+def is_current(project_file: ProjectFile, item: GoogleDriveFile) -> bool:
+    """Check whether a cached Telegram file was uploaded from the current version of a Drive file."""
+    md5_checksum = item.get("md5Checksum")
+    return project_file.md5_checksum is None or md5_checksum is None or project_file.md5_checksum == md5_checksum
+
+
+def call_with_retry(method, *args, max_retries: int = 3, **kwargs):
+    """Call a Telegram API method, waiting and retrying when the rate limit is hit."""
+    for attempt in range(1, max_retries + 1):
+        try:
+            if attempt > 1:
+                # Rewind files that were partially read by the previous attempt
+                for arg in args:
+                    if hasattr(arg, "seek"):
+                        arg.seek(0)
+            return method(*args, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code != 429 or attempt == max_retries:
+                raise
+            retry_after = e.result_json.get("parameters", {}).get("retry_after", 1)
+            logger.warning(f"Rate limited by Telegram, retrying in {retry_after}s")
+            time.sleep(retry_after)
+
+
+class FileDeliveryPipeline:
+    """Deliver project documents from Google Drive to a Telegram chat.
+
+    Files are always sent in the order they are given. Files already uploaded to Telegram are
+    sent by their cached file id, consecutive ones grouped into albums; the others are
+    streamed from Drive ahead of time by a pool of workers while earlier files are being sent,
+    at most `prefetch` files ahead so that a delivery holds a bounded amount of content.
+    When a storage chat is configured, uncached files are also uploaded to it in parallel and
+    then sent to the user by file id. Deliveries run outside of the polling thread.
+    """
+
+    def __init__(
+        self,
+        bot,
+        drive_service: GoogleDriveService,
+        download_workers: int = 4,
+        upload_workers: int = 3,
+        max_concurrent_jobs: int = 8,
+        max_retries: int = 3,
+        storage_chat_id: Optional[int] = None,
+        media_group_size: int = 10,
+        prefetch: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            bot: The Telegram bot instance.
+            drive_service: The service used to download files from Google Drive.
+            download_workers: Number of concurrent Drive downloads.
+            upload_workers: Number of concurrent uploads to the storage chat.
+            max_concurrent_jobs: Number of deliveries that run at the same time.
+            max_retries: Number of attempts for a Telegram request that hit a rate limit.
+            storage_chat_id: Chat that uncached files are uploaded to before being sent to users.
+            media_group_size: Maximum number of files sent as one album, at most 10.
+            prefetch: Number of uncached files of a delivery downloaded ahead of the one being
+                sent, `download_workers` by default.
+        """
+        self.bot = bot
+        self.drive_service = drive_service
+        self.downloader = drive_downloader
+        self.max_retries = max_retries
+        self.storage_chat_id = storage_chat_id
+        # Telegram albums hold between 2 and 10 items
+        self.media_group_size = max(1, min(media_group_size, 10))
+        self.prefetch = max(1, prefetch or download_workers)
+        self._jobs = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="delivery")
+        self._downloads = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="delivery-download")
+        self._uploads = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="delivery-upload")
+
+    def submit(self, items: list[GoogleDriveFile], project_id: int, user_id: int) -> Future:
+        """Schedule the delivery of `items` to `user_id` and return immediately."""
+        future = self._jobs.submit(self.deliver, items, project_id, user_id)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def deliver(self, items: list[GoogleDriveFile], project_id: int, user_id: int) -> dict[str, int]:
+        """
+        Send `items` to `user_id` in order, blocking until every file was sent.
+
+        Returns:
+            The number of files sent from the cache, uploaded and failed.
+        """
+        start_time = time.perf_counter()
+        stats = {"cached": 0, "uploaded": 0, "failed": 0}
+        file_names = [normalize_file_name(item["title"]) for item in items]
+        project_files = crud.get_project_files_by_names(file_names)
+        # Files changed in Drive since they were uploaded are sent again from Drive
+        project_files = {
+            file_name: project_files[file_name]
+            for item, file_name in zip(items, file_names)
+            if file_name in project_files and is_current(project_files[file_name], item)
+        }
+
+        # Download the uncached files in the order they will be sent, a few files ahead.
+        # `pending` holds the downloads, or uploads to the storage chat, not consumed yet.
+        uncached = iter([
+            position for position, file_name in enumerate(file_names) if file_name not in project_files
+        ])
+        pending: dict[int, Future] = {}
+        downloads: dict[int, Future] = {}
+
+        def prefetch() -> None:
+            while len(pending) < self.prefetch:
+                position = next(uncached, None)
+                if position is None:
+                    return
+                item, file_name = items[position], file_names[position]
+                download = downloads[position] = self._downloads.submit(self.downloader.acquire, item)
+                if self.storage_chat_id is not None:
+                    pending[position] = self._uploads.submit(
+                        self._upload_to_storage, item, download, file_name, project_id
+                    )
+                else:
+                    pending[position] = download
+
+        # Files that already have a Telegram file id, waiting to be sent as one album:
+        # (item, file name, file id, whether the file id was cached before this delivery)
+        group: list[tuple[GoogleDriveFile, str, str, bool]] = []
+        try:
+            for position, (item, file_name) in enumerate(zip(items, file_names)):
+                prefetch()
+                try:
+                    project_file = project_files.get(file_name)
+                    if project_file is not None:
+                        group.append((item, file_name, project_file.file_telegram_id, True))
+                    elif self.storage_chat_id is not None:
+                        upload = pending.pop(position)
+                        prefetch()
+                        group.append((item, file_name, upload.result(), False))
+                    else:
+                        # Send the files before it so that the chat keeps the listed order
+                        self._send_group(user_id, group, project_id, stats)
+                        group = []
+                        download = pending.pop(position)
+                        prefetch()
+                        self._send_file(user_id, item, download.result(), file_name, project_id)
+                        stats["uploaded"] += 1
+                except Exception as e:
+                    logger.error(f"Error delivering file {file_name} to user {user_id}: {e}")
+                    stats["failed"] += 1
+                if len(group) >= self.media_group_size:
+                    self._send_group(user_id, group, project_id, stats)
+                    group = []
+            self._send_group(user_id, group, project_id, stats)
+        finally:
+            # Release the content of downloads that will not be sent
+            for position, future in pending.items():
+                if self.storage_chat_id is None:
+                    future.add_done_callback(self._release_download)
+                elif future.cancel():
+                    downloads[position].add_done_callback(self._release_download)
+
+        logger.info(
+            f"Delivered {len(items)} files of project {project_id} to user {user_id} "
+            f"in {time.perf_counter() - start_time:.1f}s: {stats}"
+        )
+        return stats
+
+    def shutdown(self) -> None:
+        """Wait for running deliveries and stop the worker pools."""
+        self._jobs.shutdown(wait=True)
+        self._uploads.shutdown(wait=True)
+        self._downloads.shutdown(wait=True)
+
+    def _release_download(self, download: Future) -> None:
+        if not download.cancelled() and download.exception() is None:
+            self.downloader.release(download.result())
+
+    def _upload_to_storage(self, item: GoogleDriveFile, download: Future, file_name: str, project_id: int) -> str:
+        """Upload a downloaded file to the storage chat and cache its Telegram file id."""
+        content = download.result()
+        try:
+            with content.open() as stream:
+                message = self._with_retry(
+                    self.bot.send_document, self.storage_chat_id, stream, visible_file_name=file_name
+                )
+        finally:
+            self.downloader.release(content)
+        crud.upsert_project_file(
+            file_name=file_name,
+            file_type="pdf",
+            file_telegram_id=message.document.file_id,
+            project_id=project_id,
+            drive_file_id=item.get("id"),
+            md5_checksum=item.get("md5Checksum")
+        )
+        return message.document.file_id
+
+    def _send_file(
+        self, user_id: int, item: GoogleDriveFile, content: DriveContent, file_name: str, project_id: int
+    ) -> None:
+        """Upload a downloaded file to the user and cache its Telegram file id."""
+        try:
+            with content.open() as stream:
+                message = self._with_retry(self.bot.send_document, user_id, stream, visible_file_name=file_name)
+        finally:
+            self.downloader.release(content)
+        crud.upsert_project_file(
+            file_name=file_name,
+            file_type="pdf",
+            file_telegram_id=message.document.file_id,
+            project_id=project_id,
+            drive_file_id=item.get("id"),
+            md5_checksum=item.get("md5Checksum")
+        )
+
+    def _send_group(
+        self,
+        user_id: int,
+        group: list[tuple[GoogleDriveFile, str, str, bool]],
+        project_id: int,
+        stats: dict[str, int],
+    ) -> None:
+        """
+        Send files by Telegram file id, as one album when there are several of them.
+
+        Never raises, files that could not be sent are counted as failed in `stats`.
+        """
+        if len(group) > 1:
+            try:
+                media = [InputMediaDocument(file_telegram_id) for _, _, file_telegram_id, _ in group]
+                self._with_retry(self.bot.send_media_group, user_id, media)
+                for _, _, _, cached in group:
+                    stats["cached" if cached else "uploaded"] += 1
+                return
+            except ApiTelegramException as e:
+                # One of the file ids may be stale, find it by sending the files one by one
+                logger.error(f"Error sending {len(group)} files as an album, sending them one by one: {e}")
+            except Exception as e:
+                logger.error(f"Error sending {len(group)} files as an album to user {user_id}: {e}")
+                stats["failed"] += len(group)
+                return
+
+        for item, file_name, file_telegram_id, cached in group:
+            try:
+                try:
+                    self._with_retry(self.bot.send_document, user_id, file_telegram_id)
+                    stats["cached" if cached else "uploaded"] += 1
+                except ApiTelegramException as e:
+                    # The cached file id is no longer valid, upload the file again
+                    logger.error(f"Error sending cached file {file_name}: {e}")
+                    content = self.downloader.acquire(item)
+                    self._send_file(user_id, item, content, file_name, project_id)
+                    stats["uploaded"] += 1
+            except Exception as e:
+                logger.error(f"Error delivering file {file_name} to user {user_id}: {e}")
+                stats["failed"] += 1
+
+    def _with_retry(self, method, *args, **kwargs):
+        return call_with_retry(method, *args, max_retries=self.max_retries, **kwargs)
+
+    @staticmethod
+    def _log_failure(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"File delivery failed: {future.exception()}")
+
+
+_pipelines: dict[int, FileDeliveryPipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_delivery_pipeline(bot, drive_service: GoogleDriveService) -> FileDeliveryPipeline:
+    """Return the delivery pipeline of a bot, creating it from the configuration on first use."""
+    with _pipelines_lock:
+        pipeline = _pipelines.get(id(bot))
+        if pipeline is None:
+            pipeline = FileDeliveryPipeline(
+                bot,
+                drive_service,
+                download_workers=config.delivery.download_workers,
+                upload_workers=config.delivery.upload_workers,
+                max_concurrent_jobs=config.delivery.max_concurrent_jobs,
+                max_retries=config.delivery.max_retries,
+                storage_chat_id=config.delivery.storage_chat_id,
+                media_group_size=config.delivery.media_group_size,
+                prefetch=config.delivery.prefetch,
+            )
+            _pipelines[id(bot)] = pipeline
+        return pipeline
+
+
+def shutdown_delivery_pipelines() -> None:
+    """Wait for the running deliveries of every pipeline created so far and stop their workers."""
+    with _pipelines_lock:
+        pipelines = list(_pipelines.values())
+    for pipeline in pipelines:
+        pipeline.shutdown()
@@ -0,0 +1,137 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import BinaryIO, Optional
+
+from omegaconf import OmegaConf
+from pydrive2.drive import GoogleDriveFile
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+MEGABYTE = 1024 * 1024
+
+
+class DriveContent:
+    """Content of a downloaded Drive file, shared by everyone who asked for it.
+
+    Small files are kept in memory and large ones in a unique temporary file. Every holder
+    opens its own stream with `open()` and must call `DriveDownloader.release` when done.
+    """
+
+    def __init__(self, file_id: str, data: Optional[bytes] = None, path: Optional[str] = None) -> None:
+        self.file_id = file_id
+        self.data = data
+        self.path = path
+        self.size = len(data) if data is not None else os.path.getsize(path)
+
+    def open(self) -> BinaryIO:
+        """Return a new stream positioned at the start of the content."""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return open(self.path, "rb")
+
+    def discard(self) -> None:
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _Download:
+    def __init__(self) -> None:
+        self.future: Future = Future()
+        self.holders = 0
+
+
+class DriveDownloader:
+    """Stream Google Drive files into spooled buffers, downloading each file once at a time.
+
+    Concurrent requests for the same Drive file id wait for the download that is already in
+    flight and share its content; it is discarded when the last holder releases it.
+    """
+
+    def __init__(self, max_memory_bytes: int = 20 * MEGABYTE, chunk_size: int = MEGABYTE) -> None:
+        """
+        Args:
+            max_memory_bytes: Size above which the content is moved from memory to a temporary file.
+            chunk_size: Size of the chunks requested from Drive.
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.chunk_size = chunk_size
+        self.deduplicated = 0
+        self._downloads: dict[str, _Download] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, item: GoogleDriveFile) -> DriveContent:
+        """Return the content of a Drive file, downloading it unless it is already in flight."""
+        file_id = item["id"]
+        with self._lock:
+            download = self._downloads.get(file_id)
+            is_leader = download is None
+            if is_leader:
+                download = self._downloads[file_id] = _Download()
+            else:
+                self.deduplicated += 1
+            download.holders += 1
+
+        if is_leader:
+            try:
+                download.future.set_result(self._download(item))
+            except Exception as e:
+                download.future.set_exception(e)
+        try:
+            return download.future.result()
+        except Exception:
+            self._release(file_id)
+            raise
+
+    def release(self, content: DriveContent) -> None:
+        """Give up a content returned by `acquire`."""
+        self._release(content.file_id)
+
+    def _release(self, file_id: str) -> None:
+        with self._lock:
+            download = self._downloads[file_id]
+            download.holders -= 1
+            if download.holders > 0:
+                return
+            del self._downloads[file_id]
+        if download.future.exception() is None:
+            download.future.result().discard()
+
+    def _download(self, item: GoogleDriveFile) -> DriveContent:
+        logger.info(f"Downloading file {item['title']} from Google Drive")
+        buffer = io.BytesIO()
+        temp_file = None
+        try:
+            for chunk in item.GetContentIOBuffer(chunksize=self.chunk_size):
+                if temp_file is None and buffer.tell() + len(chunk) > self.max_memory_bytes:
+                    # Spill to disk once the file is too large to keep in memory
+                    fd, path = tempfile.mkstemp(prefix="drive_")
+                    temp_file = os.fdopen(fd, "wb")
+                    temp_file.write(buffer.getbuffer())
+                    buffer = None
+                (temp_file or buffer).write(chunk)
+        except Exception:
+            if temp_file is not None:
+                temp_file.close()
+                os.remove(path)
+            raise
+
+        if temp_file is None:
+            return DriveContent(item["id"], data=buffer.getvalue())
+        temp_file.close()
+        return DriveContent(item["id"], path=path)
+
+
+drive_downloader = DriveDownloader(
+    max_memory_bytes=config.downloads.max_memory_mb * MEGABYTE,
+    chunk_size=config.downloads.chunk_size_mb * MEGABYTE,
+)
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from omegaconf import OmegaConf
+from pydrive2.drive import GoogleDriveFile
+
+from real_estate_telegram_bot.core.google import GoogleDriveService
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+FILE_FIELDS = "id,title,mimeType,md5Checksum,modifiedDate,fileSize,parents(id),labels(trashed)"
+
+
+def _file_metadata(item: dict) -> dict:
+    """Keep the metadata fields the bot needs from a Drive v2 file resource."""
+    return {
+        "id": item["id"],
+        "title": item.get("title"),
+        "mimeType": item.get("mimeType"),
+        "md5Checksum": item.get("md5Checksum"),
+        "modifiedDate": item.get("modifiedDate"),
+        "fileSize": item.get("fileSize"),
+        "parents": [parent["id"] for parent in item.get("parents", [])],
+    }
+
+
+class DriveIndex:
+    """Local index of the Google Drive folders and files shared with the service account.
+
+    Maps folder titles to ids and folders to the metadata of their files, so that project
+    views do not search and list Drive on every request. The index is persisted as JSON and
+    kept up to date incrementally from the Drive changes feed.
+    """
+
+    def __init__(self, drive_service: GoogleDriveService, path: str) -> None:
+        self.drive_service = drive_service
+        self.path = path
+        self.page_token: Optional[str] = None
+        self.updated_at: Optional[float] = None
+        # file id -> metadata, folders included
+        self._files: dict[str, dict] = {}
+        self._folders_by_title: dict[str, list[str]] = defaultdict(list)
+        self._children: dict[str, list[str]] = defaultdict(list)
+        self._lock = threading.RLock()
+
+    @property
+    def ready(self) -> bool:
+        return self.page_token is not None
+
+    def _reindex(self) -> None:
+        """Rebuild the lookup tables from `_files`."""
+        folders_by_title = defaultdict(list)
+        children = defaultdict(list)
+        for file_id, item in self._files.items():
+            if item["mimeType"] == FOLDER_MIME_TYPE:
+                folders_by_title[item["title"]].append(file_id)
+            else:
+                for parent_id in item["parents"]:
+                    children[parent_id].append(file_id)
+        for file_ids in children.values():
+            file_ids.sort(key=lambda file_id: self._files[file_id]["title"] or "")
+        self._folders_by_title = folders_by_title
+        self._children = children
+
+    def load(self) -> bool:
+        """Load the index from disk. Returns False if there is no saved index."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        with self._lock:
+            self._files = state["files"]
+            self.page_token = state["page_token"]
+            self.updated_at = state.get("updated_at")
+            self._reindex()
+        logger.info(f"Drive index loaded from {self.path} with {len(self._files)} items")
+        return True
+
+    def save(self) -> None:
+        """Write the index to disk, replacing the previous file atomically."""
+        with self._lock:
+            state = {"page_token": self.page_token, "updated_at": self.updated_at, "files": self._files}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.path)
+
+    def build(self) -> None:
+        """List every file in Drive and replace the index."""
+        start_time = time.perf_counter()
+        changes = self.drive_service.gauth.service.changes()
+        # Take the token first so that changes made while listing are replayed by `refresh`
+        page_token = changes.getStartPageToken().execute()["startPageToken"]
+        file_list = self.drive_service.drive.ListFile(
+            {"q": "trashed = false", "maxResults": 1000, "fields": f"nextPageToken,items({FILE_FIELDS})"}
+        ).GetList()
+        files = {item["id"]: _file_metadata(item) for item in file_list}
+        with self._lock:
+            self._files = files
+            self.page_token = page_token
+            self.updated_at = time.time()
+            self._reindex()
+            self.save()
+        logger.info(f"Drive index built with {len(file_list)} items in {time.perf_counter() - start_time:.1f}s")
+
+    def refresh(self) -> int:
+        """
+        Apply the changes made in Drive since the last build or refresh.
+
+        Returns:
+            The number of applied changes.
+        """
+        if not self.ready:
+            self.build()
+            return 0
+
+        changes = self.drive_service.gauth.service.changes()
+        page_token = self.page_token
+        new_page_token = None
+        applied = 0
+        with self._lock:
+            # Apply changes to a copy so that readers never see a half-applied page
+            files = dict(self._files)
+            while page_token is not None:
+                response = changes.list(
+                    pageToken=page_token,
+                    includeDeleted=True,
+                    maxResults=1000,
+                    fields=f"nextPageToken,newStartPageToken,items(fileId,deleted,file({FILE_FIELDS}))",
+                ).execute()
+                for change in response.get("items", []):
+                    item = change.get("file")
+                    if change.get("deleted") or item is None or item.get("labels", {}).get("trashed"):
+                        files.pop(change["fileId"], None)
+                    else:
+                        files[item["id"]] = _file_metadata(item)
+                    applied += 1
+                new_page_token = response.get("newStartPageToken", new_page_token)
+                page_token = response.get("nextPageToken")
+
+            # Only move the token forward once every page was applied
+            self.page_token = new_page_token or self.page_token
+            self.updated_at = time.time()
+            if applied:
+                self._files = files
+                self._reindex()
+            self.save()
+        if applied:
+            logger.info(f"Drive index refreshed with {applied} changes")
+        return applied
+
+    def get_folder_id(self, folder_name: str) -> Optional[str]:
+        """Find a folder id by its title, retrying with the lowercased title like `GoogleDriveService`."""
+        folder_ids = self._folders_by_title.get(folder_name) or self._folders_by_title.get(folder_name.lower())
+        return folder_ids[0] if folder_ids else None
+
+    def list_files(self, folder_name: str, live_fallback: bool = True) -> list[GoogleDriveFile]:
+        """
+        Return the files in the folder with the given title.
+
+        Args:
+            folder_name: The title of the folder in Google Drive.
+            live_fallback: Whether to list the folder live when the index is not built yet or
+                does not know the folder, e.g. because it was created since the last refresh.
+        Returns:
+            The files in the folder, or an empty list if there is none.
+        """
+        folder_name = folder_name.strip()
+        folder_id = self.get_folder_id(folder_name) if self.ready else None
+        if folder_id is None:
+            if not live_fallback:
+                return []
+            folder_id = self.drive_service.get_folder_id(folder_name)
+            if folder_id is None:
+                return []
+            return self.drive_service.list_files_in_folder(folder_id)
+        drive = self.drive_service.drive
+        files = self._files
+        return [
+            drive.CreateFile(dict(files[file_id]))
+            for file_id in self._children.get(folder_id, []) if file_id in files
+        ]
+
+    def folder_titles(self) -> list[str]:
+        """Return the titles of all indexed folders."""
+        return sorted(self._folders_by_title)
+
+
+_drive_index: Optional[DriveIndex] = None
+_drive_index_lock = threading.Lock()
+
+
+def get_drive_index(drive_service: Optional[GoogleDriveService] = None) -> DriveIndex:
+    """
+    Return the process-wide Drive index, loading it from disk on first use.
+
+    A missing index is not built here but by the first `refresh`, which the bot schedules in
+    the background at startup, so that no user request waits for a full Drive listing.
+    """
+    global _drive_index
+    if _drive_index is None:
+        with _drive_index_lock:
+            if _drive_index is None:
+                drive_index = DriveIndex(drive_service or GoogleDriveService(), config.drive_index.path)
+                drive_index.load()
+                _drive_index = drive_index
+    return _drive_index
+
+
+def query_files_from_folder(folder_name: str, drive_service: GoogleDriveService) -> list[GoogleDriveFile]:
+    """
+    Query files from a specific folder in Google Drive.
+
+    Uses the local Drive index when it is enabled and falls back to listing the folder live,
+    also while the index is being built and for folders it does not know yet.
+
+    Args:
+        folder_name: The name of the folder in Google Drive.
+        drive_service: The service used for live listing and to build the index.
+    Returns:
+        A list of files in the folder.
+    """
+    if config.drive_index.enabled:
+        try:
+            return get_drive_index(drive_service).list_files(folder_name)
+        except Exception as e:
+            logger.error(f"Drive index is unavailable, listing folder '{folder_name}' live: {e}")
+    folder_id = drive_service.get_folder_id(folder_name.strip())
+    if folder_id is None:
+        return []
+    return drive_service.list_files_in_folder(folder_id)
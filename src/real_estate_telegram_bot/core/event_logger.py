@@ -0,0 +1,144 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from real_estate_telegram_bot.db import crud
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class EventLogger:
+    """Write-behind event logger.
+
+    Events are buffered in a bounded in-memory queue and bulk-inserted by a background
+    thread every `batch_size` events or `flush_interval_ms` milliseconds, whichever
+    comes first, so that handlers never wait for the database.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval_ms: int = 500,
+        max_queue_size: int = 10000,
+        overflow_policy: str = "drop",
+        block_timeout_ms: int = 50,
+        max_retries: int = 3,
+    ) -> None:
+        """
+        Args:
+            batch_size: Maximum number of events written in one statement.
+            flush_interval_ms: Maximum time an event waits in the queue before being written.
+            max_queue_size: Capacity of the in-memory queue.
+            overflow_policy: What to do when the queue is full: `drop` the new event immediately
+                or `block` the caller for up to `block_timeout_ms` before dropping it.
+            block_timeout_ms: How long `log` may block under the `block` policy.
+            max_retries: Number of attempts to write a batch before it is discarded.
+        """
+        if overflow_policy not in ("drop", "block"):
+            raise ValueError(f"Overflow policy {overflow_policy} is not supported.")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout_ms / 1000
+        self.max_retries = max_retries
+
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self.written = 0
+        self.dropped = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background flusher thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="event-logger", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Event logger started with batch size {self.batch_size} "
+            f"and flush interval {int(self.flush_interval * 1000)} ms"
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher thread after writing every queued event."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"Event logger stopped: {self.written} events written, {self.dropped} dropped")
+
+    def log(self, user_id: int, content: Optional[str], type: str) -> dict:
+        """Queue an event for writing and return it.
+
+        When the queue is full the event is dropped according to the overflow policy.
+        """
+        event = {"user_id": user_id, "content": content, "type": type, "timestamp": datetime.now()}
+        try:
+            if self.overflow_policy == "block":
+                self.queue.put(event, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Event queue is full, {self.dropped} events dropped so far")
+        return event
+
+    def stats(self) -> dict[str, int]:
+        """Return queue statistics for monitoring."""
+        return {"queued": self.queue.qsize(), "written": self.written, "dropped": self.dropped}
+
+    def _next_batch(self) -> list[dict]:
+        """Collect up to `batch_size` events, waiting at most `flush_interval` after the first one."""
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: list[dict]) -> None:
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.written += crud.create_events(batch)
+                return
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} events (attempt {attempt}/{self.max_retries}): {e}")
+                if not self._stop_event.is_set():
+                    time.sleep(min(2 ** attempt, 10) * 0.5)
+        self.dropped += len(batch)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+        # Drain whatever is left on shutdown
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._flush(batch)
@@ -1,12 +1,25 @@
 import os
+from copy import copy
 
 import openpyxl
+import pandas as pd
 import weasyprint
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.utils import get_column_letter
 from xlsx2html import xlsx2html
 
 
+def read_excel_header(filepath: str) -> list[str]:
+    """Return the column names in the first row of the active sheet without loading the rest of it."""
+    wb = openpyxl.load_workbook(filepath, read_only=True)
+    try:
+        header = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+    finally:
+        wb.close()
+    return [str(cell).strip() for cell in header if cell is not None]
+
+
 def format_areas(filepath: str, header_color: str = "92d050"):
     # Load the Excel file to apply formatting
     wb = openpyxl.load_workbook(filepath)
@@ -105,6 +118,125 @@ def format_service_charge(filepath: str, master_project_en: str, header_color: s
     return filepath
 
 
+def _cell_values(df: pd.DataFrame) -> list[list]:
+    """Return the rows of a DataFrame as Python values, with None for missing values and empty strings."""
+    rows = df.astype(object).where(df.notna(), None).values.tolist()
+    return [[None if value == "" else value for value in row] for row in rows]
+
+
+def _column_widths(header: list, rows: list[list]) -> list[int]:
+    """Return the width fitting the longest value of each column, with extra padding."""
+    widths = [len(str(name)) for name in header]
+    for row in rows:
+        for i, value in enumerate(row):
+            if value is not None and len(str(value)) > widths[i]:
+                widths[i] = len(str(value))
+    return [width + 2 for width in widths]
+
+
+class _CellStyle:
+    """Style applied to many write-only cells, registered in the workbook once."""
+
+    def __init__(self, ws, font: Font = None, fill: PatternFill = None, alignment: Alignment = None) -> None:
+        self.ws = ws
+        template = WriteOnlyCell(ws)
+        if font is not None:
+            template.font = font
+        if fill is not None:
+            template.fill = fill
+        if alignment is not None:
+            template.alignment = alignment
+        # Assigning the style objects looks them up in the workbook, copying the ids does not
+        self._style = template._style
+
+    def __call__(self, value) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self.ws, value=value)
+        cell._style = copy(self._style)
+        return cell
+
+
+def write_areas(df: pd.DataFrame, filepath: str, header_color: str = "92d050") -> str:
+    """
+    Write the buildings of an area to an Excel file styled like `format_areas`, in a single pass.
+
+    Rows are streamed with openpyxl's write-only mode, so the workbook is never loaded back,
+    and the column widths are computed from the values before they are written.
+
+    Args:
+        df: The buildings, one row per building.
+        filepath: Path of the Excel file to write.
+        header_color: Hex color code for the header background.
+
+    Returns:
+        The filepath of the written Excel file.
+    """
+    header = list(df.columns)
+    rows = _cell_values(df)
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for i, width in enumerate(_column_widths(header, rows), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    centered = Alignment(horizontal='center', vertical='center')
+    header_fill = PatternFill(start_color=header_color, end_color=header_color, fill_type="solid")
+    header_style = _CellStyle(ws, fill=header_fill, alignment=centered)
+    value_style = _CellStyle(ws, alignment=centered)
+    ws.append([header_style(name) for name in header])
+    for row in rows:
+        ws.append([value_style(value) for value in row])
+
+    wb.save(filepath)
+    return filepath
+
+
+def write_service_charge(df: pd.DataFrame, filepath: str, master_project_en: str, header_color: str = "92d050") -> str:
+    """
+    Write service charges pivoted by year to an Excel file styled like `format_service_charge`, in a single pass.
+
+    The title rows are written before the data instead of being inserted afterwards, and the
+    title over the year columns is centered across them rather than merged, as merged cells
+    are not available in write-only mode.
+
+    Args:
+        df: The service charges, with the project and property group columns followed by the years.
+        filepath: Path of the Excel file to write.
+        master_project_en: Area written in the title.
+        header_color: Hex color code for the header background.
+
+    Returns:
+        The filepath of the written Excel file.
+    """
+    header = list(df.columns)
+    rows = _cell_values(df)
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    # Only the project and property group columns are fitted to their values
+    title = ["master_project_en", master_project_en]
+    widths = _column_widths(header[:2], [row[:2] for row in rows] + [title])
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    bold = Font(bold=True)
+    header_fill = PatternFill(start_color=header_color, end_color=header_color, fill_type="solid")
+    centered_across = Alignment(horizontal='centerContinuous', vertical='center')
+    title_style = _CellStyle(ws, font=bold, fill=header_fill)
+    years_title_style = _CellStyle(ws, font=bold, alignment=centered_across)
+    header_style = _CellStyle(ws, fill=header_fill)
+    ws.append([title_style(title[0]), title[1]])
+    ws.append([None, None] + [
+        years_title_style("Service charges (AED per sqft/year)" if i == 0 else None)
+        for i in range(max(len(header) - 2, 1))
+    ])
+    ws.append([header_style(name) for name in header])
+    for row in rows:
+        ws.append(row)
+
+    wb.save(filepath)
+    return filepath
+
+
 def format_query_files(filepath: str, header_color: str = "92d050"):
     # Load the Excel file to apply formatting
     wb = openpyxl.load_workbook(filepath)
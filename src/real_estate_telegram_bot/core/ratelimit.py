@@ -0,0 +1,143 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class TokenBucketLimiter:
+    """Rate limit keys, e.g. user ids, with one token bucket per key kept in memory.
+
+    Each key may make `capacity` requests at once and then `rate` requests per second. A
+    bucket left idle long enough to refill completely is indistinguishable from a new one,
+    so it is evicted; the least recently used buckets are also evicted beyond `max_keys`.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1, max_keys: int = 100_000) -> None:
+        """
+        Args:
+            rate: Number of tokens added to a bucket per second.
+            capacity: Maximum number of tokens in a bucket, i.e. the allowed burst.
+            max_keys: Maximum number of buckets kept.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.idle_seconds = capacity / rate
+        # key -> (tokens, time of the last update), least recently used first
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: Hashable, cost: float = 1) -> bool:
+        """Take `cost` tokens from the bucket of `key`, returning False when it has too few."""
+        return self.wait_time(key, cost) == 0
+
+    def wait_time(self, key: Hashable, cost: float = 1, consume: bool = True) -> float:
+        """
+        Take `cost` tokens from the bucket of `key` if it has enough.
+
+        Args:
+            key: The rate limited key.
+            cost: Number of tokens to take.
+            consume: Whether to take the tokens, or only check that there are enough.
+
+        Returns:
+            0 when there were enough tokens, otherwise the time in seconds until there are.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            tokens, updated_at = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            wait = max(0.0, (cost - tokens) / self.rate)
+            if wait == 0 and consume:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_keys and now - updated_at < self.idle_seconds:
+                return
+            del self._buckets[key]
+
+
+# Refill and take tokens atomically. Buckets expire once they would be full again.
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[4]))
+return allowed
+"""
+
+
+class RedisTokenBucketLimiter:
+    """Token bucket rate limiter storing its buckets in Redis, or a Redis-compatible store.
+
+    Limits are shared by every bot replica using the same store and survive restarts. Idle
+    buckets expire in the store. When the store is unreachable, requests are allowed.
+    """
+
+    def __init__(self, url: str, rate: float, capacity: float = 1, prefix: str = "ratelimit") -> None:
+        """
+        Args:
+            url: URL of the store, e.g. `redis://localhost:6379/0`.
+            rate: Number of tokens added to a bucket per second.
+            capacity: Maximum number of tokens in a bucket, i.e. the allowed burst.
+            prefix: Prefix of the keys of the buckets in the store.
+        """
+        import redis
+
+        self.rate = rate
+        self.capacity = capacity
+        self.prefix = prefix
+        self.ttl_ms = math.ceil(1000 * capacity / rate)
+        self._redis = redis.Redis.from_url(url, socket_timeout=1)
+        self._script = self._redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    def allow(self, key: Hashable, cost: float = 1) -> bool:
+        """Take `cost` tokens from the bucket of `key`, returning False when it has too few."""
+        try:
+            return bool(self._script(
+                keys=[f"{self.prefix}:{key}"], args=[self.rate, self.capacity, cost, self.ttl_ms]
+            ))
+        except Exception as e:
+            logger.error(f"Error checking rate limit of {key}: {e}")
+            return True
+
+
+def create_rate_limiter(
+    rate: float,
+    capacity: float = 1,
+    max_keys: int = 100_000,
+    redis_url: Optional[str] = None,
+    prefix: str = "ratelimit",
+):
+    """Return a limiter sharing its state through `redis_url` when set, or kept in memory."""
+    if redis_url:
+        return RedisTokenBucketLimiter(redis_url, rate, capacity, prefix=prefix)
+    return TokenBucketLimiter(rate, capacity, max_keys=max_keys)
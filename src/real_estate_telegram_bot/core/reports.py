@@ -0,0 +1,126 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from omegaconf import OmegaConf
+from telebot.apihelper import ApiTelegramException
+
+from real_estate_telegram_bot.core.service_charges import service_charge_pivot
+from real_estate_telegram_bot.db import crud
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+
+def normalize_area(area: str) -> str:
+    return " ".join(area.lower().split())
+
+
+class ReportCache:
+    """Reuse the Telegram uploads of generated Excel reports.
+
+    A report is identified by its type and area and is generated from a dataset, e.g. the
+    projects or the service charges. Its Telegram file id is stored with the version of the
+    dataset it was generated from, and sent again instead of a new file while that version
+    is current; importing the dataset increases its version, so every report generated from
+    it is regenerated on next request. Reports are also regenerated after `max_age_hours`,
+    since some of their columns depend on the current date.
+
+    Reports built from an in-memory copy of a dataset must be stored with the version of
+    that copy rather than the one in the database, which another process may have imported
+    before this one reloaded its copy; `versions` gives the version of such datasets.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_age_hours: float = 24,
+        versions: Optional[dict[str, Callable[[], Optional[int]]]] = None,
+    ) -> None:
+        """
+        Args:
+            enabled: Whether uploads are reused, otherwise every report is generated.
+            max_age_hours: Age after which a cached report is regenerated.
+            versions: Functions returning the version of the data reports of a dataset are
+                built from, after bringing it up to date. Datasets not listed are read from
+                the database; reports are not cached when the version is None.
+        """
+        self.enabled = enabled
+        self.max_age = timedelta(hours=max_age_hours)
+        self.versions = versions or {}
+
+    def send(
+        self,
+        bot,
+        chat_id: int,
+        report_type: str,
+        area: str,
+        dataset: str,
+        build: Callable[[str], Optional[str]],
+        **kwargs,
+    ) -> bool:
+        """
+        Send a report, generating and uploading it only when it is not cached for the current data.
+
+        Args:
+            bot: The Telegram bot instance.
+            chat_id: Chat to send the report to.
+            report_type: Kind of report, e.g. `service_charge`.
+            area: Area the report is about.
+            dataset: Dataset the report is generated from, `projects` or `service_charges`.
+            build: Generates the report of the normalized area, which it must use for the file
+                name and title since the upload is shared by everyone asking for the area, and
+                returns the path of the file, or None when there is no data. The file is
+                removed once it is uploaded.
+            **kwargs: Passed to `bot.send_document`, e.g. `caption` or `reply_markup`.
+
+        Returns:
+            Whether a report was sent, False when there is no data for it.
+        """
+        area = normalize_area(area)
+        data_version = self.versions.get(dataset, lambda: crud.read_data_version(dataset))()
+        cached = self.enabled and data_version is not None
+        if cached:
+            report = crud.read_report_file(report_type, area)
+            if report is not None and self._is_current(report, dataset, data_version):
+                if report.file_telegram_id is None:
+                    return False
+                try:
+                    bot.send_document(chat_id, report.file_telegram_id, **kwargs)
+                    return True
+                except ApiTelegramException as e:
+                    logger.warning(f"Cached {report_type} report of {area} could not be sent, regenerating it: {e}")
+
+        filepath = build(area)
+        file_telegram_id = None
+        if filepath is not None:
+            try:
+                with open(filepath, "rb") as file:
+                    message = bot.send_document(chat_id, file, **kwargs)
+                file_telegram_id = message.document.file_id
+            finally:
+                os.remove(filepath)
+        if cached:
+            crud.upsert_report_file(report_type, area, dataset, data_version, file_telegram_id)
+        return filepath is not None
+
+    def _is_current(self, report, dataset: str, data_version: int) -> bool:
+        return (
+            report.dataset == dataset
+            and report.data_version == data_version
+            and datetime.now(timezone.utc) - report.created_at < self.max_age
+        )
+
+
+report_cache = ReportCache(
+    enabled=config.report_cache.enabled,
+    max_age_hours=config.report_cache.max_age_hours,
+    # Service charge reports are built from the in-memory pivot when it is enabled
+    versions={"service_charges": service_charge_pivot.sync} if config.service_charges.in_memory else None,
+)
@@ -0,0 +1,226 @@
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Optional
+
+from omegaconf import OmegaConf
+
+from real_estate_telegram_bot.core.versions import DataVersionWatch
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.models import Project
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def word_trigrams(text: str) -> set[str]:
+    """
+    Extract trigrams the way `pg_trgm` does.
+
+    The text is lowercased and split into alphanumeric words; each word is padded with two
+    spaces in front and one behind before being cut into three-character sequences.
+    """
+    trigrams = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def substring_trigrams(text: str) -> set[str]:
+    """Return the unpadded trigrams of a lowercased string, as contained in any string it is a substring of."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Snapshot:
+    """Immutable index over one list of projects."""
+
+    def __init__(self, projects: list[Project], data_version: Optional[int] = None) -> None:
+        self.data_version = data_version
+        self.projects = [project for project in projects if project.project_name_id_buildings]
+        self.names = [project.project_name_id_buildings.lower() for project in self.projects]
+        self.by_name: dict[str, list[Project]] = defaultdict(list)
+        # trigram -> positions of the projects whose name contains it
+        self.word_postings: dict[str, list[int]] = defaultdict(list)
+        self.substring_postings: dict[str, set[int]] = defaultdict(set)
+        self.trigram_counts: list[int] = []
+
+        for position, project in enumerate(self.projects):
+            self.by_name[project.project_name_id_buildings].append(project)
+            trigrams = word_trigrams(project.project_name_id_buildings)
+            self.trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                self.word_postings[trigram].append(position)
+            for trigram in substring_trigrams(self.names[position]):
+                self.substring_postings[trigram].add(position)
+
+
+class ProjectSearchIndex:
+    """In-process search index over `Project.project_name_id_buildings`.
+
+    The project catalogue only changes on admin imports, so lookups are served from memory:
+    substring matches (like ILIKE) use a trigram inverted index to narrow down candidates,
+    and fuzzy matches are ranked by the same trigram similarity as `pg_trgm`. A rebuild
+    creates a new snapshot and swaps it in, so readers never see a partial index.
+
+    The snapshot records the version of the projects it was read at, and is rebuilt on the
+    next lookup once an import, possibly by another process, changed it.
+    """
+
+    def __init__(self, version_check_interval_seconds: float = 10) -> None:
+        """
+        Args:
+            version_check_interval_seconds: Minimum time between two checks of the version of
+                the projects during lookups.
+        """
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._versions = DataVersionWatch("projects", version_check_interval_seconds)
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def rebuild(self, projects: Optional[list[Project]] = None) -> int:
+        """
+        Replace the index with the given projects, or with every project in the database.
+
+        An index of given projects is kept until the next rebuild, it is not checked for imports.
+
+        Returns:
+            The number of indexed projects.
+        """
+        with self._lock:
+            return self._build(projects)
+
+    @property
+    def data_version(self) -> Optional[int]:
+        """Version of the projects the index was read at, None when it was built from given projects."""
+        snapshot = self._snapshot
+        return snapshot.data_version if snapshot is not None else None
+
+    def sync(self) -> Optional[int]:
+        """
+        Rebuild the index now if the projects changed since it was read.
+
+        Returns:
+            The version of the projects the index is now built from.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or (snapshot.data_version is not None and self._versions.read() != snapshot.data_version):
+            self._reload(snapshot)
+        return self.data_version
+
+    def _build(self, projects: Optional[list[Project]]) -> int:
+        start_time = time.perf_counter()
+        data_version = None
+        if projects is None:
+            # Read before the projects, so that an import in between is picked up by the next check
+            data_version = self._versions.read()
+            projects = crud.read_projects()
+        snapshot = _Snapshot(projects, data_version)
+        self._snapshot = snapshot
+        logger.info(
+            f"Project search index built with {len(snapshot.projects)} projects "
+            f"in {time.perf_counter() - start_time:.3f}s"
+        )
+        return len(snapshot.projects)
+
+    def _reload(self, outdated: Optional[_Snapshot]) -> None:
+        with self._lock:
+            # Another thread may have rebuilt it while this one waited for the lock
+            if self._snapshot is outdated:
+                self._build(None)
+
+    def _get_snapshot(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None or (
+            snapshot.data_version is not None and self._versions.changed(snapshot.data_version) is not None
+        ):
+            self._reload(snapshot)
+            snapshot = self._snapshot
+        return snapshot
+
+    def all(self) -> list[Project]:
+        """Return every indexed project."""
+        return list(self._get_snapshot().projects)
+
+    def get_by_name(self, project_name: str) -> list[Project]:
+        """Return the projects whose name equals `project_name`."""
+        return list(self._get_snapshot().by_name.get(project_name, []))
+
+    def ilike(self, project_name: str, top_k: Optional[int] = None) -> list[Project]:
+        """Return the projects whose name contains `project_name`, ignoring case."""
+        snapshot = self._get_snapshot()
+        needle = project_name.lower()
+        trigrams = substring_trigrams(needle)
+        if trigrams:
+            postings = sorted((snapshot.substring_postings.get(trigram, set()) for trigram in trigrams), key=len)
+            candidates = sorted(set.intersection(*postings))
+        else:
+            candidates = range(len(snapshot.projects))
+
+        result = []
+        for position in candidates:
+            if needle in snapshot.names[position]:
+                result.append(snapshot.projects[position])
+                if top_k is not None and len(result) >= top_k:
+                    break
+        return result
+
+    def similar(self, project_name: str, similarity_threshold: float = 0.35, top_k: Optional[int] = None) -> list[Project]:
+        """Return the projects ranked by trigram similarity to `project_name`, best first."""
+        snapshot = self._get_snapshot()
+        trigrams = word_trigrams(project_name)
+        if not trigrams:
+            return []
+
+        # Number of trigrams each project shares with the query
+        shared = Counter(chain.from_iterable(snapshot.word_postings.get(trigram, ()) for trigram in trigrams))
+        query_count = len(trigrams)
+        trigram_counts = snapshot.trigram_counts
+        scored = [
+            (score, position)
+            for position, count in shared.items()
+            if (score := count / (query_count + trigram_counts[position] - count)) >= similarity_threshold
+        ]
+        key = lambda item: (-item[0], item[1])
+        scored = heapq.nsmallest(top_k, scored, key=key) if top_k is not None else sorted(scored, key=key)
+        return [snapshot.projects[position] for _, position in scored]
+
+
+project_index = ProjectSearchIndex(
+    version_check_interval_seconds=config.project_search.version_check_interval_seconds,
+)
+
+
+def query_projects_by_name(
+    project_name: str,
+    mode: str = "ilike",
+    similarity_threshold: float = 0.35,
+    top_k: Optional[int] = None
+) -> list[Project]:
+    """
+    Find projects by name using the in-memory index, or the database when it is disabled.
+
+    Takes the same arguments as `crud.query_projects_by_name`.
+    """
+    if not config.project_search.in_memory:
+        return crud.query_projects_by_name(project_name, mode=mode, similarity_threshold=similarity_threshold, top_k=top_k)
+    if mode == "ilike":
+        return project_index.ilike(project_name, top_k=top_k)
+    elif mode == "cosine":
+        return project_index.similar(project_name, similarity_threshold=similarity_threshold, top_k=top_k)
+    raise ValueError(f"Query mode {mode} is not supported.")
@@ -0,0 +1,212 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import requests
+from omegaconf import OmegaConf
+from telebot.apihelper import ApiTelegramException
+
+from real_estate_telegram_bot.core.ratelimit import TokenBucketLimiter
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+# Period the throughput is measured over, in seconds
+THROUGHPUT_WINDOW = 60
+
+
+class _Send:
+    def __init__(self, chat_id: int, method: Callable, args: tuple, kwargs: dict) -> None:
+        self.chat_id = chat_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.called = False
+        self.future: Future = Future()
+
+
+def is_transient(error: Exception) -> bool:
+    """Check whether a failed Telegram request may succeed if sent again."""
+    if isinstance(error, ApiTelegramException):
+        return error.error_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class SendQueue:
+    """Send Telegram messages within the Bot API rate limits.
+
+    Messages are queued and sent by a pool of workers at most `messages_per_second` times
+    per second overall and `chat_messages_per_second` times per second to the same chat,
+    both enforced with token buckets. When Telegram answers 429, sending pauses for the
+    `retry_after` it asks for and the message is queued again; transient failures are
+    retried with exponential backoff, up to `max_retries` attempts.
+    """
+
+    def __init__(
+        self,
+        messages_per_second: float = 30,
+        chat_messages_per_second: float = 1,
+        workers: int = 8,
+        max_retries: int = 3,
+    ) -> None:
+        """
+        Args:
+            messages_per_second: Maximum number of messages sent per second.
+            chat_messages_per_second: Maximum number of messages sent per second to one chat.
+            workers: Number of requests to Telegram in flight at the same time.
+            max_retries: Number of attempts for a message failing with a transient error.
+        """
+        self.max_retries = max_retries
+        self._global = TokenBucketLimiter(messages_per_second, capacity=1)
+        self._chats = TokenBucketLimiter(chat_messages_per_second, capacity=1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sender")
+        # Sends waiting for their turn: (time they may be sent at, sequence number, send)
+        self._heap: list[tuple[float, int, _Send]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._paused_until = 0.0
+        self._stopping = False
+        self._sent_times: deque[float] = deque()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self._thread = threading.Thread(target=self._run, name="send-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, chat_id: int, method: Callable, *args, **kwargs) -> Future:
+        """
+        Queue a call to a bot method sending to `chat_id`, e.g. `bot.send_message`.
+
+        Returns:
+            A future resolved with the result of the call, or its last error.
+        """
+        send = _Send(chat_id, method, (chat_id, *args), kwargs)
+        self._schedule(send, time.monotonic())
+        return send.future
+
+    def throughput(self) -> float:
+        """Return the number of messages sent per second over the last minute."""
+        now = time.monotonic()
+        with self._condition:
+            self._trim(now)
+            if not self._sent_times:
+                return 0.0
+            return len(self._sent_times) / max(1.0, min(THROUGHPUT_WINDOW, now - self._sent_times[0]))
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def stop(self) -> None:
+        """Stop sending, cancelling the queued messages, and wait for the requests in flight."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+        for _, _, send in self._heap:
+            send.future.cancel()
+        self._heap = []
+        self._executor.shutdown(wait=True)
+
+    def _schedule(self, send: _Send, at: float) -> None:
+        with self._condition:
+            if self._stopping:
+                send.future.cancel()
+                return
+            heapq.heappush(self._heap, (at, next(self._sequence), send))
+            self._condition.notify()
+
+    def _trim(self, now: float) -> None:
+        while self._sent_times and now - self._sent_times[0] > THROUGHPUT_WINDOW:
+            self._sent_times.popleft()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._condition.wait(self._heap[0][0] - now if self._heap else None)
+                _, _, send = heapq.heappop(self._heap)
+
+            # Telegram asked to slow down, nothing is sent until the pause is over
+            delay = self._paused_until - now
+            if delay <= 0:
+                delay = self._chats.wait_time(send.chat_id, consume=False)
+            if delay <= 0:
+                delay = self._global.wait_time("global")
+            if delay > 0:
+                self._schedule(send, now + delay)
+                continue
+            self._chats.wait_time(send.chat_id)
+            self._executor.submit(self._send, send)
+
+    def _send(self, send: _Send) -> None:
+        send.attempts += 1
+        if send.called:
+            # Rewind files that were partially read by the previous attempt
+            for arg in send.args:
+                if hasattr(arg, "seek"):
+                    arg.seek(0)
+        send.called = True
+        try:
+            result = send.method(*send.args, **send.kwargs)
+        except Exception as e:
+            now = time.monotonic()
+            if isinstance(e, ApiTelegramException) and e.error_code == 429:
+                retry_after = e.result_json.get("parameters", {}).get("retry_after", 1)
+                logger.warning(f"Rate limited by Telegram, pausing sends for {retry_after}s")
+                with self._condition:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                    self.rate_limited += 1
+                # Waiting was requested by Telegram, it does not count as a failed attempt
+                send.attempts -= 1
+                self._schedule(send, now + retry_after)
+            elif is_transient(e) and send.attempts < self.max_retries:
+                with self._condition:
+                    self.retried += 1
+                self._schedule(send, now + 2 ** send.attempts)
+            else:
+                with self._condition:
+                    self.failed += 1
+                send.future.set_exception(e)
+            return
+
+        with self._condition:
+            self.sent += 1
+            self._sent_times.append(time.monotonic())
+            self._trim(self._sent_times[-1])
+        send.future.set_result(result)
+
+
+_send_queue: Optional[SendQueue] = None
+_send_queue_lock = threading.Lock()
+
+
+def get_send_queue() -> SendQueue:
+    """Return the process-wide send queue, creating it from the configuration on first use."""
+    global _send_queue
+    with _send_queue_lock:
+        if _send_queue is None:
+            _send_queue = SendQueue(
+                messages_per_second=config.send_queue.messages_per_second,
+                chat_messages_per_second=config.send_queue.chat_messages_per_second,
+                workers=config.send_queue.workers,
+                max_retries=config.send_queue.max_retries,
+            )
+        return _send_queue
@@ -0,0 +1,206 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+import pandas as pd
+from omegaconf import OmegaConf
+
+from real_estate_telegram_bot.core.versions import DataVersionWatch
+from real_estate_telegram_bot.db import crud
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+# Number of pivots spanning several master projects kept
+MAX_CACHED_COMBINATIONS = 256
+
+
+def ilike_regex(pattern: str) -> re.Pattern:
+    """Compile a `LIKE` pattern, where `%` matches any text and `_` any character, ignoring case."""
+    parts = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def _row_order(row: tuple) -> tuple:
+    # Same order as the database: by project name with missing names last, then by year
+    _, project_name, _, budget_year, _ = row
+    return project_name is None, project_name or "", budget_year
+
+
+class _Snapshot:
+    """Immutable service charges of one import, pivoted per master project."""
+
+    def __init__(self, rows: list[tuple], data_version: Optional[int] = None) -> None:
+        self.data_version = data_version
+        self.rows_by_master: dict[str, list[tuple]] = defaultdict(list)
+        for row in sorted(rows, key=_row_order):
+            if row[0] is not None:
+                self.rows_by_master[row[0]].append(row)
+        self.masters = list(self.rows_by_master)
+        self.row_count = sum(len(master_rows) for master_rows in self.rows_by_master.values())
+        self.pivots: dict[str, pd.DataFrame] = {
+            master: crud.pivot_service_charges(row[1:] for row in master_rows)
+            for master, master_rows in self.rows_by_master.items()
+        }
+        # Pivots of the searches matching several master projects, least recently used first
+        self.combinations: OrderedDict[tuple[str, ...], pd.DataFrame] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def pivot(self, masters: tuple[str, ...]) -> pd.DataFrame:
+        if not masters:
+            return pd.DataFrame()
+        if len(masters) == 1:
+            return self.pivots[masters[0]]
+        with self.lock:
+            if masters in self.combinations:
+                self.combinations.move_to_end(masters)
+                return self.combinations[masters]
+        rows = sorted((row for master in masters for row in self.rows_by_master[master]), key=_row_order)
+        df = crud.pivot_service_charges(row[1:] for row in rows)
+        with self.lock:
+            self.combinations[masters] = df
+            if len(self.combinations) > MAX_CACHED_COMBINATIONS:
+                self.combinations.popitem(last=False)
+        return df
+
+
+class ServiceChargePivot:
+    """In-process pivot of the service charges by master project, project, property group and year.
+
+    Service charges only change on admin imports, so they are read once and pivoted per
+    master project; looking up an area only matches its name against the master projects,
+    like the ILIKE query it replaces, and returns the precomputed pivot. A rebuild creates a
+    new snapshot and swaps it in, so readers never see a partial pivot.
+
+    The snapshot records the version of the service charges it was read at, and is rebuilt
+    on the next lookup once an import, possibly by another process, changed it.
+    """
+
+    def __init__(self, version_check_interval_seconds: float = 10) -> None:
+        """
+        Args:
+            version_check_interval_seconds: Minimum time between two checks of the version of
+                the service charges during lookups.
+        """
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._versions = DataVersionWatch("service_charges", version_check_interval_seconds)
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def rebuild(self, rows: Optional[list[tuple]] = None) -> int:
+        """
+        Replace the pivot with the given rows, or with every service charge in the database.
+
+        A pivot of given rows is kept until the next rebuild, it is not checked for imports.
+
+        Args:
+            rows: Rows as returned by `crud.read_service_charge_rows`.
+
+        Returns:
+            The number of pivoted service charges.
+        """
+        with self._lock:
+            return self._build(rows)
+
+    @property
+    def data_version(self) -> Optional[int]:
+        """Version of the service charges the pivot was read at, None when it was built from given rows."""
+        snapshot = self._snapshot
+        return snapshot.data_version if snapshot is not None else None
+
+    def sync(self) -> Optional[int]:
+        """
+        Rebuild the pivot now if the service charges changed since it was read.
+
+        Returns:
+            The version of the service charges the pivot is now built from.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or (snapshot.data_version is not None and self._versions.read() != snapshot.data_version):
+            self._reload(snapshot)
+        return self.data_version
+
+    def _build(self, rows: Optional[list[tuple]]) -> int:
+        start_time = time.perf_counter()
+        data_version = None
+        if rows is None:
+            # Read before the rows, so that an import in between is picked up by the next check
+            data_version = self._versions.read()
+            rows = crud.read_service_charge_rows()
+        snapshot = _Snapshot(rows, data_version)
+        self._snapshot = snapshot
+        logger.info(
+            f"Service charge pivot built with {snapshot.row_count} service charges of "
+            f"{len(snapshot.masters)} master projects in {time.perf_counter() - start_time:.3f}s"
+        )
+        return snapshot.row_count
+
+    def _reload(self, outdated: Optional[_Snapshot]) -> None:
+        with self._lock:
+            # Another thread may have rebuilt it while this one waited for the lock
+            if self._snapshot is outdated:
+                self._build(None)
+
+    def _get_snapshot(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None or (
+            snapshot.data_version is not None and self._versions.changed(snapshot.data_version) is not None
+        ):
+            self._reload(snapshot)
+            snapshot = self._snapshot
+        return snapshot
+
+    def master_projects(self, area_name: str) -> list[str]:
+        """Return the master projects whose name contains `area_name`, ignoring case."""
+        regex = ilike_regex(area_name)
+        return [master for master in self._get_snapshot().masters if regex.search(master)]
+
+    def get_by_area(self, area_name: str) -> pd.DataFrame:
+        """
+        Return the service charges of the master projects whose name contains `area_name` by year.
+
+        The DataFrame is shared between lookups and must not be modified.
+        """
+        snapshot = self._get_snapshot()
+        regex = ilike_regex(area_name)
+        return snapshot.pivot(tuple(master for master in snapshot.masters if regex.search(master)))
+
+
+service_charge_pivot = ServiceChargePivot(
+    version_check_interval_seconds=config.service_charges.version_check_interval_seconds,
+)
+
+
+def get_area_service_charge_by_year(area_name: str) -> pd.DataFrame:
+    """
+    Pivot the service charges of an area by year using the in-memory pivot, or the database when it is disabled.
+
+    Takes the same arguments as `crud.get_area_service_charge_by_year`.
+    """
+    if not config.service_charges.in_memory:
+        return crud.get_area_service_charge_by_year(area_name)
+    return service_charge_pivot.get_by_area(area_name)
@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from real_estate_telegram_bot.db import crud
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+class DataVersionWatch:
+    """Tell whether a dataset was imported again since an in-memory copy was built from it.
+
+    Imports increase the version of their dataset in the database, see
+    `crud.bump_data_version`, so that every process, not only the one that ran the import,
+    notices it. The version is read at most once per `check_interval_seconds` by `changed`,
+    so that lookups do not each query the database.
+    """
+
+    def __init__(self, dataset: str, check_interval_seconds: float = 10) -> None:
+        """
+        Args:
+            dataset: The watched dataset, e.g. `projects` or `service_charges`.
+            check_interval_seconds: Minimum time between two reads of the version by `changed`.
+        """
+        self.dataset = dataset
+        self.check_interval = check_interval_seconds
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def read(self) -> int:
+        """Read the current version of the dataset."""
+        version = crud.read_data_version(self.dataset)
+        with self._lock:
+            self._checked_at = time.monotonic()
+        return version
+
+    def changed(self, version: int) -> Optional[int]:
+        """
+        Check whether the dataset moved past `version`, unless it was checked recently.
+
+        Returns:
+            The new version when it differs, otherwise None, also when the database could not be read.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return None
+            self._checked_at = now
+        try:
+            current = crud.read_data_version(self.dataset)
+        except Exception as e:
+            logger.error(f"Error reading the version of {self.dataset}: {e}")
+            return None
+        return current if current != version else None
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from omegaconf import OmegaConf
+
+from real_estate_telegram_bot.core.delivery import call_with_retry, is_current, normalize_file_name
+from real_estate_telegram_bot.core.downloads import drive_downloader
+from real_estate_telegram_bot.core.drive_index import DriveIndex, get_drive_index
+from real_estate_telegram_bot.core.search import ProjectSearchIndex, project_index
+from real_estate_telegram_bot.db import crud
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+
+class DriveCacheWarmer:
+    """Pre-upload project documents from Google Drive to Telegram.
+
+    Walks the projects in order, lists their folders in the Drive index and uploads every file
+    that has no Telegram file id yet, or that changed in Drive since it was uploaded, to a
+    private storage chat. The resulting file ids are recorded in `project_files`, so that
+    users are sent cached files. Progress is checkpointed after each project, so that an
+    interrupted pass resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        bot,
+        drive_index: DriveIndex,
+        project_index: ProjectSearchIndex,
+        storage_chat_id: int,
+        checkpoint_path: str,
+        max_uploads_per_run: Optional[int] = None,
+        upload_interval_seconds: float = 1.0,
+        max_retries: int = 3,
+    ) -> None:
+        """
+        Args:
+            bot: The Telegram bot instance.
+            drive_index: The index used to list project folders.
+            project_index: The index the projects are read from.
+            storage_chat_id: Chat the files are uploaded to.
+            checkpoint_path: File the id of the last completed project is saved to.
+            max_uploads_per_run: Number of uploads after which a run stops, or None for no limit.
+            upload_interval_seconds: Minimum time between two uploads, to stay within Telegram limits.
+            max_retries: Number of attempts for an upload that hit a rate limit.
+        """
+        self.bot = bot
+        self.drive_index = drive_index
+        self.project_index = project_index
+        self.storage_chat_id = storage_chat_id
+        self.checkpoint_path = checkpoint_path
+        self.max_uploads_per_run = max_uploads_per_run
+        self.upload_interval = upload_interval_seconds
+        self.max_retries = max_retries
+
+    def load_checkpoint(self) -> Optional[int]:
+        """Return the id of the last project completed in the current pass."""
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            return json.load(f).get("last_project_id")
+
+    def save_checkpoint(self, last_project_id: Optional[int]) -> None:
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_project_id": last_project_id, "updated_at": time.time()}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def run(self) -> dict[str, int]:
+        """
+        Continue the current pass over all projects.
+
+        Returns:
+            The number of visited projects, uploaded files and failed uploads.
+        """
+        start_time = time.perf_counter()
+        stats = {"projects": 0, "uploaded": 0, "failed": 0}
+        last_project_id = self.load_checkpoint()
+        projects = sorted(self.project_index.all(), key=lambda project: project.project_id)
+        remaining = [
+            project for project in projects
+            if last_project_id is None or project.project_id > last_project_id
+        ]
+
+        for project in remaining:
+            if self.max_uploads_per_run is not None and stats["uploaded"] >= self.max_uploads_per_run:
+                logger.info(f"Cache warmer paused after project {last_project_id}: {stats}")
+                return stats
+            uploaded, failed = self.warm_project(project.project_id, project.project_name_id_buildings)
+            stats["uploaded"] += uploaded
+            stats["failed"] += failed
+            stats["projects"] += 1
+            last_project_id = project.project_id
+            self.save_checkpoint(last_project_id)
+
+        # The pass is complete, start over next time
+        self.save_checkpoint(None)
+        logger.info(f"Cache warmer pass completed in {time.perf_counter() - start_time:.1f}s: {stats}")
+        return stats
+
+    def warm_project(self, project_id: int, project_name: str) -> tuple[int, int]:
+        """
+        Upload the missing or changed files of one project.
+
+        Returns:
+            The number of uploaded and failed files.
+        """
+        items = self.drive_index.list_files(project_name, live_fallback=False)
+        if not items:
+            return 0, 0
+        file_names = [normalize_file_name(item["title"]) for item in items]
+        project_files = crud.get_project_files_by_names(file_names)
+
+        uploaded = failed = 0
+        for item, file_name in zip(items, file_names):
+            project_file = project_files.get(file_name)
+            if project_file is not None and is_current(project_file, item):
+                continue
+            try:
+                self.upload(item, file_name, project_id)
+                uploaded += 1
+            except Exception as e:
+                logger.error(f"Error warming file {file_name} of project {project_id}: {e}")
+                failed += 1
+        return uploaded, failed
+
+    def upload(self, item, file_name: str, project_id: int) -> str:
+        """Upload one Drive file to the storage chat and record its Telegram file id."""
+        started = time.monotonic()
+        content = drive_downloader.acquire(item)
+        try:
+            with content.open() as stream:
+                message = call_with_retry(
+                    self.bot.send_document, self.storage_chat_id, stream,
+                    visible_file_name=file_name, disable_notification=True, max_retries=self.max_retries
+                )
+        finally:
+            drive_downloader.release(content)
+        crud.upsert_project_file(
+            file_name=file_name,
+            file_type="pdf",
+            file_telegram_id=message.document.file_id,
+            project_id=project_id,
+            drive_file_id=item.get("id"),
+            md5_checksum=item.get("md5Checksum")
+        )
+        logger.info(f"Warmed file {file_name} of project {project_id}")
+
+        # Space uploads out so that the warmer does not compete with user traffic
+        time.sleep(max(0.0, self.upload_interval - (time.monotonic() - started)))
+        return message.document.file_id
+
+
+
+def run_cache_warmer(bot) -> Optional[dict[str, int]]:
+    """Run the cache warmer configured for `bot`, e.g. as a scheduled job."""
+    if config.delivery.storage_chat_id is None:
+        logger.warning("Cache warmer needs `delivery.storage_chat_id` to be set")
+        return None
+    drive_index = get_drive_index()
+    if not drive_index.ready:
+        # Projects would look like they have no files and be skipped for the whole pass
+        logger.info("Cache warmer is waiting for the Drive index to be built")
+        return None
+    warmer = DriveCacheWarmer(
+        bot,
+        drive_index,
+        project_index,
+        storage_chat_id=config.delivery.storage_chat_id,
+        checkpoint_path=config.warmer.checkpoint_path,
+        max_uploads_per_run=config.warmer.max_uploads_per_run,
+        upload_interval_seconds=config.warmer.upload_interval_seconds,
+        max_retries=config.delivery.max_retries,
+    )
+    return warmer.run()
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from omegaconf import OmegaConf
+from sqlalchemy import inspect
+
+from real_estate_telegram_bot.db.models import User
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
+
+def _copy_user(user: User) -> User:
+    """Return a detached copy of the column values of a user."""
+    return User(**{attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs})
+
+
+class UserCache:
+    """In-process cache of `User` rows keyed by Telegram id.
+
+    Entries expire after `ttl_seconds` and the least recently used entry is evicted once
+    `max_size` is reached. Updates of `last_message_timestamp` are coalesced: a user is
+    marked as touched in memory and written back at most once per `touch_interval_seconds`.
+
+    Users are read and updated by several dispatcher threads, so the cache keeps its own
+    copies, only modifies them under its lock and hands out copies.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_size: int = 10000, touch_interval_seconds: float = 60) -> None:
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self.touch_interval = touch_interval_seconds
+        self.hits = 0
+        self.misses = 0
+        # user id -> (user, monotonic time of insertion)
+        self._entries: OrderedDict[int, tuple[User, float]] = OrderedDict()
+        # user id -> monotonic time of the last `last_message_timestamp` write
+        self._last_flushed: dict[int, float] = {}
+        # user id -> `last_message_timestamp` not yet written to the database
+        self._pending: dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[User]:
+        """Return the cached user or None if it is missing or expired."""
+        user_id = int(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return _copy_user(entry[0])
+
+    def put(self, user: User) -> None:
+        """Cache a user that was just read from or written to the database."""
+        user_id = int(user.id)
+        user = _copy_user(user)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[user_id] = (user, now)
+            self._entries.move_to_end(user_id)
+            self._last_flushed[user_id] = now
+            self._pending.pop(user_id, None)
+            while len(self._entries) > self.max_size:
+                evicted_id, _ = self._entries.popitem(last=False)
+                self._last_flushed.pop(evicted_id, None)
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user from the cache so that the next access reads it from the database."""
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def touch(self, user_id: int, timestamp: datetime) -> Optional[datetime]:
+        """Record activity of a cached user.
+
+        Args:
+            user_id: The user's ID.
+            timestamp: Time of the activity.
+
+        Returns:
+            The timestamp to write to the database if the touch interval has elapsed, otherwise None.
+        """
+        user_id = int(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[0].last_message_timestamp = timestamp
+            last_flushed = self._last_flushed.get(user_id, 0.0)
+            if time.monotonic() - last_flushed < self.touch_interval:
+                self._pending[user_id] = timestamp
+                return None
+            self._last_flushed[user_id] = time.monotonic()
+            self._pending.pop(user_id, None)
+            return timestamp
+
+    def pop_pending(self) -> dict[int, datetime]:
+        """Return and forget all activity timestamps that were not written yet."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def stats(self) -> dict[str, int]:
+        """Return cache statistics for monitoring."""
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "pending": len(self._pending)}
+
+
+user_cache = UserCache(
+    ttl_seconds=config.user_cache.ttl_seconds,
+    max_size=config.user_cache.max_size if config.user_cache.enabled else 0,
+    touch_interval_seconds=config.user_cache.touch_interval_seconds,
+)
@@ -1,3 +1,5 @@
 from .users import *
 from .projects import *
-from .events import *
\ No newline at end of file
+from .events import *
+from .broadcasts import *
+from .reports import *
\ No newline at end of file
@@ -0,0 +1,220 @@
+import logging
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Row, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from real_estate_telegram_bot.db.database import session_scope
+from real_estate_telegram_bot.db.models import Broadcast, BroadcastDelivery, User
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+PENDING_BROADCAST_STATUSES = ("scheduled", "sending")
+
+
+def create_broadcast(
+    created_by: int,
+    scheduled_at: datetime,
+    media_type: str,
+    content: Optional[str] = None,
+    photo: Optional[str] = None,
+    lang: Optional[str] = None,
+    role: Optional[str] = None,
+    active_days: Optional[int] = None,
+) -> Broadcast:
+    """
+    Schedule a message to every user, or to the users matching the audience filters.
+
+    Args:
+        created_by: Id of the admin who scheduled it.
+        scheduled_at: Timezone-aware time the sending starts at.
+        media_type: `text` or `photo`.
+        content: Text of the message, or caption of the photo.
+        photo: Telegram file id of the photo.
+        lang: Only send it to users with this language.
+        role: Only send it to users with this role.
+        active_days: Only send it to users who wrote to the bot in the last `active_days` days.
+
+    Returns:
+        The created broadcast.
+    """
+    broadcast = Broadcast(
+        created_by=created_by,
+        scheduled_at=scheduled_at,
+        media_type=media_type,
+        content=content,
+        photo=photo,
+        audience_lang=lang,
+        audience_role=role,
+        audience_active_days=active_days,
+        status="scheduled",
+        sent=0,
+        failed=0,
+    )
+    with session_scope() as db:
+        db.add(broadcast)
+    return broadcast
+
+
+def read_broadcast(broadcast_id: int) -> Optional[Broadcast]:
+    with session_scope() as db:
+        return db.get(Broadcast, broadcast_id)
+
+
+def read_pending_broadcasts() -> list[Broadcast]:
+    """Read the broadcasts that are scheduled or being sent, earliest first."""
+    with session_scope() as db:
+        return db.scalars(
+            select(Broadcast)
+            .where(Broadcast.status.in_(PENDING_BROADCAST_STATUSES))
+            .order_by(Broadcast.scheduled_at, Broadcast.id)
+        ).all()
+
+
+def read_due_broadcast() -> Optional[Broadcast]:
+    """Read the earliest pending broadcast whose time has come."""
+    with session_scope() as db:
+        return db.scalars(
+            select(Broadcast)
+            .where(Broadcast.status.in_(PENDING_BROADCAST_STATUSES), Broadcast.scheduled_at <= func.now())
+            .order_by(Broadcast.scheduled_at, Broadcast.id)
+            .limit(1)
+        ).first()
+
+
+def set_broadcast_status(broadcast_id: int, status: str) -> None:
+    values = {"status": status}
+    if status == "completed":
+        values["completed_at"] = func.now()
+    with session_scope() as db:
+        db.execute(update(Broadcast).where(Broadcast.id == broadcast_id).values(**values))
+
+
+def cancel_broadcast(broadcast_id: int) -> bool:
+    """Cancel a pending broadcast, returning False when there is none with this id."""
+    with session_scope() as db:
+        result = db.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status.in_(PENDING_BROADCAST_STATUSES))
+            .values(status="cancelled")
+        )
+        return result.rowcount > 0
+
+
+def advance_broadcast_cursor(broadcast_id: int, cursor: int) -> None:
+    """Record that every user up to `cursor` was handled."""
+    with session_scope() as db:
+        db.execute(update(Broadcast).where(Broadcast.id == broadcast_id).values(cursor=cursor))
+
+
+def _audience_filters(lang: Optional[str] = None, role: Optional[str] = None, active_days: Optional[int] = None) -> list:
+    filters = []
+    if lang is not None:
+        filters.append(User.lang == lang)
+    if role is not None:
+        filters.append(User.role == role)
+    if active_days is not None:
+        # Activity timestamps are stored in local time
+        filters.append(User.last_message_timestamp >= datetime.now() - timedelta(days=active_days))
+    return filters
+
+
+def broadcast_audience(broadcast: Broadcast) -> dict:
+    """Return the audience filters of a broadcast, as keyword arguments of `iter_recipients`."""
+    return {
+        "lang": broadcast.audience_lang,
+        "role": broadcast.audience_role,
+        "active_days": broadcast.audience_active_days,
+    }
+
+
+def iter_recipients(
+    after_id: Optional[int] = None,
+    batch_size: int = 1000,
+    lang: Optional[str] = None,
+    role: Optional[str] = None,
+    active_days: Optional[int] = None,
+) -> Iterator[list[Row]]:
+    """
+    Iterate over the users matching the audience filters in id order, one batch at a time.
+
+    Batches are read lazily with keyset pagination, selecting only the `id` and `lang`
+    columns, so memory use does not depend on the number of users. No connection is held
+    between batches.
+
+    Args:
+        after_id: Start after this user id, e.g. the cursor of a broadcast.
+        batch_size: Number of users per batch.
+        lang: Only users with this language.
+        role: Only users with this role.
+        active_days: Only users who wrote to the bot in the last `active_days` days.
+
+    Yields:
+        Lists of rows with `id` and `lang` attributes.
+    """
+    filters = _audience_filters(lang, role, active_days)
+    while True:
+        query = select(User.id, User.lang).where(*filters).order_by(User.id).limit(batch_size)
+        if after_id is not None:
+            query = query.where(User.id > after_id)
+        with session_scope() as db:
+            batch = db.execute(query).all()
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        after_id = batch[-1].id
+
+
+def count_recipients(
+    after_id: Optional[int] = None,
+    lang: Optional[str] = None,
+    role: Optional[str] = None,
+    active_days: Optional[int] = None,
+) -> int:
+    """Count the users matching the audience filters after `after_id` in id order."""
+    query = select(func.count()).select_from(User).where(*_audience_filters(lang, role, active_days))
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    with session_scope() as db:
+        return db.scalar(query)
+
+
+def read_delivered_user_ids(broadcast_id: int, user_ids: list[int]) -> set[int]:
+    """Return which of `user_ids` the broadcast was already sent to, or failed for."""
+    with session_scope() as db:
+        return set(db.scalars(
+            select(BroadcastDelivery.user_id).where(
+                BroadcastDelivery.broadcast_id == broadcast_id, BroadcastDelivery.user_id.in_(user_ids)
+            )
+        ))
+
+
+def record_broadcast_delivery(broadcast_id: int, user_id: int, status: str, error: Optional[str] = None) -> None:
+    """
+    Record the outcome of sending a broadcast to a user and update its counters.
+
+    Args:
+        broadcast_id: The broadcast.
+        user_id: The recipient.
+        status: `sent` or `failed`.
+        error: Why sending failed.
+    """
+    with session_scope() as db:
+        inserted = db.execute(
+            pg_insert(BroadcastDelivery)
+            .values(broadcast_id=broadcast_id, user_id=user_id, status=status, error=error)
+            .on_conflict_do_nothing()
+        ).rowcount
+        if inserted:
+            counter = Broadcast.sent if status == "sent" else Broadcast.failed
+            db.execute(
+                update(Broadcast).where(Broadcast.id == broadcast_id).values({counter: counter + 1})
+            )
@@ -4,10 +4,9 @@ import csv
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy.orm import Session
-from sqlalchemy import inspect, text
+from sqlalchemy import insert, inspect, text
 
-from real_estate_telegram_bot.db.database import get_session
+from real_estate_telegram_bot.db.database import session_scope
 from real_estate_telegram_bot.db.models import Event
 
 # Set up logging
@@ -19,43 +18,48 @@ logging.basicConfig(
 def create_event(user_id: str, content: str, type: str) -> Event:
     """Create an event for a user."""
     event = Event(user_id=user_id, content=content, type=type, timestamp=datetime.now())
-    db: Session = get_session()
-    db.expire_on_commit = False
-    db.add(event)
-    db.commit()
-    db.close()
+    with session_scope() as db:
+        db.add(event)
     return event
 
 
+def create_events(events: list[dict]) -> int:
+    """Insert a batch of events in a single statement.
+
+    Args:
+        events: Dictionaries with `user_id`, `content`, `type` and `timestamp` keys.
+
+    Returns:
+        The number of inserted events.
+    """
+    if not events:
+        return 0
+    with session_scope() as db:
+        db.execute(insert(Event), events)
+    return len(events)
+
+
 def read_event(event_id: int) -> Optional[Event]:
-    db: Session = get_session()
-    try:
+    with session_scope() as db:
         return db.query(Event).filter(Event.id == event_id).first()
-    finally:
-        db.close()
 
 
 def read_events_by_user(user_id: str) -> list[Event]:
-    db: Session = get_session()
-    try:
+    with session_scope() as db:
         return db.query(Event).filter(Event.user_id == user_id).all()
-    finally:
-        db.close()
 
 
 def export_all_tables(export_dir: str):
-    db = get_session()
-    inspector = inspect(db.get_bind())
-
-    for table_name in inspector.get_table_names():
-        file_path = os.path.join(export_dir, f"{table_name}.csv")
-        with open(file_path, mode="w", newline="") as file:
-            writer = csv.writer(file)
-            columns = [col["name"] for col in inspector.get_columns(table_name)]
-            writer.writerow(columns)
+    with session_scope() as db:
+        inspector = inspect(db.get_bind())
 
-            records = db.execute(text(f"SELECT * FROM {table_name}")).fetchall()
-            for record in records:
-                writer.writerow(record)
+        for table_name in inspector.get_table_names():
+            file_path = os.path.join(export_dir, f"{table_name}.csv")
+            with open(file_path, mode="w", newline="") as file:
+                writer = csv.writer(file)
+                columns = [col["name"] for col in inspector.get_columns(table_name)]
+                writer.writerow(columns)
 
-    db.close()
\ No newline at end of file
+                records = db.execute(text(f"SELECT * FROM {table_name}")).fetchall()
+                for record in records:
+                    writer.writerow(record)
\ No newline at end of file
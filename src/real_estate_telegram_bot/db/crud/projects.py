@@ -1,15 +1,23 @@
-import csv
+import io
 import logging
 import os
 from collections import defaultdict
+from collections.abc import Iterable
 from datetime import datetime
+from typing import Optional
 
 import pandas as pd
-from sqlalchemy import Text, cast, func
-from sqlalchemy.orm import Session
-
-from real_estate_telegram_bot.db.database import get_session
-from real_estate_telegram_bot.db.models import Project, ProjectFile, ProjectServiceCharge
+from sqlalchemy import Connection, func, literal_column, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from real_estate_telegram_bot.db.database import session_scope
+from real_estate_telegram_bot.db.models import (
+    SERVICE_CHARGE_KEY_COLUMNS,
+    SERVICE_CHARGE_KEY_ELEMENTS,
+    Project,
+    ProjectFile,
+    ProjectServiceCharge,
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -20,37 +28,223 @@ logging.basicConfig(
 # Projects
 
 def read_project(project_id: int) -> Project:
-    db: Session = get_session()
-    result = db.query(Project).filter(Project.project_id == project_id).first()
-    db.close()
-    return result
+    with session_scope() as db:
+        return db.query(Project).filter(Project.project_id == project_id).first()
 
-def upsert_project(project: Project):
-    db: Session = get_session()
-    db.merge(project)
-    db.commit()
-    db.close()
-
-
-def query_projects_by_name(project_name: str, mode: str = "ilike", similarity_threshold: float = 0.35) -> list[Project]:
-    db: Session = get_session()
-    if mode == "ilike":
-        result = db.query(Project).filter(Project.project_name_id_buildings.ilike(f"%{project_name}%")).all()
-    elif mode == "cosine":
-        result = db.query(
-            Project,
-            func.similarity(cast(Project.project_name_id_buildings, Text), cast(project_name, Text)).label("similarity_score")
-        ).filter(
-            func.similarity(cast(Project.project_name_id_buildings, Text), cast(project_name, Text)) >= similarity_threshold
-        ).order_by(
-            func.similarity(cast(Project.project_name_id_buildings, Text), cast(project_name, Text)).desc()
-        ).all()
+def read_projects() -> list[Project]:
+    with session_scope() as db:
+        return db.query(Project).all()
+
+def read_project_ids() -> set[int]:
+    with session_scope() as db:
+        return set(db.scalars(db.query(Project.project_id).statement))
+
+def _upsert_statement(model, key_columns: list[str], index_elements: Optional[list] = None):
+    """
+    Build an INSERT ... ON CONFLICT DO UPDATE statement overwriting every non-key column.
+
+    The conflict target is `key_columns`, or `index_elements` when the unique index is on
+    expressions rather than plain columns.
+    """
+    stmt = pg_insert(model)
+    update_columns = {
+        column.name: stmt.excluded[column.name]
+        for column in model.__table__.columns
+        if column.name not in key_columns and not column.primary_key
+    }
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements or key_columns, set_=update_columns
+    ).returning(model)
+
+
+def upsert_project(project: Project) -> Project:
+    """ Insert or update a project in a single statement. """
+    return upsert_projects([project.as_dict()])[0]
+
+
+def upsert_projects(projects: list[dict]) -> list[Project]:
+    """
+    Insert or update a batch of projects keyed by `project_id`.
+
+    Args:
+        projects: Dictionaries of `Project` column values.
+
+    Returns:
+        The resulting project rows.
+    """
+    if not projects:
+        return []
+    with session_scope() as db:
+        return list(db.scalars(
+            _upsert_statement(Project, ["project_id"]),
+            projects,
+            execution_options={"populate_existing": True}
+        ))
+
+
+def _copy_field(value) -> str:
+    """ Format a value as a COPY CSV field, NULL for None and quoted text otherwise. """
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_rows(connection: Connection, table_name: str, columns: list[str], rows: list[tuple]) -> None:
+    """
+    Load rows into a table with a single COPY ... FROM STDIN.
 
+    In CSV format an unquoted empty field is NULL while a quoted one is an empty string, so
+    every value is quoted and only None values are left empty, and empty strings are kept.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_copy_field(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def import_projects(projects: list[dict]) -> list[dict]:
+    """
+    Import a batch of projects in one transaction using a staging table.
+
+    The rows are loaded with COPY, compared against `projects` in a single query and
+    the new or changed ones are applied with one INSERT ... ON CONFLICT statement.
+    When several rows share a `project_id`, the last one wins.
+
+    The whole batch fails when a single value is rejected by the database, so rows must be
+    validated first, see `core.db.coerce_value`.
+
+    Args:
+        projects: Dictionaries of `Project` column values in file order.
+
+    Returns:
+        One result per input row, in the same order, with `project_id`, `status`
+        (`created`, `updated`, `unchanged` or `skipped`) and `changes`, a mapping of
+        changed columns to `(new, old)` values.
+    """
+    if not projects:
+        return []
+
+    columns = [column.name for column in Project.__table__.columns]
+    value_columns = [column for column in columns if column != "project_id"]
+    staged_columns = ", ".join(f"s.{column}" for column in columns)
+    changed_values = ", ".join(
+        f"'{column}', CASE WHEN s.{column} IS DISTINCT FROM p.{column} "
+        f"THEN jsonb_build_array(s.{column}, p.{column}) END"
+        for column in value_columns
+    )
+    staged_row = ", ".join(f"s.{column}" for column in value_columns)
+    existing_row = ", ".join(f"p.{column}" for column in value_columns)
+    update_columns = ", ".join(f"{column} = EXCLUDED.{column}" for column in value_columns)
+
+    with session_scope() as db:
+        connection = db.connection()
+        connection.execute(text(
+            "CREATE TEMP TABLE projects_staging (LIKE projects INCLUDING DEFAULTS) ON COMMIT DROP"
+        ))
+        connection.execute(text("ALTER TABLE projects_staging ADD COLUMN row_number integer"))
+        _copy_rows(
+            connection, "projects_staging", columns + ["row_number"],
+            [tuple(project.get(column) for column in columns) + (row_number,)
+             for row_number, project in enumerate(projects)]
+        )
+        connection.execute(text("ANALYZE projects_staging"))
+
+        # Diff every staged row against the current table in one pass
+        diff = connection.execute(text(f"""
+            SELECT row_number, project_id, is_new, is_latest, changes
+            FROM (
+                SELECT
+                    s.row_number,
+                    s.project_id,
+                    p.project_id IS NULL AS is_new,
+                    s.row_number = max(s.row_number) OVER (PARTITION BY s.project_id) AS is_latest,
+                    jsonb_strip_nulls(jsonb_build_object({changed_values})) AS changes
+                FROM projects_staging s
+                LEFT JOIN projects p ON p.project_id = s.project_id
+            ) d
+            ORDER BY row_number
+        """)).all()
+
+        # Apply the last row of every new or changed project in a single statement
+        connection.execute(text(f"""
+            WITH latest AS (
+                SELECT DISTINCT ON (project_id) *
+                FROM projects_staging
+                ORDER BY project_id, row_number DESC
+            )
+            INSERT INTO projects ({', '.join(columns)})
+            SELECT {staged_columns}
+            FROM latest s
+            LEFT JOIN projects p ON p.project_id = s.project_id
+            WHERE p.project_id IS NULL OR ROW({staged_row}) IS DISTINCT FROM ROW({existing_row})
+            ON CONFLICT (project_id) DO UPDATE SET {update_columns}
+        """))
+
+    results = []
+    for _, project_id, is_new, is_latest, changes in diff:
+        if not is_latest:
+            status = "skipped"
+        elif is_new:
+            status = "created"
+        elif changes:
+            status = "updated"
+        else:
+            status = "unchanged"
+        results.append({
+            "project_id": project_id,
+            "status": status,
+            "changes": {column: tuple(values) for column, values in changes.items()} if not is_new else {}
+        })
+    return results
+
+
+def query_projects_by_name(
+    project_name: str,
+    mode: str = "ilike",
+    similarity_threshold: float = 0.35,
+    top_k: Optional[int] = None
+) -> list[Project]:
+    """
+    Find projects by name.
+
+    Args:
+        project_name: The text to search for.
+        mode: `ilike` for substring matches or `cosine` for trigram similarity, best matches first.
+        similarity_threshold: Minimum trigram similarity in `cosine` mode.
+        top_k: Maximum number of projects to return.
+
+    Returns:
+        The matching projects.
+    """
+    with session_scope() as db:
+        if mode == "ilike":
+            query = db.query(Project).filter(Project.project_name_id_buildings.ilike(f"%{project_name}%"))
+        elif mode == "cosine":
+            # The `%` operator can use the trigram index; its threshold is set for this transaction only
+            db.execute(select(func.set_config("pg_trgm.similarity_threshold", str(similarity_threshold), True)))
+            similarity_score = func.similarity(Project.project_name_id_buildings, project_name).label("similarity_score")
+            query = db.query(Project, similarity_score).filter(
+                Project.project_name_id_buildings.op("%")(project_name)
+            ).order_by(similarity_score.desc())
+        else:
+            raise ValueError(f"Query mode {mode} is not supported.")
+        if top_k is not None:
+            query = query.limit(top_k)
+        result = query.all()
+
+    if mode == "cosine":
         # Extract project
         result = [item[0] for item in result]
-    else:
-        raise ValueError(f"Query mode {mode} is not supported.")
-    db.close()
     return result
 
 def get_buildings_by_area(area_name: str) -> list[dict]:
@@ -60,13 +254,11 @@ def get_buildings_by_area(area_name: str) -> list[dict]:
     :param area_name: Name of the area to filter projects.
     :return: A list of dictionaries containing building name, construction end date, and age.
     """
-    db: Session = get_session()
-
     # Query the database for buildings in the given area (master_project_en)
-    projects = db.query(Project).filter(Project.master_project_en.ilike(f"%{area_name}%")).all()
+    with session_scope() as db:
+        projects = db.query(Project).filter(Project.master_project_en.ilike(f"%{area_name}%")).all()
 
     if not projects:
-        db.close()
         return []
 
     # # Sort by building age (newest to oldest)
@@ -93,18 +285,30 @@ def get_buildings_by_area(area_name: str) -> list[dict]:
                 "How old is the building (years)": building_age
             })
 
-    db.close()
     return building_data
 
-def get_project_file_by_name(file_name: str) -> Project:
-    db: Session = get_session()
-    result = db.query(ProjectFile).filter(ProjectFile.file_name.ilike(f"%{file_name}%")).first()
-    return result
+def get_project_files_by_names(file_names: Iterable[str]) -> dict[str, ProjectFile]:
+    """
+    Resolve the cached Telegram files for a list of file names in one query.
+
+    File names are unique across projects, so they are matched exactly.
+
+    Args:
+        file_names: The file names, as stored in `ProjectFile.file_name`.
+
+    Returns:
+        A mapping of file name to project file for the names that are cached.
+    """
+    file_names = list(set(file_names))
+    if not file_names:
+        return {}
+    with session_scope() as db:
+        project_files = db.query(ProjectFile).filter(ProjectFile.file_name.in_(file_names)).all()
+    return {project_file.file_name: project_file for project_file in project_files}
 
 def get_project_files_by_project_id(project_id: int) -> list[ProjectFile]:
-    db: Session = get_session()
-    result = db.query(ProjectFile).filter(ProjectFile.project_id == project_id).all()
-    return result
+    with session_scope() as db:
+        return db.query(ProjectFile).filter(ProjectFile.project_id == project_id).all()
 
 
 def add_project_file(file_name: str, file_type: str, file_telegram_id: str, project_id: int) -> ProjectFile:
@@ -114,64 +318,69 @@ def add_project_file(file_name: str, file_type: str, file_telegram_id: str, proj
         project_id=project_id,
         file_telegram_id=file_telegram_id
     )
-    db: Session = get_session()
-    db.add(project_file)
-    db.commit()
-    db.close()
+    with session_scope() as db:
+        db.add(project_file)
     return project_file
 
 def update_project_file(file_name: str, file_type: str, file_telegram_id: str, project_id: int) -> ProjectFile:
     # Replace file_telegram_id in project file with file_telegram_id
-    db: Session = get_session()
-    project_file = db.query(ProjectFile).filter(ProjectFile.file_name == file_name).first()
-    project_file.file_telegram_id = file_telegram_id
-    db.commit()
-    db.close()
+    with session_scope() as db:
+        project_file = db.query(ProjectFile).filter(ProjectFile.file_name == file_name).first()
+        project_file.file_telegram_id = file_telegram_id
+
+def upsert_project_file(
+    file_name: str,
+    file_type: str,
+    file_telegram_id: str,
+    project_id: int,
+    drive_file_id: Optional[str] = None,
+    md5_checksum: Optional[str] = None
+) -> ProjectFile:
+    """ Insert a project file or replace its Telegram file id in a single statement. """
+    stmt = _upsert_statement(ProjectFile, ["file_name"]).values(
+        file_name=file_name,
+        file_type=file_type,
+        project_id=project_id,
+        file_telegram_id=file_telegram_id,
+        drive_file_id=drive_file_id,
+        md5_checksum=md5_checksum
+    )
+    with session_scope() as db:
+        return db.scalars(stmt, execution_options={"populate_existing": True}).one()
 
 # Get project file by `file_name`
 def get_project_files_by_name(keyword: str, top_k: int = 10) -> ProjectFile:
-    db: Session = get_session()
-    result = db.query(ProjectFile).filter(ProjectFile.file_name.ilike(f"%{keyword}%")).limit(top_k).all()
-    db.close()
-    return result
+    with session_scope() as db:
+        return db.query(ProjectFile).filter(ProjectFile.file_name.ilike(f"%{keyword}%")).limit(top_k).all()
 
 def read_service_charge(charge_id: int) -> ProjectServiceCharge:
-    db: Session = get_session()
-    result = db.query(ProjectServiceCharge).filter(ProjectServiceCharge.charge_id == charge_id).first()
-    db.close()
-    return result
-
-def get_project_service_charge_by_year(master_project_en: str) -> list[dict[str, any]]:
-    db: Session = get_session()
-
-    # Query to get the project service charge data
-    query = db.query(
-        ProjectServiceCharge.project_name,
-        ProjectServiceCharge.property_group_name_en,
-        ProjectServiceCharge.budget_year,
-        ProjectServiceCharge.service_charge
-    ).filter(
-        ProjectServiceCharge.master_project_en.ilike(f"%{master_project_en}%")
-    ).order_by(
-        ProjectServiceCharge.project_name,
-        ProjectServiceCharge.budget_year
-    )
+    with session_scope() as db:
+        return db.query(ProjectServiceCharge).filter(ProjectServiceCharge.id == charge_id).first()
 
-    # Fetching data from the query
-    results = query.all()
+def pivot_service_charges(rows: Iterable[tuple]) -> pd.DataFrame:
+    """
+    Pivot service charges to one row per project and property group, with one column per budget year.
 
-    if not results:
-        return pd.DataFrame()
+    Args:
+        rows: `(project_name, property_group_name_en, budget_year, service_charge)` tuples,
+            ordered by project name and budget year.
 
+    Returns:
+        A DataFrame with the `project_name` and `property_group_name_en` columns followed by
+        the years in order, empty when there are no rows.
+    """
     # Processing the results into a dictionary for pivoting
     data = defaultdict(lambda: {"project_name": "", "property_group_name_en": ""})
 
-    for project_name, property_group_name_en, budget_year, service_charge in results:
+    for project_name, property_group_name_en, budget_year, service_charge in rows:
         if not data[(project_name, property_group_name_en)]["project_name"]:
             data[(project_name, property_group_name_en)]["project_name"] = project_name
             data[(project_name, property_group_name_en)]["property_group_name_en"] = property_group_name_en
         data[(project_name, property_group_name_en)][budget_year] = service_charge
 
+    if not data:
+        return pd.DataFrame()
+
     # Converting the dictionary to a DataFrame
     df = pd.DataFrame.from_dict(data, orient="index").reset_index(drop=True)
 
@@ -185,50 +394,139 @@ def get_project_service_charge_by_year(master_project_en: str) -> list[dict[str,
 
 
 def get_area_service_charge_by_year(area_name: str) -> pd.DataFrame:
-    db: Session = get_session()
-
-    # Query to get the area service charge data
-    query = db.query(
-        ProjectServiceCharge.project_name,
-        ProjectServiceCharge.property_group_name_en,
-        ProjectServiceCharge.budget_year,
-        ProjectServiceCharge.service_charge
-    ).filter(
-        ProjectServiceCharge.master_project_en.ilike(f"%{area_name}%")
-    ).order_by(
-        ProjectServiceCharge.project_name,
-        ProjectServiceCharge.budget_year
-    )
+    """Pivot the service charges of the master projects whose name contains `area_name` by year."""
+    with session_scope() as db:
+        # Query to get the area service charge data
+        query = db.query(
+            ProjectServiceCharge.project_name,
+            ProjectServiceCharge.property_group_name_en,
+            ProjectServiceCharge.budget_year,
+            ProjectServiceCharge.service_charge
+        ).filter(
+            ProjectServiceCharge.master_project_en.ilike(f"%{area_name}%")
+        ).order_by(
+            ProjectServiceCharge.project_name,
+            ProjectServiceCharge.budget_year
+        )
 
-    # Fetching data from the query
-    results = query.all()
+        # Fetching data from the query
+        results = query.all()
 
-    if not results:
-        return pd.DataFrame()
+    return pivot_service_charges(results)
 
-    # Processing the results into a dictionary for pivoting
-    data = defaultdict(lambda: {"project_name": "", "property_group_name_en": ""})
 
-    for project_name, property_group_name_en, budget_year, service_charge in results:
-        if not data[(project_name, property_group_name_en)]["project_name"]:
-            data[(project_name, property_group_name_en)]["project_name"] = project_name
-            data[(project_name, property_group_name_en)]["property_group_name_en"] = property_group_name_en
-        data[(project_name, property_group_name_en)][budget_year] = service_charge
+def get_project_service_charge_by_year(master_project_en: str) -> pd.DataFrame:
+    return get_area_service_charge_by_year(master_project_en)
 
-    # Converting the dictionary to a DataFrame
-    df = pd.DataFrame.from_dict(data, orient="index").reset_index(drop=True)
 
-    # Reordering columns to ensure years are in the correct order
-    year_columns = sorted([col for col in df.columns if isinstance(col, int)])
-    df = df[["project_name", "property_group_name_en"] + year_columns]
-
-    # Fill missing values with empty strings or NaN if needed
-    df = df.fillna("")
-    return df
+def read_service_charge_rows() -> list[tuple]:
+    """
+    Read the columns of every service charge needed to pivot them by year.
 
-def upsert_project_service_charge(project_service_charge: ProjectServiceCharge):
+    Returns:
+        `(master_project_en, project_name, property_group_name_en, budget_year, service_charge)`
+        tuples ordered by project name and budget year.
+    """
+    with session_scope() as db:
+        return [
+            tuple(row) for row in db.execute(
+                select(
+                    ProjectServiceCharge.master_project_en,
+                    ProjectServiceCharge.project_name,
+                    ProjectServiceCharge.property_group_name_en,
+                    ProjectServiceCharge.budget_year,
+                    ProjectServiceCharge.service_charge,
+                ).order_by(
+                    ProjectServiceCharge.project_name,
+                    ProjectServiceCharge.budget_year,
+                    ProjectServiceCharge.id,
+                )
+            )
+        ]
+
+def upsert_project_service_charge(project_service_charge: ProjectServiceCharge) -> ProjectServiceCharge:
     """ Upsert a project service charge record. """
-    db: Session = get_session()
-    db.merge(project_service_charge)
-    db.commit()
-    db.close()
+    values = project_service_charge.as_dict()
+    if values["id"] is None:
+        del values["id"]
+    return upsert_project_service_charges([values])[0]
+
+
+def upsert_project_service_charges(service_charges: list[dict]) -> list[ProjectServiceCharge]:
+    """
+    Insert or update a batch of project service charges keyed by their natural key.
+
+    The natural key is (project, property group, usage, budget year), as enforced by the
+    unique index `ix_projects_service_charge_natural_key`. When a key repeats within the
+    batch, the last row wins.
+
+    Args:
+        service_charges: Dictionaries of `ProjectServiceCharge` column values.
+
+    Returns:
+        The resulting service charge rows.
+    """
+    # A single statement cannot affect the same row twice
+    service_charges = list({service_charge_key(values): values for values in service_charges}.values())
+    if not service_charges:
+        return []
+    with session_scope() as db:
+        return list(db.scalars(
+            _upsert_statement(ProjectServiceCharge, list(SERVICE_CHARGE_KEY_COLUMNS), SERVICE_CHARGE_KEY_ELEMENTS),
+            service_charges,
+            execution_options={"populate_existing": True}
+        ))
+
+
+def service_charge_key(service_charge: dict) -> tuple:
+    """ Return the natural key of a service charge, with missing text values as empty strings. """
+    return tuple(
+        service_charge.get(column) if column in ("project_id", "budget_year") else service_charge.get(column) or ""
+        for column in SERVICE_CHARGE_KEY_COLUMNS
+    )
+
+
+def import_service_charges(service_charges: Iterable[dict], batch_size: int = 1000) -> dict[tuple, str]:
+    """
+    Upsert a stream of service charges by natural key in one transaction.
+
+    Rows are written in batches with INSERT ... ON CONFLICT; rows identical to the stored
+    record are left untouched. When a key repeats, the last row wins.
+
+    Args:
+        service_charges: Dictionaries of `ProjectServiceCharge` column values, without `id`.
+        batch_size: Number of rows per statement.
+
+    Returns:
+        A mapping of natural keys to `created` or `updated`. Keys of unchanged rows are absent.
+    """
+    table = ProjectServiceCharge.__table__
+    value_columns = [column.name for column in table.columns if column.name != "id"]
+
+    def write_batch(db, batch: list[dict]) -> None:
+        # A single statement cannot affect the same row twice
+        batch = list({service_charge_key(service_charge): service_charge for service_charge in batch}.values())
+        stmt = pg_insert(ProjectServiceCharge).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=SERVICE_CHARGE_KEY_ELEMENTS,
+            set_={column: stmt.excluded[column] for column in value_columns},
+            where=tuple_(*[table.c[column] for column in value_columns]).is_distinct_from(
+                tuple_(*[stmt.excluded[column] for column in value_columns])
+            )
+        ).returning(*[table.c[column] for column in SERVICE_CHARGE_KEY_COLUMNS], literal_column("xmax = 0"))
+        for *key, inserted in db.execute(stmt):
+            key = service_charge_key(dict(zip(SERVICE_CHARGE_KEY_COLUMNS, key)))
+            if statuses.get(key) != "created":
+                statuses[key] = "created" if inserted else "updated"
+
+    statuses: dict[tuple, str] = {}
+    with session_scope() as db:
+        batch = []
+        for service_charge in service_charges:
+            batch.append(service_charge)
+            if len(batch) >= batch_size:
+                write_batch(db, batch)
+                batch = []
+        if batch:
+            write_batch(db, batch)
+    return statuses
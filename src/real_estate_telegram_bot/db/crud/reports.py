@@ -0,0 +1,78 @@
+import logging
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from real_estate_telegram_bot.db.database import session_scope
+from real_estate_telegram_bot.db.models import DataVersion, ReportFile
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+def read_data_version(dataset: str) -> int:
+    """Read the version of a dataset, 0 before its first import."""
+    with session_scope() as db:
+        return db.scalar(select(DataVersion.version).where(DataVersion.dataset == dataset)) or 0
+
+
+def bump_data_version(dataset: str) -> int:
+    """
+    Increase the version of a dataset after an import and forget the reports generated from it.
+
+    Returns:
+        The new version.
+    """
+    with session_scope() as db:
+        version = db.execute(
+            pg_insert(DataVersion)
+            .values(dataset=dataset, version=1)
+            .on_conflict_do_update(
+                index_elements=[DataVersion.dataset],
+                set_={"version": DataVersion.version + 1, "updated_at": func.now()},
+            )
+            .returning(DataVersion.version)
+        ).scalar_one()
+        db.execute(delete(ReportFile).where(ReportFile.dataset == dataset))
+    logger.info(f"Dataset {dataset} is now at version {version}")
+    return version
+
+
+def read_report_file(report_type: str, area: str) -> Optional[ReportFile]:
+    with session_scope() as db:
+        return db.get(ReportFile, (report_type, area))
+
+
+def upsert_report_file(
+    report_type: str,
+    area: str,
+    dataset: str,
+    data_version: int,
+    file_telegram_id: Optional[str],
+) -> None:
+    """
+    Record the Telegram upload of a report.
+
+    Args:
+        report_type: Kind of report, e.g. `service_charge`.
+        area: Normalized area the report is about.
+        dataset: Dataset the report was generated from.
+        data_version: Version of the dataset read before generating the report.
+        file_telegram_id: Telegram file id of the upload, None when there was no data.
+    """
+    values = {"dataset": dataset, "data_version": data_version, "file_telegram_id": file_telegram_id}
+    with session_scope() as db:
+        db.execute(
+            pg_insert(ReportFile)
+            .values(report_type=report_type, area=area, **values)
+            .on_conflict_do_update(
+                index_elements=[ReportFile.report_type, ReportFile.area],
+                set_={**values, "created_at": func.now()},
+                # Never replace a report of newer data
+                where=ReportFile.data_version <= data_version,
+            )
+        )
@@ -3,10 +3,12 @@ from datetime import datetime
 from typing import Optional
 
 import pandas as pd
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Session
 
-from real_estate_telegram_bot.db.database import get_session
+from real_estate_telegram_bot.db.cache import user_cache
+from real_estate_telegram_bot.db.database import session_scope
 from real_estate_telegram_bot.db.models import User
 
 # Set up logging
@@ -16,25 +18,25 @@ logging.basicConfig(
 )
 
 def read_user(user_id: str) -> User:
-    db: Session = get_session()
-    result = db.query(User).filter(User.id == user_id).first()
-    db.close()
-    return result
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    with session_scope() as db:
+        user = db.query(User).filter(User.id == user_id).first()
+    if user is not None:
+        user_cache.put(user)
+    return user
 
 
 def read_user_by_username(username: str) -> User:
     """Read user by username"""
-    db: Session = get_session()
-    result = db.query(User).filter(User.username == username).first()
-    db.close()
-    return result
+    with session_scope() as db:
+        return db.query(User).filter(User.username == username).first()
 
 
 def read_users() -> list[User]:
-    db: Session = get_session()
-    result = db.query(User).all()
-    db.close()
-    return result
+    with session_scope() as db:
+        return db.query(User).all()
 
 
 def create_user(
@@ -55,26 +57,22 @@ def create_user(
     Returns:
         The created user object.
     """
-    db: Session = get_session()
-    db.expire_on_commit = False
     try:
-        user = User(
-            id=id,
-            username=username,
-            first_message_timestamp=datetime.now(),
-            last_message_timestamp=datetime.now(),
-            lang=lang,
-            role=role
-        )
-        db.add(user)
-        db.commit()
+        with session_scope() as db:
+            user = User(
+                id=id,
+                username=username,
+                first_message_timestamp=datetime.now(),
+                last_message_timestamp=datetime.now(),
+                lang=lang,
+                role=role
+            )
+            db.add(user)
         logger.debug(f"User with name {user.username} added successfully.")
     except Exception as e:
-        db.rollback()
         logger.error(f"Error adding user with name {username}: {e}")
         raise
-    finally:
-        db.close()
+    user_cache.put(user)
     return user
 
 
@@ -96,29 +94,25 @@ def update_user(
     Returns:
         The updated user object.
     """
-    db: Session = get_session()
-    db.expire_on_commit = False
     try:
-        user = db.query(User).filter(User.id == id).first()
-        if user:
-            if username is not None:
-                user.username = username 
-            if lang is not None:
-                user.lang = lang
-            if role is not None:
-                user.role = role
-            user.last_message_timestamp = datetime.now()
-            db.commit()
-            logger.debug(f"User with ID {user.id} updated successfully.")
-        else:
-            logger.error(f"User with ID {id} not found.")
-            raise ValueError(f"User with ID {id} not found.")
+        with session_scope() as db:
+            user = db.query(User).filter(User.id == id).first()
+            if user:
+                if username is not None:
+                    user.username = username
+                if lang is not None:
+                    user.lang = lang
+                if role is not None:
+                    user.role = role
+                user.last_message_timestamp = datetime.now()
+                logger.debug(f"User with ID {user.id} updated successfully.")
+            else:
+                logger.error(f"User with ID {id} not found.")
+                raise ValueError(f"User with ID {id} not found.")
     except Exception as e:
-        db.rollback()
         logger.error(f"Error updating user with ID {id}: {e}")
         raise
-    finally:
-        db.close()
+    user_cache.put(user)
     return user
 
 
@@ -136,57 +130,96 @@ def upsert_user(
         username: The user's name.
         lang: The user's language.
         role: The user's role.
-        active_session_id: The user's active session ID.
 
     Returns:
         The user object.
     """
-    db: Session = get_session()
-    db.expire_on_commit = False
+    now = datetime.now()
+    insert_values = {"id": id, "first_message_timestamp": now, "last_message_timestamp": now}
+    update_values = {"last_message_timestamp": now}
+    for column, value in (("username", username), ("lang", lang), ("role", role)):
+        if value is not None:
+            insert_values[column] = value
+            update_values[column] = value
+
+    # Single INSERT ... ON CONFLICT DO UPDATE statement returning the resulting row
+    stmt = (
+        pg_insert(User)
+        .values(**insert_values)
+        .on_conflict_do_update(index_elements=[User.id], set_=update_values)
+        .returning(User)
+    )
     try:
-        user = db.query(User).filter(User.id == id).first()
-        if user:
-            user = update_user(
-                id=id,
-                username=username,
-                lang=lang,
-                role=role
-            )
-        else:
-            user = create_user(
-                id=id,
-                username=username,
-                lang=lang,
-                role=role
-            )
+        with session_scope() as db:
+            user = db.scalars(stmt, execution_options={"populate_existing": True}).one()
     except Exception as e:
-        db.rollback()
         logger.error(f"Error upserting user with ID {id}: {e}")
         raise
-    finally:
-        db.close()
+    user_cache.put(user)
     return user
 
 
 def update_user_language(user_id: int, new_language: str):
     """ Update the language for a user. """
-    db: Session = get_session()
     try:
-        # Query the user by user_id
-        user = db.query(User).filter(User.id == user_id).one()
-
-        # Update the language field
-        user.lang = new_language
+        with session_scope() as db:
+            # Query the user by user_id
+            user = db.query(User).filter(User.id == user_id).one()
 
-        # Commit the transaction
-        db.commit()
+            # Update the language field
+            user.lang = new_language
 
         logger.info(f"User {user_id} language updated to {new_language}")
     except NoResultFound:
-        db.rollback()
         logger.info(f"No user found with user_id {user_id}")
     except Exception as e:
-        db.rollback()
         logger.error(f"Error updating language for user {user_id}: {e}")
     finally:
-        db.close()
+        user_cache.invalidate(user_id)
+
+
+def touch_user(id: int, username: Optional[str] = None) -> User:
+    """
+    Return the user behind an incoming update, creating it if needed.
+
+    Known users are served from the user cache; their `last_message_timestamp`
+    is written back at most once per touch interval, the remaining updates by
+    `flush_user_activity`.
+
+    Args:
+        id: The user's ID.
+        username: The user's name.
+
+    Returns:
+        The user object.
+    """
+    user = user_cache.get(id)
+    if user is None or (username is not None and user.username != username):
+        return upsert_user(id=id, username=username)
+
+    user.last_message_timestamp = datetime.now()
+    timestamp = user_cache.touch(id, user.last_message_timestamp)
+    if timestamp is not None:
+        with session_scope() as db:
+            db.execute(update(User).where(User.id == id).values(last_message_timestamp=timestamp))
+    return user
+
+
+def flush_user_activity() -> int:
+    """
+    Write the coalesced `last_message_timestamp` values of cached users.
+
+    Returns:
+        The number of updated users.
+    """
+    pending = user_cache.pop_pending()
+    if not pending:
+        return 0
+    with session_scope() as db:
+        db.connection().execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("user_id"))
+            .values(last_message_timestamp=bindparam("timestamp")),
+            [{"user_id": user_id, "timestamp": timestamp} for user_id, timestamp in pending.items()]
+        )
+    return len(pending)
@@ -1,14 +1,21 @@
-import datetime
 import logging
 import logging.config
 import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Optional
 
 from dotenv import find_dotenv, load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from omegaconf import OmegaConf
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
-from .models import Base, Event, User
+from .migrations import run_migrations
+from .models import Base
 
 # Load logging configuration with OmegaConf
 # Set up logging
@@ -19,6 +26,8 @@ logging.basicConfig(
 
 load_dotenv(find_dotenv(usecwd=True))
 
+config = OmegaConf.load("./src/real_estate_telegram_bot/conf/config.yaml")
+
 # Retrieve environment variables
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
@@ -34,18 +43,157 @@ if not all([DB_HOST, DB_NAME, DB_USER, DB_PASSWORD]):
 # Construct the database URL
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=require"
 
-def get_enginge():
-    return create_engine(
-        DATABASE_URL,
-        connect_args={'connect_timeout': 5, "application_name": "real_estate_telegram_bot"},
-        poolclass=NullPool
+# Process-wide engine and session factory, created lazily by `get_engine()`
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_engine_lock = threading.Lock()
+
+
+class _CheckoutStats:
+    """Time spent waiting for pooled connections, shared by the pools of the process."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait_seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "checkout_wait_ms_avg": round(self.wait_seconds * 1000 / self.checkouts, 2) if self.checkouts else 0.0,
+                "checkout_wait_ms_max": round(self.max_wait_seconds * 1000, 2),
+            }
+
+
+_checkout_stats = _CheckoutStats()
+
+
+class _InstrumentedQueuePool(QueuePool):
+    """Queue pool recording how long checkouts wait for a connection and how many time out."""
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            _checkout_stats.record(time.perf_counter() - start_time, timed_out)
+
+
+def required_pool_size() -> int:
+    """
+    Return the number of threads that may use the database at the same time.
+
+    These are the dispatcher workers, the delivery jobs and upload workers, and the
+    background threads of the event logger, broadcast worker, cache warmer and user
+    activity flush.
+    """
+    background_threads = 1 + config.event_logger.enabled + config.broadcasts.worker_enabled + (
+        config.drive_index.enabled and config.warmer.enabled
+    )
+    return (
+        config.dispatcher.workers
+        + config.delivery.max_concurrent_jobs
+        + config.delivery.upload_workers
+        + background_threads
     )
 
+
+def get_engine() -> Engine:
+    """Return the process-wide engine, creating its connection pool on first use."""
+    global _engine, _session_factory
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                pool_config = config.db.pool
+                required_size = required_pool_size()
+                pool_size = pool_config.size or required_size
+                if pool_size < required_size:
+                    logger.warning(
+                        f"Database pool size {pool_size} is below the {required_size} threads that may "
+                        f"use the database at once, they will wait for connections"
+                    )
+                _engine = create_engine(
+                    DATABASE_URL,
+                    connect_args={'connect_timeout': 5, "application_name": "real_estate_telegram_bot"},
+                    poolclass=_InstrumentedQueuePool,
+                    pool_size=pool_size,
+                    max_overflow=pool_config.max_overflow,
+                    pool_timeout=pool_config.timeout_seconds,
+                    pool_recycle=pool_config.recycle_seconds,
+                    pool_pre_ping=pool_config.pre_ping,
+                )
+                _session_factory = sessionmaker(bind=_engine, expire_on_commit=False)
+                logger.info(
+                    f"Database engine created with pool size {pool_size} "
+                    f"and max overflow {pool_config.max_overflow}"
+                )
+    return _engine
+
+
 def create_tables():
-    engine = get_enginge()
+    engine = get_engine()
     Base.metadata.create_all(engine)
+    run_migrations(engine)
     logger.info("Tables created")
 
-def get_session():
-    engine = get_enginge()
-    return sessionmaker(bind=engine)()
+
+def get_session() -> Session:
+    """Return a new session bound to the pooled engine. The caller must close it."""
+    get_engine()
+    return _session_factory()
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Provide a transactional scope around a series of operations.
+
+    The session is committed if the block finishes without errors, rolled back otherwise
+    and always returned to the pool. Loaded objects stay usable after the block exits.
+    """
+    db = get_session()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_pool_status() -> dict:
+    """Return connection pool statistics for monitoring, including the time spent waiting for connections."""
+    pool = get_engine().pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": config.db.pool.max_overflow,
+        **_checkout_stats.as_dict(),
+    }
+
+
+def dispose_engine() -> None:
+    """Close all pooled connections, e.g. on shutdown or after a fork."""
+    global _engine, _session_factory
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+            _session_factory = None
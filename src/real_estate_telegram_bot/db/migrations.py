@@ -0,0 +1,124 @@
+import logging
+
+from sqlalchemy import Connection, Engine, text
+
+# Set up logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Arbitrary key of the advisory lock that serializes migrations across processes
+MIGRATIONS_LOCK_ID = 72_161_001
+
+
+def _service_charge_natural_key(connection: Connection) -> None:
+    """Create the service charge natural key on databases created before it existed.
+
+    Duplicate records are removed first, keeping the most recently inserted one.
+    """
+    deleted = connection.execute(text("""
+        DELETE FROM projects_service_charge a
+        USING projects_service_charge b
+        WHERE a.id < b.id
+          AND a.project_id IS NOT DISTINCT FROM b.project_id
+          AND coalesce(a.property_group_name_en, '') = coalesce(b.property_group_name_en, '')
+          AND coalesce(a.usage_name_en, '') = coalesce(b.usage_name_en, '')
+          AND a.budget_year IS NOT DISTINCT FROM b.budget_year
+    """)).rowcount
+    connection.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_projects_service_charge_natural_key ON projects_service_charge
+        (project_id, coalesce(property_group_name_en, ''), coalesce(usage_name_en, ''), budget_year)
+    """))
+    logger.info(f"{deleted} duplicate service charge records removed")
+
+
+def _trigram_indexes(connection: Connection) -> None:
+    """Enable pg_trgm and index the columns searched with ILIKE and similarity()."""
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_projects_project_name_id_buildings_trgm "
+        "ON projects USING gin (project_name_id_buildings gin_trgm_ops)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_projects_master_project_en_trgm "
+        "ON projects USING gin (master_project_en gin_trgm_ops)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_project_files_file_name_trgm "
+        "ON project_files USING gin (file_name gin_trgm_ops)"
+    ))
+
+
+def _project_file_source(connection: Connection) -> None:
+    """Record which Drive file and version each cached Telegram file was uploaded from."""
+    connection.execute(text(
+        "ALTER TABLE project_files "
+        "ADD COLUMN IF NOT EXISTS drive_file_id VARCHAR, "
+        "ADD COLUMN IF NOT EXISTS md5_checksum VARCHAR"
+    ))
+
+
+def _broadcast_audience(connection: Connection) -> None:
+    """Add the audience filters to broadcasts created before they existed."""
+    connection.execute(text(
+        "ALTER TABLE broadcasts "
+        "ADD COLUMN IF NOT EXISTS audience_lang VARCHAR, "
+        "ADD COLUMN IF NOT EXISTS audience_role VARCHAR, "
+        "ADD COLUMN IF NOT EXISTS audience_active_days INTEGER"
+    ))
+
+
+# Ordered list of (version, description, function). Append new migrations at the end and
+# never change the version of one that was released. Every migration must be idempotent so
+# that it also applies cleanly to databases whose objects were created by hand.
+MIGRATIONS = [
+    (1, "service charge natural key", _service_charge_natural_key),
+    (2, "trigram search indexes", _trigram_indexes),
+    (3, "project file source", _project_file_source),
+    (4, "broadcast audience", _broadcast_audience),
+]
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """
+    Apply pending schema migrations.
+
+    Applied versions are recorded in the `schema_migrations` table. Each migration runs in
+    its own transaction, and concurrent callers wait on an advisory lock.
+
+    Args:
+        engine: The engine to migrate.
+
+    Returns:
+        The versions applied by this call.
+    """
+    applied = []
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """))
+
+    for version, description, migration in MIGRATIONS:
+        with engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATIONS_LOCK_ID})
+            done = connection.execute(
+                text("SELECT 1 FROM schema_migrations WHERE version = :version"), {"version": version}
+            ).first()
+            if done:
+                continue
+            logger.info(f"Applying migration {version}: {description}")
+            migration(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": description}
+            )
+            applied.append(version)
+
+    if applied:
+        logger.info(f"Applied migrations {applied}")
+    return applied
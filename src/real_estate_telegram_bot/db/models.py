@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, PrimaryKeyConstraint, String, func
 from sqlalchemy.orm import DeclarativeBase, relationship
 
 
@@ -109,6 +109,17 @@ class ProjectServiceCharge(Base):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
 
+# Natural key of a service charge record, used to deduplicate imports
+SERVICE_CHARGE_KEY_COLUMNS = ("project_id", "property_group_name_en", "usage_name_en", "budget_year")
+SERVICE_CHARGE_KEY_ELEMENTS = [
+    ProjectServiceCharge.project_id,
+    func.coalesce(ProjectServiceCharge.property_group_name_en, ""),
+    func.coalesce(ProjectServiceCharge.usage_name_en, ""),
+    ProjectServiceCharge.budget_year,
+]
+Index("ix_projects_service_charge_natural_key", *SERVICE_CHARGE_KEY_ELEMENTS, unique=True)
+
+
 class ProjectFile(Base):
 
     __tablename__ = 'project_files'
@@ -118,5 +129,79 @@ class ProjectFile(Base):
     file_name = Column(String, unique=True)
     file_type = Column(String)
     file_telegram_id = Column(String)
+    # Drive file the Telegram upload was made from, to detect changed files
+    drive_file_id = Column(String)
+    md5_checksum = Column(String)
 
     project = relationship("Project", back_populates="project_files")
+
+
+class Broadcast(Base):
+    """A message sent by an admin to every user, or an audience, at a scheduled time."""
+
+    __tablename__ = 'broadcasts'
+
+    id = Column(Integer, primary_key=True)
+    created_by = Column(BigInteger)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    scheduled_at = Column(DateTime(timezone=True), nullable=False)
+    media_type = Column(String, nullable=False)  # text | photo
+    content = Column(String)
+    photo = Column(String)
+    # Audience filters, all users when none is set
+    audience_lang = Column(String)
+    audience_role = Column(String)
+    audience_active_days = Column(Integer)
+    # scheduled -> sending -> completed, or cancelled
+    status = Column(String, nullable=False, default='scheduled')
+    # Id of the last recipient the message was sent to, recipients are visited in id order
+    cursor = Column(BigInteger)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime(timezone=True))
+
+    deliveries = relationship("BroadcastDelivery", back_populates="broadcast", cascade="all, delete-orphan")
+
+
+Index("ix_broadcasts_status_scheduled_at", Broadcast.status, Broadcast.scheduled_at)
+
+
+class BroadcastDelivery(Base):
+    """Outcome of sending a broadcast to one user."""
+
+    __tablename__ = 'broadcast_deliveries'
+    __table_args__ = (PrimaryKeyConstraint('broadcast_id', 'user_id'),)
+
+    broadcast_id = Column(Integer, ForeignKey('broadcasts.id', ondelete='CASCADE'))
+    user_id = Column(BigInteger)
+    status = Column(String, nullable=False)  # sent | failed
+    error = Column(String)
+    sent_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    broadcast = relationship("Broadcast", back_populates="deliveries")
+
+
+class DataVersion(Base):
+    """Version of an imported dataset, increased on every import."""
+
+    __tablename__ = 'data_versions'
+
+    dataset = Column(String, primary_key=True)  # projects | service_charges
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ReportFile(Base):
+    """Telegram upload of a generated report, reused while its dataset is unchanged."""
+
+    __tablename__ = 'report_files'
+    __table_args__ = (PrimaryKeyConstraint('report_type', 'area'),)
+
+    report_type = Column(String)
+    area = Column(String)
+    dataset = Column(String, nullable=False)
+    # Version of the dataset the report was generated from
+    data_version = Column(Integer, nullable=False)
+    # None when there was no data to report
+    file_telegram_id = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+# The database module refuses to load without its settings; unit tests never connect, as the
+# engine is only created on first use
+for name in ("DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD"):
+    os.environ.setdefault(name, "test")
+
+# PostgreSQL database the crud tests run against, e.g. `postgresql://postgres@localhost/bot_test`.
+# Every table in it is emptied after each test, never point it at a real database.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Point the engine at the test database, with empty tables."""
+    if TEST_DATABASE_URL is None:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from real_estate_telegram_bot.db import database
+    from real_estate_telegram_bot.db.models import Base
+
+    database.dispose_engine()
+    monkeypatch.setattr(database, "DATABASE_URL", TEST_DATABASE_URL)
+    Base.metadata.create_all(database.get_engine())
+    try:
+        yield
+    finally:
+        tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+        with database.session_scope() as session:
+            session.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        database.dispose_engine()
@@ -0,0 +1,140 @@
+import threading
+import time
+
+from telebot import types
+
+from real_estate_telegram_bot.api.dispatcher import UpdateDispatcher, chat_key
+
+
+def create_update(update_id: int, chat_id: int) -> types.Update:
+    return types.Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "text": str(update_id),
+        },
+    })
+
+
+def create_bot(mocker, processed: list):
+    bot = mocker.MagicMock()
+    bot.process_new_updates.side_effect = lambda updates: processed.extend(
+        (chat_key(update), update.update_id) for update in updates
+    )
+    return bot
+
+
+def test_updates_of_a_chat_are_processed_in_order(mocker):
+    # Arrange
+    processed = []
+    dispatcher = UpdateDispatcher(create_bot(mocker, processed), workers=4)
+    for update_id in range(20):
+        dispatcher.put(create_update(update_id, chat_id=update_id % 2))
+
+    # Act
+    dispatcher.start()
+    dispatcher.stop()
+
+    # Assert
+    for chat_id in (0, 1):
+        assert [update_id for key, update_id in processed if key == chat_id] == list(range(chat_id, 20, 2))
+    assert dispatcher.stats()["processed"] == 20
+
+
+def test_chats_are_served_in_turn(mocker):
+    # Arrange
+    processed = []
+    dispatcher = UpdateDispatcher(create_bot(mocker, processed), workers=1)
+    for update_id in range(3):
+        dispatcher.put(create_update(update_id, chat_id=1))
+    for update_id in range(3, 6):
+        dispatcher.put(create_update(update_id, chat_id=2))
+
+    # Act
+    dispatcher.start()
+    dispatcher.stop()
+
+    # Assert
+    assert processed == [(1, 0), (2, 3), (1, 1), (2, 4), (1, 2), (2, 5)]
+
+
+def test_a_chat_is_never_processed_by_two_workers_at_once(mocker):
+    # Arrange
+    release = threading.Event()
+    started = []
+    bot = mocker.MagicMock()
+    bot.process_new_updates.side_effect = lambda updates: (started.append(updates[0].update_id), release.wait(5))
+    dispatcher = UpdateDispatcher(bot, workers=4)
+    dispatcher.start()
+
+    # Act
+    dispatcher.put(create_update(1, chat_id=1))
+    dispatcher.put(create_update(2, chat_id=1))
+    dispatcher.put(create_update(3, chat_id=2))
+    time.sleep(0.2)
+    in_flight = sorted(started)
+    release.set()
+    dispatcher.stop()
+
+    # Assert
+    assert in_flight == [1, 3]
+    assert sorted(started) == [1, 2, 3]
+
+
+def test_updates_beyond_the_chat_queue_size_are_dropped(mocker):
+    # Arrange
+    processed = []
+    dispatcher = UpdateDispatcher(create_bot(mocker, processed), workers=1, max_chat_queue_size=2)
+
+    # Act
+    accepted = [dispatcher.put(create_update(update_id, chat_id=1)) for update_id in range(4)]
+    other_chat = dispatcher.put(create_update(4, chat_id=2))
+    stats = dispatcher.stats()
+    dispatcher.start()
+    dispatcher.stop()
+
+    # Assert
+    assert accepted == [True, True, True, True]
+    assert other_chat
+    assert stats["pending"] == 3
+    assert stats["dropped"] == 2
+    assert processed == [(1, 0), (2, 4), (1, 1)]
+
+
+def test_a_full_queue_refuses_updates(mocker):
+    # Arrange
+    dispatcher = UpdateDispatcher(mocker.MagicMock(), workers=1, max_queue_size=2)
+
+    # Act
+    accepted = [dispatcher.put(create_update(update_id, chat_id=update_id)) for update_id in range(3)]
+
+    # Assert
+    assert accepted == [True, True, False]
+    assert dispatcher.stats()["pending"] == 2
+    assert dispatcher.stats()["dropped"] == 0
+
+
+def test_a_failing_handler_does_not_stop_the_chat(mocker):
+    # Arrange
+    processed = []
+    bot = mocker.MagicMock()
+
+    def process(updates):
+        processed.append(updates[0].update_id)
+        if updates[0].update_id == 0:
+            raise RuntimeError("handler failed")
+
+    bot.process_new_updates.side_effect = process
+    dispatcher = UpdateDispatcher(bot, workers=1)
+    dispatcher.put(create_update(0, chat_id=1))
+    dispatcher.put(create_update(1, chat_id=1))
+
+    # Act
+    dispatcher.start()
+    dispatcher.stop()
+
+    # Assert
+    assert processed == [0, 1]
+    assert dispatcher.stats()["processed"] == 2
@@ -0,0 +1,105 @@
+import importlib
+
+import dotenv
+import pytest
+
+
+@pytest.fixture(scope="module")
+def users():
+    """Import the module without the `.env` file it requires."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(dotenv, "find_dotenv", lambda *args, **kwargs: "")
+        return importlib.import_module("real_estate_telegram_bot.api.users")
+
+
+class FakeClient:
+    """Telethon client where every user is a member of the channel."""
+
+    async def get_input_entity(self, peer):
+        return peer
+
+    async def __call__(self, request):
+        return None
+
+    async def disconnect(self):
+        return None
+
+
+def create_service(users, mocker, failures: int, **kwargs):
+    service = users.ChannelMembershipService("channel", timeout_seconds=2, **kwargs)
+    attempts = []
+
+    async def connect():
+        attempts.append(len(attempts))
+        if len(attempts) <= failures:
+            raise ConnectionError("network unreachable")
+        service._client = FakeClient()
+        service._channel = "channel"
+
+    async def refresh_periodically():
+        return None
+
+    mocker.patch.object(service, "_connect", side_effect=connect)
+    mocker.patch.object(service, "_refresh_periodically", side_effect=refresh_periodically)
+    return service, attempts
+
+
+def test_failed_connect_is_retried(users, mocker):
+    # Arrange
+    service, attempts = create_service(users, mocker, failures=1, reconnect_backoff_seconds=0)
+
+    # Act
+    first = service.is_member(user_id=1)
+    second = service.is_member(user_id=2)
+
+    # Assert
+    assert first is None
+    assert second is True
+    assert len(attempts) == 2
+
+
+def test_connect_is_not_retried_before_the_backoff(users, mocker):
+    # Arrange
+    service, attempts = create_service(users, mocker, failures=2, reconnect_backoff_seconds=60)
+    service.is_member(user_id=1)
+    service.is_member(user_id=1)
+
+    # Act
+    result = service.is_member(user_id=1)
+
+    # Assert
+    assert result is None
+    assert len(attempts) == 2
+
+
+def test_backoff_grows_with_consecutive_failures(users, mocker):
+    # Arrange
+    service, attempts = create_service(
+        users, mocker, failures=10, reconnect_backoff_seconds=5, max_reconnect_backoff_seconds=12
+    )
+    clock = mocker.patch.object(users, "time").monotonic
+    clock.return_value = 0.0
+    service.is_member(user_id=1)
+
+    # Act
+    delays = []
+    for now in (0.0, 5.0, 15.0, 27.0):
+        clock.return_value = now
+        service.is_member(user_id=1)
+        delays.append(service._next_connect_at - now)
+
+    # Assert
+    assert delays == [5, 10, 12, 12]
+    assert len(attempts) == 5
+
+
+def test_failed_checks_are_not_cached(users, mocker):
+    # Arrange
+    service, _ = create_service(users, mocker, failures=1, reconnect_backoff_seconds=0)
+    service.is_member(user_id=1)
+
+    # Act
+    result = service.is_member(user_id=1)
+
+    # Assert
+    assert result is True
@@ -0,0 +1,56 @@
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import pytest
+
+from real_estate_telegram_bot.core.broadcast import BroadcastWorker
+from real_estate_telegram_bot.db import crud
+
+
+class FakeSendQueue:
+    """Send queue that sends immediately, or cancels the sends from `stopped_at` on as on shutdown."""
+
+    def __init__(self, stopped_at: Optional[int] = None) -> None:
+        self.stopped_at = stopped_at
+        self.sent: list[int] = []
+
+    def submit(self, chat_id: int, method, *args, **kwargs) -> Future:
+        future = Future()
+        if self.stopped_at is not None and chat_id >= self.stopped_at:
+            future.cancel()
+        else:
+            self.sent.append(chat_id)
+            future.set_result(None)
+        return future
+
+
+@pytest.fixture
+def broadcast(db):
+    for user_id in range(1, 8):
+        crud.create_user(id=user_id)
+    return crud.create_broadcast(
+        created_by=None,
+        scheduled_at=datetime.now(timezone.utc) - timedelta(minutes=1),
+        media_type="text",
+        content="Hello",
+    )
+
+
+def test_broadcast_resumes_from_its_cursor_after_a_restart(mocker, broadcast):
+    # Arrange
+    bot = mocker.MagicMock()
+    interrupted = FakeSendQueue(stopped_at=5)
+    BroadcastWorker(bot, interrupted, batch_size=3).send(broadcast)
+    cursor = crud.read_broadcast(broadcast.id).cursor
+
+    # Act
+    resumed = FakeSendQueue()
+    BroadcastWorker(bot, resumed, batch_size=3).run_pending()
+
+    # Assert
+    assert cursor == 3
+    assert interrupted.sent == [1, 2, 3, 4]
+    assert resumed.sent == [5, 6, 7]
+    broadcast = crud.read_broadcast(broadcast.id)
+    assert (broadcast.status, broadcast.cursor, broadcast.sent, broadcast.failed) == ("completed", 7, 7, 0)
@@ -0,0 +1,105 @@
+import math
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+from sqlalchemy import DateTime, Integer, String
+
+from real_estate_telegram_bot.core import db as core_db
+from real_estate_telegram_bot.core.db import coerce_value, import_projects_from_excel
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("   ", None),
+    (42, 42),
+    ("42", 42),
+    (" 7 ", 7),
+    ("1e3", 1000),
+    (12.0, 12),
+    (2.5, 3),
+    (-2.5, -3),
+    (2**31 - 1, 2**31 - 1),
+])
+def test_integer_cells_are_coerced(value, expected):
+    # Act
+    result = coerce_value(value, Integer())
+
+    # Assert
+    assert result == expected
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, "nan", "12 units", 2**31, -2**31 - 1, "3000000000"])
+def test_invalid_integer_cells_are_rejected(value):
+    # Act / Assert
+    with pytest.raises(ValueError):
+        coerce_value(value, Integer())
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("2024-01-31", datetime(2024, 1, 31)),
+    (pd.Timestamp("2024-01-31 10:30"), datetime(2024, 1, 31, 10, 30)),
+    (datetime(2024, 1, 31), datetime(2024, 1, 31)),
+    (pd.NaT, None),
+    (math.nan, None),
+])
+def test_date_cells_are_coerced(value, expected):
+    # Act
+    result = coerce_value(value, DateTime())
+
+    # Assert
+    assert result == expected
+    assert result is None or type(result) is datetime
+
+
+def test_invalid_date_cells_are_rejected():
+    # Act / Assert
+    with pytest.raises(ValueError):
+        coerce_value("not a date", DateTime())
+
+
+@pytest.mark.parametrize("value, expected", [("Bay Square", "Bay Square"), (12, "12"), ("", "")])
+def test_text_cells_are_coerced(value, expected):
+    # Act
+    result = coerce_value(value, String())
+
+    # Assert
+    assert result == expected
+
+
+def test_text_with_a_nul_character_is_rejected():
+    # Act / Assert
+    with pytest.raises(ValueError):
+        coerce_value("Bay\x00Square", String())
+
+
+def test_import_results_keep_the_row_order(mocker, tmp_path):
+    # Arrange
+    path = tmp_path / "projects.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["project_id", "project_name", "percent_completed"])
+    for row in [(1, "Azure", 100), (None, "Orphan", 10), (2, "Bay Square", "half"), (3, "Marina Gate", 50),
+                (3, "Marina Gate", 60), (4, "Palm View", 0)]:
+        sheet.append(row)
+    workbook.save(path)
+    import_projects = mocker.patch.object(core_db, "import_projects", return_value=[
+        {"project_id": 1, "status": "unchanged", "changes": {}},
+        {"project_id": 3, "status": "skipped", "changes": {}},
+        {"project_id": 3, "status": "updated", "changes": {"percent_completed": (60, 40)}},
+        {"project_id": 4, "status": "created", "changes": {}},
+    ])
+    mocker.patch.object(core_db, "bump_data_version")
+    mocker.patch.object(core_db.project_index, "rebuild")
+
+    # Act
+    results = import_projects_from_excel(str(path))
+
+    # Assert
+    assert [project["project_id"] for project in import_projects.call_args.args[0]] == [1, 3, 3, 4]
+    assert results["status"].tolist() == ["unchanged", "error", "error", "skipped", "updated", "created"]
+    assert results["message"][4] == {"percent_completed": (60, 40)}
+    assert results.attrs["summary"]["errors"] == 2
@@ -0,0 +1,203 @@
+import threading
+import time
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from real_estate_telegram_bot.core import delivery
+from real_estate_telegram_bot.core.delivery import FileDeliveryPipeline, shutdown_delivery_pipelines
+from real_estate_telegram_bot.core.downloads import DriveContent
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.models import ProjectFile
+
+
+class FakeDownloader:
+    """Downloader whose downloads finish once their file's gate is opened."""
+
+    def __init__(self, gated: bool = False) -> None:
+        self.gates: dict[str, threading.Event] = {}
+        self.gated = gated
+        self.acquired: list[str] = []
+        self.finished: list[str] = []
+        self.released: list[str] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, item) -> DriveContent:
+        with self._lock:
+            self.acquired.append(item["id"])
+            gate = self.gates.setdefault(item["id"], threading.Event())
+        if self.gated:
+            gate.wait(5)
+        with self._lock:
+            self.finished.append(item["id"])
+        return DriveContent(item["id"], data=item["id"].encode())
+
+    def release(self, content: DriveContent) -> None:
+        with self._lock:
+            self.released.append(content.file_id)
+
+    def finish(self, file_id: str) -> None:
+        """Let the download of `file_id` finish and wait until it did."""
+        with self._lock:
+            gate = self.gates.setdefault(file_id, threading.Event())
+        gate.set()
+        while file_id not in self.finished:
+            time.sleep(0.01)
+
+
+def drive_files(count: int) -> list[dict]:
+    return [{"id": f"file{i}", "title": f"file{i}"} for i in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def uncached(mocker):
+    mocker.patch.object(crud, "get_project_files_by_names", return_value={})
+    mocker.patch.object(crud, "upsert_project_file")
+
+
+def cache(mocker, file_names: list[str]) -> None:
+    """Make `file_names` cached in Telegram under the file id `id:<file name>`."""
+    mocker.patch.object(crud, "get_project_files_by_names", side_effect=lambda names: {
+        name: ProjectFile(file_name=name, file_telegram_id=f"id:{name}")
+        for name in names if name in file_names
+    })
+
+
+@pytest.fixture
+def bot(mocker):
+    bot = mocker.MagicMock()
+    bot.send_document.return_value.document.file_id = "uploaded"
+    return bot
+
+
+def sent_file_names(bot) -> list[str]:
+    return [call.kwargs["visible_file_name"] for call in bot.send_document.call_args_list]
+
+
+def test_files_are_sent_in_order_when_downloads_finish_out_of_order(bot):
+    # Arrange
+    pipeline = FileDeliveryPipeline(bot, drive_service=None, download_workers=3, prefetch=3)
+    pipeline.downloader = downloader = FakeDownloader(gated=True)
+    items = drive_files(3)
+
+    # Act
+    future = pipeline.submit(items, project_id=1, user_id=2)
+    while len(downloader.acquired) < 3:
+        time.sleep(0.01)
+    for file_id in ("file2", "file1", "file0"):
+        downloader.finish(file_id)
+    stats = future.result(timeout=5)
+    pipeline.shutdown()
+
+    # Assert
+    assert downloader.finished == ["file2", "file1", "file0"]
+    assert sent_file_names(bot) == ["file0.pdf", "file1.pdf", "file2.pdf"]
+    assert stats == {"cached": 0, "uploaded": 3, "failed": 0}
+
+
+def test_downloads_stay_within_the_prefetch_bound(bot):
+    # Arrange
+    pipeline = FileDeliveryPipeline(bot, drive_service=None, download_workers=4, prefetch=2)
+    pipeline.downloader = downloader = FakeDownloader()
+    items = drive_files(10)
+    ahead = []
+
+    def send_document(chat_id, stream, visible_file_name):
+        # Give the workers time to start any download the pipeline submitted
+        time.sleep(0.02)
+        ahead.append(len(downloader.acquired) - len(ahead) - 1)
+        return bot.send_document.return_value
+
+    bot.send_document.side_effect = send_document
+
+    # Act
+    stats = pipeline.deliver(items, project_id=1, user_id=2)
+    pipeline.shutdown()
+
+    # Assert
+    assert stats["uploaded"] == 10
+    assert max(ahead) == 2
+    assert sorted(downloader.released) == sorted(downloader.acquired)
+
+
+def sent_calls(bot) -> list[tuple]:
+    """List the files sent by the bot in order, an album as a tuple of file ids."""
+    calls = []
+    for name, args, kwargs in bot.mock_calls:
+        if name == "send_media_group":
+            calls.append(tuple(media.media for media in args[1]))
+        elif name == "send_document":
+            calls.append(kwargs.get("visible_file_name", args[1]))
+    return calls
+
+
+def test_cached_files_are_sent_as_albums_of_at_most_ten(mocker, bot):
+    # Arrange
+    items = drive_files(23)
+    cache(mocker, [f"file{i}.pdf" for i in range(23)])
+    pipeline = FileDeliveryPipeline(bot, drive_service=None, media_group_size=20)
+
+    # Act
+    stats = pipeline.deliver(items, project_id=1, user_id=2)
+    pipeline.shutdown()
+
+    # Assert
+    assert sent_calls(bot) == [
+        tuple(f"id:file{i}.pdf" for i in range(0, 10)),
+        tuple(f"id:file{i}.pdf" for i in range(10, 20)),
+        tuple(f"id:file{i}.pdf" for i in range(20, 23)),
+    ]
+    assert stats == {"cached": 23, "uploaded": 0, "failed": 0}
+
+
+def test_failed_album_is_sent_one_by_one(mocker, bot):
+    # Arrange
+    items = drive_files(12)
+    cache(mocker, [f"file{i}.pdf" for i in range(12)])
+    bot.send_media_group.side_effect = [
+        ApiTelegramException("sendMediaGroup", None, {"error_code": 400, "description": "wrong file id"}),
+        None,
+    ]
+    pipeline = FileDeliveryPipeline(bot, drive_service=None)
+
+    # Act
+    stats = pipeline.deliver(items, project_id=1, user_id=2)
+    pipeline.shutdown()
+
+    # Assert
+    assert sent_calls(bot) == [
+        tuple(f"id:file{i}.pdf" for i in range(0, 10)),
+        *(f"id:file{i}.pdf" for i in range(0, 10)),
+        ("id:file10.pdf", "id:file11.pdf"),
+    ]
+    assert stats == {"cached": 12, "uploaded": 0, "failed": 0}
+
+
+def test_album_is_sent_before_an_uncached_file(mocker, bot):
+    # Arrange
+    items = drive_files(4)
+    cache(mocker, ["file0.pdf", "file1.pdf", "file3.pdf"])
+    pipeline = FileDeliveryPipeline(bot, drive_service=None)
+    pipeline.downloader = FakeDownloader()
+
+    # Act
+    stats = pipeline.deliver(items, project_id=1, user_id=2)
+    pipeline.shutdown()
+
+    # Assert
+    assert sent_calls(bot) == [("id:file0.pdf", "id:file1.pdf"), "file2.pdf", "id:file3.pdf"]
+    assert stats == {"cached": 3, "uploaded": 1, "failed": 0}
+
+
+def test_shutdown_stops_every_pipeline(mocker):
+    # Arrange
+    mocker.patch.dict(delivery._pipelines, clear=True)
+    shutdown = mocker.patch.object(FileDeliveryPipeline, "shutdown")
+    delivery.get_delivery_pipeline(mocker.MagicMock(), drive_service=None)
+    delivery.get_delivery_pipeline(mocker.MagicMock(), drive_service=None)
+
+    # Act
+    shutdown_delivery_pipelines()
+
+    # Assert
+    assert shutdown.call_count == 2
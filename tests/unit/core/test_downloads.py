@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from real_estate_telegram_bot.core.downloads import DriveDownloader
+
+
+class FakeDriveFile(dict):
+    """Drive file whose content is served in the given chunks, once `ready` is set."""
+
+    def __init__(self, file_id: str, chunks: list[bytes], error: Exception = None) -> None:
+        super().__init__(id=file_id, title=f"{file_id}.pdf")
+        self.chunks = chunks
+        self.error = error
+        self.ready = threading.Event()
+        self.ready.set()
+        self.downloads = 0
+
+    def GetContentIOBuffer(self, chunksize: int):
+        self.downloads += 1
+        self.ready.wait(5)
+        yield from self.chunks
+        if self.error is not None:
+            raise self.error
+
+
+def read(content) -> bytes:
+    with content.open() as stream:
+        return stream.read()
+
+
+def test_small_files_are_kept_in_memory():
+    # Arrange
+    downloader = DriveDownloader(max_memory_bytes=100)
+    item = FakeDriveFile("a", [b"1234", b"5678"])
+
+    # Act
+    content = downloader.acquire(item)
+
+    # Assert
+    assert content.path is None
+    assert read(content) == b"12345678"
+    assert content.size == 8
+    downloader.release(content)
+
+
+def test_large_files_spill_to_disk_and_are_removed_on_release():
+    # Arrange
+    downloader = DriveDownloader(max_memory_bytes=10)
+    item = FakeDriveFile("a", [b"12345678", b"abcdefgh", b"ABCDEFGH"])
+
+    # Act
+    content = downloader.acquire(item)
+    spilled = content.path is not None and os.path.exists(content.path)
+    data = read(content)
+    downloader.release(content)
+
+    # Assert
+    assert spilled
+    assert content.data is None
+    assert data == b"12345678abcdefghABCDEFGH"
+    assert not os.path.exists(content.path)
+
+
+def test_concurrent_requests_share_one_download():
+    # Arrange
+    downloader = DriveDownloader(max_memory_bytes=10)
+    item = FakeDriveFile("a", [b"12345678", b"abcdefgh"])
+    item.ready.clear()
+
+    # Act
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(downloader.acquire, item) for _ in range(3)]
+        while downloader.deduplicated < 2:
+            time.sleep(0.01)
+        item.ready.set()
+        contents = [future.result(timeout=5) for future in futures]
+    for content in contents:
+        downloader.release(content)
+
+    # Assert
+    assert item.downloads == 1
+    assert downloader.deduplicated == 2
+    assert all(content is contents[0] for content in contents)
+    assert not os.path.exists(contents[0].path)
+
+
+def test_content_is_discarded_when_the_last_holder_releases_it():
+    # Arrange
+    downloader = DriveDownloader(max_memory_bytes=10)
+    item = FakeDriveFile("a", [b"12345678", b"abcdefgh"])
+    first = downloader.acquire(item)
+    second = downloader.acquire(item)
+
+    # Act
+    downloader.release(first)
+    still_readable = read(second)
+    downloader.release(second)
+
+    # Assert
+    assert still_readable == b"12345678abcdefgh"
+    assert not os.path.exists(second.path)
+    assert downloader._downloads == {}
+
+
+def test_released_files_are_downloaded_again():
+    # Arrange
+    downloader = DriveDownloader()
+    item = FakeDriveFile("a", [b"data"])
+    downloader.release(downloader.acquire(item))
+
+    # Act
+    content = downloader.acquire(item)
+
+    # Assert
+    assert item.downloads == 2
+    assert read(content) == b"data"
+    downloader.release(content)
+
+
+def test_failed_downloads_are_not_kept(tmp_path, mocker):
+    # Arrange
+    mocker.patch("tempfile.tempdir", str(tmp_path))
+    downloader = DriveDownloader(max_memory_bytes=10)
+    item = FakeDriveFile("a", [b"12345678", b"abcdefgh"], error=ConnectionError("reset"))
+
+    # Act
+    with pytest.raises(ConnectionError):
+        downloader.acquire(item)
+
+    # Assert
+    assert downloader._downloads == {}
+    assert list(tmp_path.iterdir()) == []
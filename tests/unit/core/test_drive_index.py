@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from real_estate_telegram_bot.core import drive_index
+from real_estate_telegram_bot.core.drive_index import FOLDER_MIME_TYPE, DriveIndex
+
+
+def drive_item(file_id: str, title: str, parent_id: str = None, mime_type: str = "application/pdf", **fields):
+    """Drive v2 file resource as returned by the API."""
+    return {
+        "id": file_id,
+        "title": title,
+        "mimeType": mime_type,
+        "parents": [{"id": parent_id}] if parent_id else [],
+        **fields,
+    }
+
+
+def folder(file_id: str, title: str):
+    return drive_item(file_id, title, mime_type=FOLDER_MIME_TYPE)
+
+
+@pytest.fixture
+def drive_service(mocker):
+    drive_service = mocker.MagicMock()
+    drive_service.drive.CreateFile.side_effect = dict
+    return drive_service
+
+
+@pytest.fixture
+def index(drive_service, tmp_path):
+    """Index of one project folder holding two files, saved with the page token `1`."""
+    files = [folder("f1", "Bay Square"), drive_item("a", "a.pdf", "f1"), drive_item("b", "b.pdf", "f1")]
+    state = {
+        "page_token": "1",
+        "updated_at": 0,
+        "files": {item["id"]: drive_index._file_metadata(item) for item in files},
+    }
+    path = tmp_path / "drive_index.json"
+    path.write_text(json.dumps(state))
+    index = DriveIndex(drive_service, str(path))
+    index.load()
+    return index
+
+
+def titles(files) -> list[str]:
+    return [item["title"] for item in files]
+
+
+def test_refresh_applies_every_page_of_the_changes_feed(mocker, drive_service, index):
+    # Arrange
+    pages = {
+        "1": {"nextPageToken": "2", "items": [
+            {"fileId": "c", "file": drive_item("c", "c.pdf", "f1")},
+            {"fileId": "a", "deleted": True},
+        ]},
+        "2": {"newStartPageToken": "3", "items": [
+            {"fileId": "b", "file": drive_item("b", "b.pdf", "f1", labels={"trashed": True})},
+            {"fileId": "f2", "file": folder("f2", "Marina Gate")},
+            {"fileId": "d", "file": drive_item("d", "d.pdf", "f2")},
+        ]},
+    }
+    changes = drive_service.gauth.service.changes.return_value
+    changes.list.side_effect = lambda pageToken, **kwargs: mocker.Mock(execute=lambda: pages[pageToken])
+
+    # Act
+    applied = index.refresh()
+
+    # Assert
+    assert applied == 5
+    assert index.page_token == "3"
+    assert titles(index.list_files("Bay Square")) == ["c.pdf"]
+    assert titles(index.list_files("Marina Gate")) == ["d.pdf"]
+    with open(index.path, encoding="utf-8") as f:
+        assert json.load(f)["page_token"] == "3"
+    drive_service.drive.ListFile.assert_not_called()
+
+
+def test_unknown_folder_is_listed_live(drive_service, index):
+    # Arrange
+    drive_service.get_folder_id.return_value = "f3"
+    drive_service.list_files_in_folder.return_value = [drive_item("e", "e.pdf", "f3")]
+
+    # Act
+    files = index.list_files(" Azure ")
+
+    # Assert
+    assert titles(files) == ["e.pdf"]
+    drive_service.get_folder_id.assert_called_once_with("Azure")
+    drive_service.list_files_in_folder.assert_called_once_with("f3")
+
+
+def test_unknown_folder_is_not_listed_live_without_fallback(drive_service, index):
+    # Act
+    files = index.list_files("Azure", live_fallback=False)
+
+    # Assert
+    assert files == []
+    drive_service.get_folder_id.assert_not_called()
+
+
+def test_missing_index_is_not_built_in_a_request(mocker, drive_service, tmp_path):
+    # Arrange
+    mocker.patch.object(drive_index, "_drive_index", None)
+    mocker.patch.object(drive_index.config.drive_index, "path", str(tmp_path / "missing.json"))
+    build = mocker.patch.object(DriveIndex, "build")
+    drive_service.get_folder_id.return_value = "f1"
+    drive_service.list_files_in_folder.return_value = [drive_item("a", "a.pdf", "f1")]
+
+    # Act
+    files = drive_index.query_files_from_folder("Bay Square", drive_service)
+
+    # Assert
+    assert titles(files) == ["a.pdf"]
+    assert not drive_index.get_drive_index().ready
+    build.assert_not_called()
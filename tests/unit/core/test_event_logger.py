@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from real_estate_telegram_bot.core.event_logger import EventLogger
+from real_estate_telegram_bot.db import crud
+
+
+@pytest.fixture
+def batches(mocker):
+    """Batches passed to the stubbed `crud.create_events`."""
+    batches = []
+
+    def create_events(events):
+        batches.append([event["content"] for event in events])
+        return len(events)
+
+    mocker.patch.object(crud, "create_events", side_effect=create_events)
+    return batches
+
+
+def test_drop_policy_drops_events_when_the_queue_is_full(batches):
+    # Arrange
+    event_logger = EventLogger(max_queue_size=2, overflow_policy="drop")
+
+    # Act
+    for i in range(3):
+        event_logger.log(user_id=1, content=str(i), type="message")
+
+    # Assert
+    assert event_logger.stats() == {"queued": 2, "written": 0, "dropped": 1}
+
+
+def test_block_policy_drops_events_after_the_timeout(batches):
+    # Arrange
+    event_logger = EventLogger(max_queue_size=1, overflow_policy="block", block_timeout_ms=100)
+    event_logger.log(user_id=1, content="0", type="message")
+
+    # Act
+    started = time.monotonic()
+    event_logger.log(user_id=1, content="1", type="message")
+    elapsed = time.monotonic() - started
+
+    # Assert
+    assert elapsed >= 0.1
+    assert event_logger.dropped == 1
+
+
+def test_block_policy_waits_for_room_in_the_queue(batches):
+    # Arrange
+    event_logger = EventLogger(max_queue_size=1, overflow_policy="block", block_timeout_ms=5000)
+    event_logger.log(user_id=1, content="0", type="message")
+    threading.Timer(0.05, event_logger.queue.get).start()
+
+    # Act
+    event_logger.log(user_id=1, content="1", type="message")
+
+    # Assert
+    assert event_logger.stats() == {"queued": 1, "written": 0, "dropped": 0}
+
+
+def test_queued_events_are_written_on_stop(batches):
+    # Arrange
+    event_logger = EventLogger(batch_size=2, flush_interval_ms=50)
+    for i in range(5):
+        event_logger.log(user_id=1, content=str(i), type="message")
+
+    # Act
+    event_logger.start()
+    event_logger.stop()
+
+    # Assert
+    assert [content for batch in batches for content in batch] == ["0", "1", "2", "3", "4"]
+    assert all(len(batch) <= 2 for batch in batches)
+    assert event_logger.stats() == {"queued": 0, "written": 5, "dropped": 0}
+
+
+def test_failed_batches_are_not_retried_with_delays_on_stop(mocker):
+    # Arrange
+    create_events = mocker.patch.object(crud, "create_events", side_effect=ConnectionError("database is down"))
+    event_logger = EventLogger(batch_size=10, flush_interval_ms=50, max_retries=3)
+    for i in range(3):
+        event_logger.log(user_id=1, content=str(i), type="message")
+    event_logger._stop_event.set()
+
+    # Act
+    started = time.monotonic()
+    event_logger._run()
+    elapsed = time.monotonic() - started
+
+    # Assert
+    assert elapsed < 1
+    assert create_events.call_count == 3
+    assert event_logger.dropped == 3
@@ -0,0 +1,103 @@
+import pytest
+
+from real_estate_telegram_bot.core import ratelimit
+from real_estate_telegram_bot.core.ratelimit import TokenBucketLimiter
+
+
+@pytest.fixture
+def clock(mocker):
+    """Replace the monotonic clock of the limiter by one set by the test, starting at 0."""
+    clock = mocker.patch.object(ratelimit, "time")
+    clock.monotonic.return_value = 0.0
+    return clock
+
+
+def test_burst_then_refill(clock):
+    # Arrange
+    limiter = TokenBucketLimiter(rate=2, capacity=3)
+
+    # Act
+    burst = [limiter.allow("user") for _ in range(4)]
+    clock.monotonic.return_value = 0.25
+    too_early = limiter.allow("user")
+    clock.monotonic.return_value = 0.5
+    refilled = [limiter.allow("user") for _ in range(2)]
+
+    # Assert
+    assert burst == [True, True, True, False]
+    assert not too_early
+    assert refilled == [True, False]
+
+
+def test_refill_is_capped_at_capacity(clock):
+    # Arrange
+    limiter = TokenBucketLimiter(rate=1, capacity=2, max_keys=10)
+    limiter.allow("user")
+    limiter.allow("user")
+
+    # Act
+    clock.monotonic.return_value = 1.5
+    allowed = [limiter.allow("user") for _ in range(3)]
+
+    # Assert
+    assert allowed == [True, False, False]
+
+
+def test_wait_time_until_enough_tokens(clock):
+    # Arrange
+    limiter = TokenBucketLimiter(rate=4, capacity=1)
+    limiter.allow("user")
+
+    # Act
+    check = limiter.wait_time("user", consume=False)
+    clock.monotonic.return_value = 0.25
+    consumed = limiter.wait_time("user")
+    after = limiter.wait_time("user", consume=False)
+
+    # Assert
+    assert check == pytest.approx(0.25)
+    assert consumed == 0
+    assert after == pytest.approx(0.25)
+
+
+def test_keys_have_separate_buckets(clock):
+    # Arrange
+    limiter = TokenBucketLimiter(rate=1, capacity=1)
+
+    # Act
+    first = [limiter.allow(1), limiter.allow(1)]
+    second = limiter.allow(2)
+
+    # Assert
+    assert first == [True, False]
+    assert second
+
+
+def test_least_recently_used_buckets_are_evicted(clock):
+    # Arrange
+    limiter = TokenBucketLimiter(rate=1, capacity=1, max_keys=2)
+    limiter.allow("a")
+    limiter.allow("b")
+    limiter.allow("a")
+
+    # Act
+    limiter.allow("c")
+
+    # Assert
+    assert len(limiter) == 2
+    assert list(limiter._buckets) == ["a", "c"]
+
+
+def test_full_buckets_are_evicted(clock):
+    # Arrange
+    limiter = TokenBucketLimiter(rate=1, capacity=2)
+    limiter.allow("a")
+    clock.monotonic.return_value = 1.0
+    limiter.allow("b")
+
+    # Act
+    clock.monotonic.return_value = 2.5
+    limiter.allow("c")
+
+    # Assert
+    assert list(limiter._buckets) == ["b", "c"]
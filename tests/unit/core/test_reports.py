@@ -0,0 +1,104 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from real_estate_telegram_bot.core.reports import ReportCache
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.models import ReportFile
+
+
+@pytest.fixture
+def bot(mocker):
+    bot = mocker.MagicMock()
+    bot.send_document.return_value.document.file_id = "uploaded"
+    return bot
+
+
+@pytest.fixture
+def report_file(tmp_path):
+    def build(area):
+        filepath = tmp_path / f"{area}.xlsx"
+        filepath.write_bytes(b"report")
+        return str(filepath)
+    return build
+
+
+def test_report_is_stored_with_the_version_it_was_built_from(mocker, bot, report_file):
+    # Arrange
+    mocker.patch.object(crud, "read_data_version", return_value=3)
+    mocker.patch.object(crud, "read_report_file", return_value=None)
+    upsert_report_file = mocker.patch.object(crud, "upsert_report_file")
+    cache = ReportCache(versions={"service_charges": lambda: 2})
+
+    # Act
+    sent = cache.send(bot, 1, "service_charge", "Business Bay", "service_charges", report_file)
+
+    # Assert
+    assert sent
+    upsert_report_file.assert_called_once_with("service_charge", "business bay", "service_charges", 2, "uploaded")
+
+
+def test_report_is_built_for_the_normalized_area(mocker, bot, report_file):
+    # Arrange
+    mocker.patch.object(crud, "read_data_version", return_value=1)
+    mocker.patch.object(crud, "read_report_file", return_value=None)
+    mocker.patch.object(crud, "upsert_report_file")
+    build = mocker.MagicMock(side_effect=report_file)
+    cache = ReportCache()
+
+    # Act
+    cache.send(bot, 1, "service_charge", "  BUSINESS   bay ", "service_charges", build)
+
+    # Assert
+    build.assert_called_once_with("business bay")
+
+
+def test_cached_upload_of_the_current_version_is_sent_again(mocker, bot):
+    # Arrange
+    mocker.patch.object(crud, "read_data_version", return_value=5)
+    mocker.patch.object(crud, "read_report_file", return_value=ReportFile(
+        report_type="service_charge", area="business bay", dataset="service_charges", data_version=2,
+        file_telegram_id="cached", created_at=datetime.now(timezone.utc),
+    ))
+    build = mocker.MagicMock()
+    cache = ReportCache(versions={"service_charges": lambda: 2})
+
+    # Act
+    sent = cache.send(bot, 1, "service_charge", "Business Bay", "service_charges", build)
+
+    # Assert
+    assert sent
+    build.assert_not_called()
+    bot.send_document.assert_called_once_with(1, "cached")
+
+
+def test_upload_of_an_older_version_is_regenerated(mocker, bot, report_file):
+    # Arrange
+    mocker.patch.object(crud, "read_report_file", return_value=ReportFile(
+        report_type="service_charge", area="business bay", dataset="service_charges", data_version=1,
+        file_telegram_id="cached", created_at=datetime.now(timezone.utc),
+    ))
+    upsert_report_file = mocker.patch.object(crud, "upsert_report_file")
+    cache = ReportCache(versions={"service_charges": lambda: 2})
+
+    # Act
+    cache.send(bot, 1, "service_charge", "Business Bay", "service_charges", report_file)
+
+    # Assert
+    assert bot.send_document.call_args.args[1] != "cached"
+    upsert_report_file.assert_called_once_with("service_charge", "business bay", "service_charges", 2, "uploaded")
+
+
+def test_report_is_not_cached_without_a_version(mocker, bot, report_file):
+    # Arrange
+    read_report_file = mocker.patch.object(crud, "read_report_file")
+    upsert_report_file = mocker.patch.object(crud, "upsert_report_file")
+    cache = ReportCache(versions={"service_charges": lambda: None})
+
+    # Act
+    sent = cache.send(bot, 1, "service_charge", "Business Bay", "service_charges", report_file)
+
+    # Assert
+    assert sent
+    read_report_file.assert_not_called()
+    upsert_report_file.assert_not_called()
@@ -0,0 +1,132 @@
+import pytest
+
+from real_estate_telegram_bot.core.search import ProjectSearchIndex, substring_trigrams, word_trigrams
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.models import Project
+
+
+def similarity(a: str, b: str) -> float:
+    a_trigrams, b_trigrams = word_trigrams(a), word_trigrams(b)
+    return len(a_trigrams & b_trigrams) / len(a_trigrams | b_trigrams)
+
+
+def create_index(names: list[str]) -> ProjectSearchIndex:
+    index = ProjectSearchIndex()
+    index.rebuild([
+        Project(project_id=project_id, project_name_id_buildings=name)
+        for project_id, name in enumerate(names, start=1)
+    ])
+    return index
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Examples of `show_trgm` from the pg_trgm documentation
+    ("cat", {"  c", " ca", "cat", "at "}),
+    ("word", {"  w", " wo", "wor", "ord", "rd "}),
+    ("two words", {"  t", " tw", "two", "wo ", "  w", " wo", "wor", "ord", "rds", "ds "}),
+    # Words are lowercased and split on any non alphanumeric character
+    ("Al-Safa", {"  a", " al", "al ", "  s", " sa", "saf", "afa", "fa "}),
+    ("A_B", {"  a", " a ", "  b", " b "}),
+    ("", set()),
+    ("--", set()),
+])
+def test_word_trigrams_match_pg_trgm(text, expected):
+    # Act
+    trigrams = word_trigrams(text)
+
+    # Assert
+    assert trigrams == expected
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    # similarity('word', 'two words') from the pg_trgm documentation
+    ("word", "two words", 0.36363637),
+    ("Business Bay", "business bay", 1.0),
+    ("Business Bay", "BUSINESS-BAY!", 1.0),
+    ("abc", "xyz", 0.0),
+    ("Marina Gate", "Marina Heights", 0.35),
+])
+def test_similarity_matches_pg_trgm(a, b, expected):
+    # Act
+    score = similarity(a, b)
+
+    # Assert
+    assert score == pytest.approx(expected, abs=1e-6)
+
+
+def test_similar_ranks_by_similarity_and_applies_threshold():
+    # Arrange
+    index = create_index(["two words", "word", "unrelated"])
+
+    # Act
+    above = index.similar("word", similarity_threshold=0.36)
+    below = index.similar("word", similarity_threshold=0.37)
+
+    # Assert
+    assert [project.project_name_id_buildings for project in above] == ["word", "two words"]
+    assert [project.project_name_id_buildings for project in below] == ["word"]
+
+
+def test_similar_keeps_top_k_best_matches():
+    # Arrange
+    index = create_index(["Marina Gate", "Marina Heights", "Marina Gate 2", "Creek Rise"])
+
+    # Act
+    projects = index.similar("marina gate", similarity_threshold=0.1, top_k=2)
+
+    # Assert
+    assert [project.project_name_id_buildings for project in projects] == ["Marina Gate", "Marina Gate 2"]
+
+
+def test_ilike_matches_substrings_ignoring_case():
+    # Arrange
+    index = create_index(["Business Bay Tower", "Bay Square", "Creek Rise", "Al Safa"])
+
+    # Act
+    bay = index.ilike("BAY")
+    short = index.ilike("a")
+
+    # Assert
+    assert [project.project_name_id_buildings for project in bay] == ["Business Bay Tower", "Bay Square"]
+    assert [project.project_name_id_buildings for project in short] == ["Business Bay Tower", "Bay Square", "Al Safa"]
+    assert substring_trigrams("ab") == set()
+
+
+def test_index_is_rebuilt_after_an_import_by_another_process(mocker):
+    # Arrange
+    read_data_version = mocker.patch.object(crud, "read_data_version", return_value=1)
+    mocker.patch.object(crud, "read_projects", side_effect=[
+        [Project(project_id=1, project_name_id_buildings="Bay Square")],
+        [Project(project_id=1, project_name_id_buildings="Bay Square"),
+         Project(project_id=2, project_name_id_buildings="Bay Gate")],
+    ])
+    index = ProjectSearchIndex(version_check_interval_seconds=0)
+    before = index.ilike("bay")
+
+    # Act
+    read_data_version.return_value = 2
+    after = index.ilike("bay")
+
+    # Assert
+    assert [project.project_id for project in before] == [1]
+    assert [project.project_id for project in after] == [1, 2]
+    assert index.data_version == 2
+
+
+def test_index_version_is_checked_at_most_once_per_interval(mocker):
+    # Arrange
+    read_data_version = mocker.patch.object(crud, "read_data_version", return_value=1)
+    mocker.patch.object(crud, "read_projects", return_value=[Project(project_id=1, project_name_id_buildings="Azure")])
+    index = ProjectSearchIndex(version_check_interval_seconds=60)
+    index.get_by_name("Azure")
+
+    # Act
+    read_data_version.return_value = 2
+    index.get_by_name("Azure")
+    reads_before_sync = crud.read_projects.call_count
+    version = index.sync()
+
+    # Assert
+    assert reads_before_sync == 1
+    assert version == 2
+    assert crud.read_projects.call_count == 2
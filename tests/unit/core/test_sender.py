@@ -0,0 +1,120 @@
+import time
+
+import pytest
+import requests
+from telebot.apihelper import ApiTelegramException
+
+from real_estate_telegram_bot.core.sender import SendQueue
+
+
+def telegram_error(error_code: int, **parameters) -> ApiTelegramException:
+    result_json = {"ok": False, "error_code": error_code, "description": "error"}
+    if parameters:
+        result_json["parameters"] = parameters
+    return ApiTelegramException("sendMessage", None, result_json)
+
+
+@pytest.fixture
+def send_queue():
+    send_queue = SendQueue(messages_per_second=1000, chat_messages_per_second=1000, workers=2, max_retries=3)
+    yield send_queue
+    send_queue.stop()
+
+
+def test_rate_limited_message_is_sent_again_after_retry_after(mocker, send_queue):
+    # Arrange
+    calls = []
+
+    def send_message(chat_id, text):
+        calls.append((chat_id, time.monotonic()))
+        if len(calls) == 1:
+            raise telegram_error(429, retry_after=0.3)
+        return text
+
+    method = mocker.MagicMock(side_effect=send_message)
+
+    # Act
+    result = send_queue.submit(1, method, "hello").result(timeout=5)
+
+    # Assert
+    assert result == "hello"
+    assert method.call_count == 2
+    assert calls[1][1] - calls[0][1] >= 0.3
+    assert send_queue.rate_limited == 1
+    assert send_queue.failed == 0
+    assert send_queue.sent == 1
+
+
+def test_rate_limit_pauses_every_chat(mocker, send_queue):
+    # Arrange
+    calls = []
+
+    def send_message(chat_id, text):
+        calls.append((chat_id, time.monotonic()))
+        if chat_id == 1 and len(calls) == 1:
+            raise telegram_error(429, retry_after=0.3)
+        return text
+
+    method = mocker.MagicMock(side_effect=send_message)
+    first = send_queue.submit(1, method, "first")
+    while not send_queue.rate_limited:
+        time.sleep(0.01)
+
+    # Act
+    second = send_queue.submit(2, method, "second")
+    results = [first.result(timeout=5), second.result(timeout=5)]
+
+    # Assert
+    assert results == ["first", "second"]
+    paused_at = calls[0][1]
+    assert all(called_at - paused_at >= 0.3 for _, called_at in calls[1:])
+
+
+def test_rate_limits_do_not_count_as_attempts(mocker, send_queue):
+    # Arrange
+    method = mocker.MagicMock(side_effect=[
+        telegram_error(429, retry_after=0.05),
+        telegram_error(429, retry_after=0.05),
+        telegram_error(429, retry_after=0.05),
+        "sent",
+    ])
+
+    # Act
+    result = send_queue.submit(1, method).result(timeout=5)
+
+    # Assert
+    assert result == "sent"
+    assert send_queue.rate_limited == 3
+    assert send_queue.retried == 0
+
+
+def test_transient_errors_are_retried_up_to_max_retries(mocker):
+    # Arrange
+    send_queue = SendQueue(max_retries=2)
+    error = requests.ConnectionError("connection reset")
+    method = mocker.MagicMock(side_effect=[error, error])
+
+    # Act
+    future = send_queue.submit(1, method)
+    with pytest.raises(requests.ConnectionError):
+        future.result(timeout=5)
+    send_queue.stop()
+
+    # Assert
+    assert method.call_count == 2
+    assert send_queue.retried == 1
+    assert send_queue.failed == 1
+
+
+def test_client_errors_are_not_retried(mocker, send_queue):
+    # Arrange
+    method = mocker.MagicMock(side_effect=telegram_error(403))
+
+    # Act
+    future = send_queue.submit(1, method)
+
+    # Assert
+    with pytest.raises(ApiTelegramException):
+        future.result(timeout=5)
+    assert method.call_count == 1
+    assert send_queue.failed == 1
@@ -0,0 +1,161 @@
+import pandas as pd
+import pytest
+
+from real_estate_telegram_bot.core.service_charges import ServiceChargePivot, ilike_regex
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.crud import pivot_service_charges
+
+# (master_project_en, project_name, property_group_name_en, budget_year, service_charge)
+ROWS = [
+    ("Business Bay", "Bay Square", "Residential", 2023, 15.5),
+    ("Business Bay", "Bay Square", "Residential", 2021, 14.0),
+    ("Business Bay", "Bay Square", "Office", 2022, 18.25),
+    ("Business Bay", "Executive Towers", "Residential", 2022, 16.0),
+    ("Marina Bay", "Azure", "Residential", 2021, 12.0),
+    ("Marina Bay", "Azure", "Retail", 2024, 30.0),
+    ("Dubai Marina", "Marina Gate", "Residential", 2023, 22.0),
+    ("Dubai Marina", None, "Residential", 2023, 9.0),
+    (None, "Orphan", "Residential", 2023, 1.0),
+]
+
+
+def database_pivot(rows: list[tuple], area_name: str) -> pd.DataFrame:
+    """Pivot the rows the way `crud.get_area_service_charge_by_year` does with its ILIKE query."""
+    matches = sorted(
+        (row for row in rows if row[0] is not None and area_name.lower() in row[0].lower()),
+        key=lambda row: (row[1] is None, row[1] or "", row[3]),
+    )
+    return pivot_service_charges(row[1:] for row in matches)
+
+
+@pytest.mark.parametrize("pattern, text, matches", [
+    ("Business Bay", "business bay", True),
+    ("Business%", "Business Bay", True),
+    ("%Bay", "Business Bay", True),
+    ("B_y", "Bay", True),
+    ("B_y", "By", False),
+    ("%", "", True),
+    ("Bay", "Business Bay", False),
+    ("a.c", "abc", False),
+    ("(1)", "(1)", True),
+    ("100\\%", "100%", True),
+    ("100\\%", "1000", False),
+    ("a\\_b", "a_b", True),
+    ("a\\_b", "axb", False),
+    ("Line%break", "Line\nbreak", True),
+])
+def test_ilike_regex_has_like_semantics(pattern, text, matches):
+    # Act
+    result = ilike_regex(pattern).fullmatch(text) is not None
+
+    # Assert
+    assert result == matches
+
+
+@pytest.mark.parametrize("area_name", ["Business Bay", "bay", "marina", "BUSINESS", "Bay Sq", "Nowhere"])
+def test_pivot_matches_the_database_pivot(area_name):
+    # Arrange
+    pivot = ServiceChargePivot()
+    pivot.rebuild(list(ROWS))
+
+    # Act
+    df = pivot.get_by_area(area_name)
+
+    # Assert
+    pd.testing.assert_frame_equal(df, database_pivot(ROWS, area_name))
+
+
+def test_pivot_lists_years_in_order():
+    # Arrange
+    pivot = ServiceChargePivot()
+    pivot.rebuild(list(ROWS))
+
+    # Act
+    df = pivot.get_by_area("Business Bay")
+
+    # Assert
+    assert list(df.columns) == ["project_name", "property_group_name_en", 2021, 2022, 2023]
+    assert df.to_dict("records")[0] == {
+        "project_name": "Bay Square", "property_group_name_en": "Residential", 2021: 14.0, 2022: "", 2023: 15.5,
+    }
+
+
+def test_searches_spanning_several_master_projects_are_cached():
+    # Arrange
+    pivot = ServiceChargePivot()
+    pivot.rebuild(list(ROWS))
+
+    # Act
+    first = pivot.get_by_area("bay")
+    second = pivot.get_by_area("BAY")
+
+    # Assert
+    assert pivot.master_projects("bay") == ["Marina Bay", "Business Bay"]
+    assert second is first
+
+
+def test_rebuild_replaces_the_pivot():
+    # Arrange
+    pivot = ServiceChargePivot()
+    pivot.rebuild(list(ROWS))
+
+    # Act
+    count = pivot.rebuild([("Jumeirah", "Palm View", "Residential", 2024, 20.0)])
+
+    # Assert
+    assert count == 1
+    assert pivot.get_by_area("bay").empty
+    assert pivot.get_by_area("jumeirah")["project_name"].tolist() == ["Palm View"]
+
+
+def test_pivot_is_rebuilt_after_an_import_by_another_process(mocker):
+    # Arrange
+    read_data_version = mocker.patch.object(crud, "read_data_version", return_value=1)
+    mocker.patch.object(crud, "read_service_charge_rows", side_effect=[list(ROWS), [
+        ("Business Bay", "Bay Square", "Residential", 2025, 17.0),
+    ]])
+    pivot = ServiceChargePivot(version_check_interval_seconds=0)
+    before = pivot.get_by_area("Business Bay")
+
+    # Act
+    unchanged = pivot.get_by_area("Business Bay")
+    read_data_version.return_value = 2
+    after = pivot.get_by_area("Business Bay")
+
+    # Assert
+    assert unchanged is before
+    assert list(after.columns) == ["project_name", "property_group_name_en", 2025]
+    assert pivot.data_version == 2
+    assert crud.read_service_charge_rows.call_count == 2
+
+
+def test_version_is_checked_at_most_once_per_interval(mocker):
+    # Arrange
+    read_data_version = mocker.patch.object(crud, "read_data_version", return_value=1)
+    mocker.patch.object(crud, "read_service_charge_rows", return_value=list(ROWS))
+    pivot = ServiceChargePivot(version_check_interval_seconds=60)
+    pivot.get_by_area("bay")
+
+    # Act
+    read_data_version.return_value = 2
+    stale = pivot.get_by_area("bay")
+    version = pivot.sync()
+
+    # Assert
+    assert not stale.empty
+    assert version == 2
+    assert crud.read_service_charge_rows.call_count == 2
+
+
+def test_pivot_of_given_rows_is_not_checked(mocker):
+    # Arrange
+    read_data_version = mocker.patch.object(crud, "read_data_version")
+    pivot = ServiceChargePivot(version_check_interval_seconds=0)
+    pivot.rebuild(list(ROWS))
+
+    # Act
+    pivot.get_by_area("bay")
+
+    # Assert
+    read_data_version.assert_not_called()
+    assert pivot.data_version is None
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.database import session_scope
+from real_estate_telegram_bot.db.models import User
+
+# (id, lang, role, days since the last message)
+USERS = [
+    (1, "en", "user", 0),
+    (2, "ru", "user", 3),
+    (3, "en", "admin", 10),
+    (4, "en", "user", 1),
+    (5, "ru", "admin", 40),
+    (6, "en", "user", 5),
+    (7, "ru", "user", 0),
+]
+
+
+@pytest.fixture
+def users(db):
+    for user_id, lang, role, days in USERS:
+        crud.create_user(id=user_id, lang=lang, role=role)
+        with session_scope() as session:
+            session.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(last_message_timestamp=datetime.now() - timedelta(days=days, minutes=1))
+            )
+
+
+def pages(**kwargs) -> list[list[tuple]]:
+    return [[tuple(row) for row in batch] for batch in crud.iter_recipients(**kwargs)]
+
+
+def test_recipients_are_paginated_in_id_order(users):
+    # Act
+    result = pages(batch_size=3)
+
+    # Assert
+    assert result == [
+        [(1, "en"), (2, "ru"), (3, "en")],
+        [(4, "en"), (5, "ru"), (6, "en")],
+        [(7, "ru")],
+    ]
+
+
+def test_pagination_ends_on_a_full_last_page(users):
+    # Act
+    result = pages(batch_size=2, after_id=3)
+
+    # Assert
+    assert result == [[(4, "en"), (5, "ru")], [(6, "en"), (7, "ru")]]
+
+
+def test_pagination_resumes_after_the_cursor(users):
+    # Act
+    result = pages(batch_size=10, after_id=5)
+
+    # Assert
+    assert result == [[(6, "en"), (7, "ru")]]
+    assert crud.count_recipients(after_id=5) == 2
+
+
+@pytest.mark.parametrize("audience, expected", [
+    ({"lang": "en"}, [[1, 3], [4, 6]]),
+    ({"role": "admin"}, [[3, 5]]),
+    ({"active_days": 4}, [[1, 2], [4, 7]]),
+    ({"lang": "en", "role": "user", "active_days": 7}, [[1, 4], [6]]),
+    ({"lang": "de"}, []),
+])
+def test_audience_filters(users, audience, expected):
+    # Act
+    result = [[user_id for user_id, _ in batch] for batch in pages(batch_size=2, **audience)]
+
+    # Assert
+    assert result == expected
+    assert crud.count_recipients(**audience) == sum(len(batch) for batch in expected)
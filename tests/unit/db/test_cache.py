@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytest
+
+from real_estate_telegram_bot.db import cache
+from real_estate_telegram_bot.db.cache import UserCache
+from real_estate_telegram_bot.db.crud import users as users_crud
+from real_estate_telegram_bot.db.models import User
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = mocker.patch.object(cache, "time").monotonic
+    clock.return_value = 0.0
+    return clock
+
+
+def user(user_id: int, username: str = "user") -> User:
+    return User(id=user_id, username=username, lang="en", role="user")
+
+
+def test_entries_expire_after_the_ttl(clock):
+    # Arrange
+    user_cache = UserCache(ttl_seconds=300)
+    user_cache.put(user(1))
+
+    # Act
+    clock.return_value = 300.0
+    fresh = user_cache.get(1)
+    clock.return_value = 300.1
+    expired = user_cache.get(1)
+
+    # Assert
+    assert fresh is not None
+    assert expired is None
+    assert user_cache.stats() == {"size": 0, "hits": 1, "misses": 1, "pending": 0}
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    # Arrange
+    user_cache = UserCache(max_size=2)
+    user_cache.put(user(1))
+    user_cache.put(user(2))
+    user_cache.get(1)
+
+    # Act
+    user_cache.put(user(3))
+
+    # Assert
+    assert user_cache.get(2) is None
+    assert user_cache.get(1) is not None
+    assert user_cache.get(3) is not None
+
+
+def test_users_are_copied_in_and_out(clock):
+    # Arrange
+    user_cache = UserCache()
+    original = user(1, "alice")
+    user_cache.put(original)
+
+    # Act
+    original.username = "changed after put"
+    first = user_cache.get(1)
+    first.username = "changed after get"
+    second = user_cache.get(1)
+
+    # Assert
+    assert second is not first
+    assert second.username == "alice"
+
+
+def test_touches_within_the_interval_are_coalesced(clock):
+    # Arrange
+    user_cache = UserCache(touch_interval_seconds=60)
+    user_cache.put(user(1))
+    first, second, third = datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 10, 1), datetime(2024, 1, 1, 10, 2)
+
+    # Act
+    clock.return_value = 10.0
+    coalesced = [user_cache.touch(1, first)]
+    clock.return_value = 20.0
+    coalesced.append(user_cache.touch(1, second))
+    pending = user_cache.pop_pending()
+    clock.return_value = 60.0
+    written = user_cache.touch(1, third)
+
+    # Assert
+    assert coalesced == [None, None]
+    assert pending == {1: second}
+    assert written == third
+    assert user_cache.pop_pending() == {}
+    assert user_cache.get(1).last_message_timestamp == third
+
+
+def test_flush_writes_the_pending_timestamps(mocker, clock):
+    # Arrange
+    user_cache = mocker.patch.object(users_crud, "user_cache", UserCache(touch_interval_seconds=60))
+    session_scope = mocker.patch.object(users_crud, "session_scope")
+    execute = session_scope.return_value.__enter__.return_value.connection.return_value.execute
+    user_cache.put(user(1))
+    user_cache.put(user(2))
+    user_cache.touch(1, datetime(2024, 1, 1, 10))
+    user_cache.touch(2, datetime(2024, 1, 1, 11))
+
+    # Act
+    flushed = users_crud.flush_user_activity()
+    flushed_again = users_crud.flush_user_activity()
+
+    # Assert
+    assert flushed == 2
+    assert flushed_again == 0
+    session_scope.assert_called_once()
+    assert execute.call_args.args[1] == [
+        {"user_id": 1, "timestamp": datetime(2024, 1, 1, 10)},
+        {"user_id": 2, "timestamp": datetime(2024, 1, 1, 11)},
+    ]
@@ -0,0 +1,45 @@
+from real_estate_telegram_bot.db import crud
+
+
+def project(project_id: int, name: str, **values) -> dict:
+    return {"project_id": project_id, "project_name": name, **values}
+
+
+def test_import_classifies_every_row(db):
+    # Arrange
+    crud.import_projects([project(1, "Azure"), project(2, "Bay Square", floors=20)])
+
+    # Act
+    results = crud.import_projects([
+        project(1, "Azure"),
+        project(2, "Bay Square", floors=25),
+        project(3, "Marina Gate", floors=40),
+        project(3, "Marina Gate", floors=45),
+    ])
+
+    # Assert
+    assert [(result["project_id"], result["status"]) for result in results] == [
+        (1, "unchanged"), (2, "updated"), (3, "skipped"), (3, "created"),
+    ]
+    assert results[1]["changes"] == {"floors": (25, 20)}
+
+
+def test_import_applies_the_last_row_of_each_project(db):
+    # Act
+    crud.import_projects([project(1, "Azure", floors=10), project(1, "Azure Residences", floors=12)])
+
+    # Assert
+    stored = crud.read_project(1)
+    assert (stored.project_name, stored.floors) == ("Azure Residences", 12)
+
+
+def test_import_keeps_projects_missing_from_the_file(db):
+    # Arrange
+    crud.import_projects([project(1, "Azure"), project(2, "Bay Square")])
+
+    # Act
+    results = crud.import_projects([project(2, "Bay Square")])
+
+    # Assert
+    assert [result["status"] for result in results] == ["unchanged"]
+    assert crud.read_project_ids() == {1, 2}
@@ -0,0 +1,116 @@
+import openpyxl
+import pytest
+
+from real_estate_telegram_bot.core import db as core_db
+from real_estate_telegram_bot.db import crud
+from real_estate_telegram_bot.db.database import session_scope
+from real_estate_telegram_bot.db.models import ProjectServiceCharge
+
+
+@pytest.fixture
+def projects(db):
+    crud.import_projects([{"project_id": 1, "project_name": "Azure"}, {"project_id": 2, "project_name": "Bay Square"}])
+
+
+def service_charge(project_id: int, group: str, year: int, charge: int, usage: str = None) -> dict:
+    return {
+        "project_id": project_id,
+        "property_group_name_en": group,
+        "usage_name_en": usage,
+        "budget_year": year,
+        "service_charge": charge,
+    }
+
+
+def key(project_id: int, group: str, year: int) -> tuple:
+    return project_id, group, "", year
+
+
+def stored_charges() -> dict[tuple, int]:
+    with session_scope() as db:
+        rows = db.query(ProjectServiceCharge).all()
+    return {crud.service_charge_key(row.as_dict()): row.service_charge for row in rows}
+
+
+def test_last_row_of_a_key_wins_across_batches(projects):
+    # Act
+    statuses = crud.import_service_charges([
+        service_charge(1, "Residential", 2023, 10),
+        service_charge(1, "Office", 2023, 20),
+        service_charge(1, "Residential", 2023, 11),
+        service_charge(1, "Residential", 2023, 12),
+        service_charge(2, "Residential", 2023, 30),
+    ], batch_size=2)
+
+    # Assert
+    assert statuses == {
+        key(1, "Residential", 2023): "created",
+        key(1, "Office", 2023): "created",
+        key(2, "Residential", 2023): "created",
+    }
+    assert stored_charges() == {
+        key(1, "Residential", 2023): 12,
+        key(1, "Office", 2023): 20,
+        key(2, "Residential", 2023): 30,
+    }
+
+
+def test_statuses_of_a_reimport_across_batches(projects):
+    # Arrange
+    crud.import_service_charges([
+        service_charge(1, "Residential", 2023, 10),
+        service_charge(1, "Office", 2023, 20),
+    ])
+
+    # Act
+    statuses = crud.import_service_charges([
+        service_charge(1, "Residential", 2023, 10),
+        service_charge(1, "Office", 2023, 25),
+        service_charge(2, "Residential", 2024, 30),
+        service_charge(1, "Office", 2023, 20),
+    ], batch_size=1)
+
+    # Assert
+    assert statuses == {
+        key(1, "Office", 2023): "updated",
+        key(2, "Residential", 2024): "created",
+    }
+    assert stored_charges()[key(1, "Office", 2023)] == 20
+
+
+def test_missing_usage_matches_an_empty_one(projects):
+    # Arrange
+    crud.import_service_charges([service_charge(1, "Residential", 2023, 10)])
+
+    # Act
+    statuses = crud.import_service_charges([service_charge(1, "Residential", 2023, 11, usage="")])
+
+    # Assert
+    assert statuses == {key(1, "Residential", 2023): "updated"}
+    assert len(stored_charges()) == 1
+
+
+def test_superseded_rows_are_reported_as_skipped(mocker, projects, tmp_path):
+    # Arrange
+    mocker.patch.object(core_db.service_charge_pivot, "rebuild")
+    path = tmp_path / "service_charges.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    columns = [column.name for column in ProjectServiceCharge.__table__.columns if column.name != "id"]
+    sheet.append(columns)
+    for row in [
+        service_charge(1, "Residential", 2023, 10),
+        service_charge(2, "Residential", 2023, 30),
+        service_charge(1, "Residential", 2023, 11),
+        service_charge(3, "Residential", 2023, 40),
+    ]:
+        sheet.append([row.get(column) for column in columns])
+    workbook.save(path)
+
+    # Act
+    results = core_db.import_service_charges_from_excel(str(path), batch_size=1)
+
+    # Assert
+    assert results["status"].tolist() == ["skipped", "created", "created", "error"]
+    assert results["message"][0] == "Superseded by row 4"
+    assert stored_charges()[key(1, "Residential", 2023)] == 11